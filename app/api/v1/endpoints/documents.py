@@ -1,22 +1,37 @@
 # app/api/v1/endpoints/documents.py
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, Iterator, Optional, Tuple
 from uuid import uuid4
 from openpyxl import load_workbook
 import os
+import json
+import base64
+import binascii
 import tempfile
 import pandas as pd
-import chardet
-import csv
 import math
+from itertools import islice
 
 from app.core.dependencies import get_tenant
+from app.core.document_index import get_document_index
+from app.core.uploads import MAX_FILE_SIZE_BYTES, spool_upload
+from app.services.csv_profile import profile_csv
+from app.services.download_cache import S3DownloadCache
+from app.services.excel_preview import PREVIEW_MAX_ROWS, preview_workbook, preview_workbook_with_merges
 from app.services.storage_manager import S3FileManager
 
 router = APIRouter()
 s3_manager = S3FileManager()
+document_index = get_document_index()
+download_cache = S3DownloadCache(s3_manager)
+
+# Acima disso, se o arquivo não estiver no cache local, o preview lê por range do S3
+PREVIEW_RANGE_MIN_BYTES = int(os.getenv("PREVIEW_RANGE_MIN_MB", "16")) * 1024 * 1024
 
 
 class SchemaInferRequest(BaseModel):
@@ -37,66 +52,93 @@ def _sanitize_for_json(obj):
         return {k: _sanitize_for_json(v) for k, v in obj.items()}
     return obj
 
-def _read_excel_with_merges(path: str, max_rows: int = 20):
+def _read_excel_with_merges(path: str, max_rows: int = 20, sheet_names=None):
     """
-    Lê Excel preservando merges (colspan) e retorna primeiras linhas de cada sheet.
+    Lê Excel preservando merges (colspan) e retorna primeiras linhas das abas
+    pedidas (padrão: todas). Intervalos mesclados ficam num índice por
+    intervalo (não por célula coberta), mas achar os merges lê o XML da aba
+    inteiro: o preview comum (``preview_workbook``) não resolve merges.
     """
-    wb = load_workbook(path, read_only=False, data_only=True)
-    data_by_sheet = {}
-
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-
-        # Mapear merges: todas as células apontam para a top-left
-        merged_map = {}
-        for merged in ws.merged_cells.ranges:
-            min_row, min_col, max_row, max_col = merged.min_row, merged.min_col, merged.max_row, merged.max_col
-            top_left = (min_row, min_col)
-            for r in range(min_row, max_row + 1):
-                for c in range(min_col, max_col + 1):
-                    if (r, c) != top_left:
-                        merged_map[(r, c)] = top_left
-
-        rows = []
-        for i, row in enumerate(ws.iter_rows(min_row=1, max_row=max_rows, values_only=False)):
-            values = []
-            for j, cell in enumerate(row, start=1):
-                coord = (i + 1, j)
-                if coord in merged_map:
-                    master = merged_map[coord]
-                    master_cell = ws.cell(*master)
-                    values.append(master_cell.value)
-                else:
-                    values.append(cell.value)
-            rows.append(values)
-
-        data_by_sheet[sheet_name] = rows
-
-    wb.close()
-    return data_by_sheet
+    return preview_workbook_with_merges(path, max_rows, sheet_names)
 
 def read_excel_preview(file_path: str, max_rows: int = 20, sheet_index: int = 0):
-    # Carrega workbook sem read_only para acessar merges
-    wb = load_workbook(file_path, data_only=True)
-    sheetnames = wb.sheetnames
-    ws = wb[sheetnames[sheet_index]]
+    # read-only: lê só as primeiras linhas da aba pedida; total vem da dimensão da aba
+    (sheet_name, preview), = preview_workbook(file_path, max_rows, sheet_names=[sheet_index]).items()
 
     rows_data = []
-    for i, row in enumerate(ws.iter_rows(values_only=True)):
-        if i >= max_rows:
-            break
+    for row in preview["rows"]:
         # Converte None -> "" igual ao PHP (ou "None" se preferir)
         row_values = [str(cell) if cell is not None else "" for cell in row]
         rows_data.append(row_values)
 
     result = {
-        "sheet_name": sheetnames[sheet_index],
-        "total_rows": ws.max_row,
+        "sheet_name": sheet_name,
+        "total_rows": preview["total_rows"],
         "sample_rows": rows_data
     }
     return result
 
 
+def _sheet_summary(path: str, ext: str):
+    """Nome e dimensão de cada aba (lidos da metadata, sem carregar as células)."""
+    if ext != ".xlsx":
+        return None
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except Exception:
+        return None
+    try:
+        return [
+            {"name": ws.title, "max_row": ws.max_row, "max_column": ws.max_column}
+            for ws in wb.worksheets
+        ]
+    finally:
+        wb.close()
+
+
+def _find_document(tenant_id: str, document_id: str, allowed_exts) -> dict:
+    """
+    Localiza o documento pelo índice (O(1)). Documentos enviados antes do
+    índice existir são resolvidos com um HEAD por extensão e registrados.
+    """
+    record = document_index.get(tenant_id, document_id)
+    if record is None:
+        for ext in (".xlsx", ".xls", ".csv"):
+            key = f"documents/{tenant_id}/{document_id}{ext}"
+            head = s3_manager.head_object(key)
+            if head is not None:
+                record = document_index.put(
+                    tenant_id, document_id, key, ext, size=head.get("ContentLength")
+                )
+                break
+    if record is None or record["ext"] not in allowed_exts:
+        raise HTTPException(404, detail="Documento não encontrado no storage.")
+    return record
+
+
+def _open_excel_for_preview(object_name: str):
+    """
+    Caminho local (cache) ou, para arquivos grandes ainda não baixados, um
+    leitor por range: o preview busca só o diretório do zip e o começo de
+    cada aba, sem transferir o arquivo inteiro.
+    """
+    head = s3_manager.head_object(object_name)
+    if head is None:
+        raise HTTPException(404, detail="Documento não encontrado no storage.")
+    cached = download_cache.lookup(object_name, head["ETag"])
+    if cached is not None or head["ContentLength"] < PREVIEW_RANGE_MIN_BYTES:
+        return cached or download_cache.fetch(object_name, head["ETag"])
+    return s3_manager.open_range_reader(object_name, size=head["ContentLength"])
+
+
+def _fetch_document(object_name: str) -> str:
+    """Caminho local do objeto (pertence ao cache: não remover)."""
+    try:
+        return download_cache.fetch(object_name)
+    except FileNotFoundError:
+        raise HTTPException(404, detail="Documento não encontrado no storage.")
+
+
 # ============================================
 # DOCUMENTS PIPELINE
 # ============================================
@@ -116,22 +158,41 @@ def upload_document(
 
     prefix = f"documents/{tenant_id}/"
 
-    # cria arquivo temporário local
+    # cria arquivo temporário local (cópia em blocos, com limite de tamanho)
     with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(file.file.read())
         tmp_path = tmp.name
+    upload = spool_upload(file, tmp_path, MAX_FILE_SIZE_BYTES)
 
     # usa document_id como nome final, preservando a extensão
     ext = os.path.splitext(file.filename)[1]
     object_name = f"{prefix}{document_id}{ext}"
 
-    # upload para o S3
-    s3_manager.upload_file(tmp_path, object_name)
-
-    # opcional: cria marcador de pasta
-    s3_manager.upload_file(tmp_path, f"{prefix}.keep")
-
-    os.remove(tmp_path)
+    try:
+        # upload para o S3
+        s3_manager.upload_file(tmp_path, object_name)
+
+        # marcador de pasta vazio, criado só na primeira vez para o tenant
+        s3_manager.ensure_folder_marker(prefix)
+
+        # registra no índice: preview/schema:infer não precisam listar o prefixo
+        document_index.put(
+            tenant_id,
+            document_id,
+            object_name,
+            ext.lower(),
+            size=upload.size,
+            sha256=upload.sha256,
+            sheets=_sheet_summary(tmp_path, ext.lower()),
+            filename=file.filename,
+        )
+
+        # o arquivo local vira a entrada do cache de downloads (preview não baixa de novo)
+        head = s3_manager.head_object(object_name)
+        if head is not None:
+            download_cache.seed(object_name, head["ETag"], tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
     download_url = s3_manager.generate_presigned_url(object_name)
 
@@ -157,158 +218,176 @@ def preview_document(
     - encoding
     - total de linhas
     """
-    import chardet, csv
-    from openpyxl import load_workbook
-
-    # tenta localizar o arquivo no S3
-    possible_exts = [".xlsx", ".xls", ".csv"]
-    found = None
-    for ext in possible_exts:
-        key = f"documents/{tenant_id}/{document_id}{ext}"
-        files = s3_manager.list_folder(os.path.dirname(key))
-        if any(f == key for f in files):
-            found = key
-            break
-    if not found:
-        raise HTTPException(404, detail="Documento não encontrado no storage.")
+    # localiza o arquivo no S3 (índice de documentos)
+    record = _find_document(tenant_id, document_id, (".xlsx", ".xls", ".csv"))
 
-    object_name = found
-    ext = os.path.splitext(object_name)[1].lower()
-    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid4()}{ext}")
+    object_name = record["object_key"]
+    ext = record["ext"]
 
-    try:
-        # baixa o arquivo do S3
-        s3_manager.download_file(object_name, tmp_path)
-
-        # Caso CSV
-        if ext == ".csv":
-            with open(tmp_path, "rb") as f:
-                raw = f.read(5000)
-                enc_guess = chardet.detect(raw)
-            encoding = enc_guess.get("encoding", "utf-8")
-
-            with open(tmp_path, "r", encoding=encoding, errors="ignore") as f:
-                sample = f.read(4096)
-                sniffer = csv.Sniffer()
-                delimiter = sniffer.sniff(sample).delimiter if sample else ","
-
-            rows = []
-            with open(tmp_path, "r", encoding=encoding, errors="ignore") as f:
-                reader = csv.reader(f, delimiter=delimiter)
-                for i, row in enumerate(reader):
-                    if i >= 20:
-                        break
-                    # Trim + substitui None por ""
-                    rows.append([str(cell).strip() if cell is not None else "" for cell in row])
-
-            total_rows = sum(1 for _ in open(tmp_path, encoding=encoding, errors="ignore"))
-
-            return {
-                "document_id": document_id,
-                "type": "csv",
+    # Caso CSV
+    if ext == ".csv":
+        # cópia local via cache (um download por versão do objeto em todo o pipeline)
+        local_path = _fetch_document(object_name)
+
+        # uma abertura só: encoding, delimitador, amostra e total de registros
+        profile = profile_csv(local_path)
+
+        return {
+            "document_id": document_id,
+            "type": "csv",
+            "sample_rows": profile["sample_rows"],
+            "delimiter": profile["delimiter"],
+            "encoding": profile["encoding"],
+            "total_rows": profile["total_rows"]
+        }
+
+    # Caso Excel
+    elif ext in [".xlsx", ".xls"]:
+        # read-only: só as primeiras linhas de cada aba são lidas
+        source = _open_excel_for_preview(object_name)
+        try:
+            previews = preview_workbook(source, PREVIEW_MAX_ROWS)
+        finally:
+            # leitor por range: libera os blocos em cache (caminho local não tem o que fechar)
+            if not isinstance(source, str):
+                source.close()
+        result_sheets = {}
+
+        for sheetname, preview in previews.items():
+            # Trim + None → ""
+            rows = [
+                [str(cell).strip() if cell is not None else "" for cell in row]
+                for row in preview["rows"]
+            ]
+
+            result_sheets[sheetname] = {
                 "sample_rows": rows,
-                "delimiter": delimiter,
-                "encoding": encoding,
-                "total_rows": total_rows
+                "total_rows": preview["total_rows"]
             }
 
-        # Caso Excel
-        elif ext in [".xlsx", ".xls"]:
-            wb = load_workbook(tmp_path, data_only=True)
-            result_sheets = {}
-
-            for sheetname in wb.sheetnames:
-                ws = wb[sheetname]
-                rows = []
-                for i, row in enumerate(ws.iter_rows(values_only=True)):
-                    if i >= 20:
-                        break
-                    # Trim + None → ""
-                    rows.append([str(cell).strip() if cell is not None else "" for cell in row])
-
-                result_sheets[sheetname] = {
-                    "sample_rows": rows,
-                    "total_rows": ws.max_row
-                }
-
-            return {
-                "document_id": document_id,
-                "type": "excel",
-                "sheets": result_sheets
-            }
+        return {
+            "document_id": document_id,
+            "type": "excel",
+            "sheets": result_sheets
+        }
 
-        else:
-            raise HTTPException(400, detail="Extensão não suportada.")
+    else:
+        raise HTTPException(400, detail="Extensão não suportada.")
+
+
+def _encode_cursor(next_row: int) -> str:
+    raw = json.dumps({"row": next_row}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        row = int(json.loads(raw)["row"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(400, detail="Cursor inválido.")
+    if row < 1:
+        raise HTTPException(400, detail="Cursor inválido.")
+    return row
+
+
+def _iter_mapped_rows(ws, payload: SchemaInferRequest, start_row: int = 1) -> Iterator[Tuple[int, dict]]:
+    """(número da linha na planilha, linha mapeada), já sem as linhas sem o campo obrigatório."""
+    mapping = [(int(col_idx), field_name) for col_idx, field_name in payload.column_mapping.items()]
+    for row_number, row in enumerate(ws.iter_rows(min_row=start_row, values_only=True), start=start_row):
+        mapped_row = {}
+        for col_idx, field_name in mapping:
+            val = row[col_idx] if col_idx < len(row) else None
+            if isinstance(val, str):
+                val = val.strip()
+            mapped_row[field_name] = val
+
+        # descarta linhas se o campo obrigatório estiver vazio/nulo
+        if not mapped_row.get(payload.required_field):
+            continue
+
+        yield row_number, mapped_row
 
-    finally:
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except PermissionError:
-                pass
 
 @router.post("/documents/imports/{document_id}/schema:infer")
 def infer_schema(
     document_id: str,
     payload: SchemaInferRequest,
-    tenant_id: str = Depends(get_tenant)
+    tenant_id: str = Depends(get_tenant),
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    stream: bool = False,
 ):
     """
     Lê a sheet escolhida, aplica o mapeamento de índices para campos,
-    remove linhas onde `required_field` é nulo e retorna toda a planilha.
+    remove linhas onde `required_field` é nulo e retorna as linhas mapeadas.
+
+    - ``limit``/``offset``: página de linhas mapeadas; a resposta traz
+      ``next_cursor`` para continuar de onde parou sem reler o começo.
+    - ``cursor``: retoma a partir da página anterior (``offset`` é relativo a ele).
+    - ``stream=true``: NDJSON (uma linha mapeada por linha), enviado enquanto
+      a planilha é lida.
+    Sem ``limit`` devolve a planilha inteira, como antes.
     """
-    # localizar arquivo Excel no S3
-    possible_exts = [".xlsx", ".xls"]
-    found = None
-    for ext in possible_exts:
-        key = f"documents/{tenant_id}/{document_id}{ext}"
-        files = s3_manager.list_folder(os.path.dirname(key))
-        if any(f == key for f in files):
-            found = key
-            break
-    if not found:
-        raise HTTPException(404, detail="Documento não encontrado no storage.")
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(400, detail="offset deve ser >= 0 e limit >= 1.")
+    start_row = _decode_cursor(cursor) if cursor else 1
 
-    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid4()}{ext}")
-    try:
-        s3_manager.download_file(found, tmp_path)
+    # localizar arquivo Excel no S3 (índice de documentos)
+    record = _find_document(tenant_id, document_id, (".xlsx", ".xls"))
+    found = record["object_key"]
 
-        wb = load_workbook(tmp_path, data_only=True)
-        if payload.sheet_name not in wb.sheetnames:
-            raise HTTPException(400, detail=f"Sheet '{payload.sheet_name}' não encontrada.")
+    local_path = _fetch_document(found)
 
-        ws = wb[payload.sheet_name]
+    # read-only: as linhas são lidas (e descartadas) em sequência, memória constante
+    wb = load_workbook(local_path, read_only=True, data_only=True)
+    if payload.sheet_name not in wb.sheetnames:
+        wb.close()
+        raise HTTPException(400, detail=f"Sheet '{payload.sheet_name}' não encontrada.")
 
-        mapped_rows = []
-        for row in ws.iter_rows(values_only=True):
-            mapped_row = {}
-            for col_idx, field_name in payload.column_mapping.items():
-                col_idx = int(col_idx)
-                val = row[col_idx] if col_idx < len(row) else None
-                if isinstance(val, str):
-                    val = val.strip()
-                mapped_row[field_name] = val
-
-            # descarta linhas se o campo obrigatório estiver vazio/nulo
-            if not mapped_row.get(payload.required_field):
-                continue
+    ws = wb[payload.sheet_name]
+    rows = _iter_mapped_rows(ws, payload, start_row)
 
-            mapped_rows.append(mapped_row)
+    # islice para no fim da página sem consumir a linha seguinte
+    page = islice(rows, offset, None if limit is None else offset + limit)
 
-        return {
-            "document_id": document_id,
-            "sheet_name": payload.sheet_name,
-            "mapping": payload.column_mapping,
-            "required_field": payload.required_field,
-            "rows": mapped_rows
-        }
+    if stream:
+        def ndjson() -> Iterator[bytes]:
+            try:
+                for _, mapped_row in page:
+                    yield json.dumps(jsonable_encoder(mapped_row), ensure_ascii=False).encode("utf-8") + b"\n"
+            finally:
+                wb.close()
 
+        # o finally do gerador só roda se ele for iterado; o background roda ao
+        # fim da resposta mesmo com o cliente desconectando antes do corpo
+        # (fechar duas vezes não tem efeito)
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", background=BackgroundTask(wb.close))
+
+    try:
+        mapped_rows = []
+        last_row = None
+        for row_number, mapped_row in page:
+            mapped_rows.append(mapped_row)
+            last_row = row_number
+        # há mais linhas depois da página? (só quando ela veio cheia)
+        next_cursor = None
+        if limit is not None and len(mapped_rows) == limit and next(rows, None) is not None:
+            next_cursor = _encode_cursor(last_row + 1)
     finally:
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except PermissionError:
-                pass
+        wb.close()
+
+    return {
+        "document_id": document_id,
+        "sheet_name": payload.sheet_name,
+        "mapping": payload.column_mapping,
+        "required_field": payload.required_field,
+        "rows": mapped_rows,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": next_cursor,
+    }
 
 
 @router.post("/documents/imports/{document_id}/mapping")
@@ -1,27 +1,44 @@
 # app/api/v1/endpoints/imports.py
 
 from fastapi import APIRouter, UploadFile, File, Depends, status, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
-from uuid import uuid4
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from uuid import UUID, uuid4
+from typing import Optional
 import os
+import logging
 import tempfile
-import shutil
-import subprocess
-import shlex
 import platform
 
+from app.core.auth import security
 from app.core.dependencies import get_tenant
 from app.core.queue import enqueue_import_task
-from app.application.common.imports.schemas import Estimate
-from app.services.estimate_parser import parse_excel_to_json_freeform
+from app.core.jobs import JOB_DONE, JOB_FAILED, JOB_PROCESSING, JOB_QUEUED, create_job, get_job, reserve_job, update_job
+from app.application.common.imports.usecases.parse_estimate_analytics import parse_estimate_analytics_usecase
+from app.application.common.imports.usecases.persist_estimate import persist_estimate_usecase
+from app.services.estimate_parser import PARSER_VERSION
+from app.core.uploads import MAX_FILE_SIZE_BYTES, spool_upload
+from app.services.parse_cache import parse_cache
+from app.services.estimate_markdown import (
+    iter_estimate_markdown, iter_text_chunks, tee_to_file, write_and_join_chunks, write_chunks,
+)
+from app.services.excel_markdown import excel_markdown_engine, excel_to_markdown_tables
+from app.services.pdf_markdown import PdfMarkdownResult, extract_pdf_markdown_async
+from app.services.office_pool import convert_with_soffice_cli, get_office_pool, office_pool_available
 
 # -------------------------------------------------------------------
 # 1) Router DEVE existir antes de qualquer decorator
 # -------------------------------------------------------------------
 router = APIRouter()
 
-MAX_FILE_SIZE_MB = 30
-MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+logger = logging.getLogger(__name__)
+
+# Versão dos renderizadores de Markdown (entra na chave do cache de parse).
+# 2: o modo semântico guarda o orçamento (estimate_data), não o Markdown pronto
+# 3: modo raw com tabela pipe própria (sem tabulate)
+# 4: engine_used do modo raw diz quem leu o arquivo (openpyxl/pandas)
+MARKDOWN_RENDER_VERSION = "4"
 
 
 # ===================================================================
@@ -37,43 +54,121 @@ def import_estimate_analytics(
     if not any(filename.endswith(ext) for ext in allowed_extensions):
         raise HTTPException(status_code=400, detail="Arquivo deve ser .xls ou .xlsx")
 
-    # valida tamanho
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    if file_size > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {MAX_FILE_SIZE_MB}MB")
-
     import_id = str(uuid4())
 
     tmp_dir = os.path.join(os.getcwd(), "tmp")
     os.makedirs(tmp_dir, exist_ok=True)
     file_path = os.path.join(tmp_dir, f"{import_id}_{os.path.basename(filename)}")
-    with open(file_path, "wb") as f_out:
-        f_out.write(file.file.read())
+    # copia em blocos: valida tamanho (413) e calcula o hash na mesma passada
+    upload = spool_upload(file, file_path, MAX_FILE_SIZE_BYTES)
+
+    # mesmo arquivo + mesma versão do parser => mesmo resultado (não abre a planilha);
+    # a chave inclui o tenant: o hit/miss não revela uploads de outros tenants
+    content_hash = upload.sha256
+    cache_key = parse_cache.make_key(tenant_id, content_hash, "estimate_analytics", PARSER_VERSION)
+    cached = parse_cache.get(cache_key)
+
+    create_job(import_id, tenant_id, op="estimate_analytics", filename=file.filename, content_hash=content_hash)
+
+    if cached is not None:
+        update_job(import_id, status=JOB_DONE, result=cached)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "import_id": import_id,
+                "status": JOB_DONE,
+                "message": "Arquivo Excel recebido; orçamento recuperado do cache.",
+                "cache_hit": True,
+                "estimate_data": cached,
+            },
+            headers={"X-Parse-Cache": "hit"},
+        )
 
     enqueue_import_task({
         "import_id": import_id,
         "tenant_id": tenant_id,
         "file_path": file_path,
-        "filename": file.filename
+        "filename": file.filename,
+        "op": "estimate_analytics",
+        "cache_key": cache_key,
     })
 
-    estimate_data = parse_excel_to_json_freeform(file_path)
-
-    # valida com seu schema (opcional, mas recomendado)
-    Estimate(**estimate_data)
-
     return JSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "import_id": import_id,
+            "status": JOB_QUEUED,
             "message": "Arquivo Excel recebido e enfileirado para importação.",
-            "estimate_data": estimate_data
-        }
+            "cache_hit": False,
+        },
+        headers={"X-Parse-Cache": "miss"},
     )
 
 
+@router.get("/{import_id}")
+def get_import_status(import_id: str, tenant_id: str = Depends(get_tenant)):
+    """
+    Status do job de importação; quando concluído devolve o orçamento parseado.
+    """
+    job = get_job(import_id)
+    if job is None or job["tenant_id"] != tenant_id:
+        raise HTTPException(status_code=404, detail="Importação não encontrada.")
+
+    content = {
+        "import_id": import_id,
+        "status": job["status"],
+        "filename": job.get("filename"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "error": job["error"],
+    }
+    if job.get("progress") is not None:
+        content["progress"] = job["progress"]
+    if job["status"] == JOB_DONE and job.get("result") is not None:
+        content["estimate_data"] = job["result"]
+    return content
+
+
+@router.post("/{import_id}/persist", status_code=status.HTTP_201_CREATED)
+def persist_import(
+    import_id: str,
+    tenant_id: str = Depends(get_tenant),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    estimate_id: Optional[str] = None,  # orçamento já gravado: grava só a diferença (nova versão)
+):
+    """
+    Grava no Supabase o orçamento de uma importação concluída (estágios,
+    composições e recursos em lotes, com o JWT do usuário). Se a gravação
+    de um orçamento novo falhar (502), o que já foi gravado é apagado
+    (``rolled_back`` no resumo). Com ``estimate_id``, a importação é tratada
+    como nova versão desse orçamento: só os nós novos, alterados e removidos
+    são escritos; se a gravação falhar no meio, repetir a mesma chamada
+    retoma de onde parou.
+    """
+    job = get_job(import_id)
+    if job is None or job["tenant_id"] != tenant_id:
+        raise HTTPException(status_code=404, detail="Importação não encontrada.")
+    if job["status"] != JOB_DONE or not job.get("result"):
+        raise HTTPException(status_code=409, detail="Importação ainda não concluída.")
+    if estimate_id is not None:
+        try:
+            estimate_id = str(UUID(estimate_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="estimate_id deve ser um UUID.")
+
+    try:
+        summary = persist_estimate_usecase(
+            job["result"], tenant_id, credentials.credentials, import_id=import_id, estimate_id=estimate_id
+        )
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Orçamento não encontrado.")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not summary["ok"]:
+        return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content=summary)
+    return summary
+
+
 # ===================================================================
 # 2) Helpers para Markdown
 #    (imports opcionais são feitos dentro das funções)
@@ -117,16 +212,14 @@ def _xlsx_to_pdf_windows(xlsx_path: str, pdf_path: str) -> None:
 
 
 def _xlsx_to_pdf_soffice(xlsx_path: str, pdf_path: str) -> None:
-    """Converte via LibreOffice headless (soffice). Requer LibreOffice no PATH."""
-    soffice = shutil.which("soffice") or shutil.which("libreoffice")
-    if not soffice:
-        raise RuntimeError("LibreOffice ('soffice') não encontrado no PATH para converter XLSX -> PDF.")
-    outdir = os.path.dirname(pdf_path) or "."
-    cmd = f'"{soffice}" --headless --convert-to pdf "{xlsx_path}" --outdir "{outdir}"'
-    subprocess.check_call(shlex.split(cmd))
-    base_pdf = os.path.join(outdir, os.path.splitext(os.path.basename(xlsx_path))[0] + ".pdf")
-    if os.path.abspath(base_pdf) != os.path.abspath(pdf_path):
-        os.replace(base_pdf, pdf_path)
+    """
+    Converte via LibreOffice headless. Com o binding UNO disponível usa o pool
+    de processos já abertos; senão, um soffice avulso com perfil isolado.
+    """
+    if office_pool_available():
+        get_office_pool().convert_to_pdf(xlsx_path, pdf_path)
+    else:
+        convert_with_soffice_cli(xlsx_path, pdf_path)
 
 
 def _xlsx_to_markdown_raw(xlsx_path: str, strategy: str = "text", page_chunks: bool = False):
@@ -155,98 +248,74 @@ def _xlsx_to_markdown_raw(xlsx_path: str, strategy: str = "text", page_chunks: b
         )
 
 
-def _fmt_money(x):
-    if x is None:
-        return ""
-    s = f"{x:,.2f}"
-    s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-    return f"R$ {s}"
-
 def _excel_to_markdown_tables(xlsx_path: str, only_sheet_contains: str | None = None) -> str:
-    import pandas as pd  # lazy
-    try:
-        import tabulate  # noqa: F401  # garante que to_markdown funcione
-    except Exception as e:
-        raise RuntimeError("Dependência faltando: instale 'tabulate' para gerar Markdown de DataFrame.") from e
+    # abas renderizadas em paralelo (pool de processos), tabela pipe sem tabulate
+    return excel_to_markdown_tables(xlsx_path, only_sheet_contains=only_sheet_contains)
 
-    xls = pd.ExcelFile(xlsx_path)
-    sheet_names = xls.sheet_names
-    chosen = (
-        [s for s in sheet_names if only_sheet_contains and only_sheet_contains.lower() in s.lower()]
-        or sheet_names
-    )
 
-    out = []
-    for name in chosen:
-        df = pd.read_excel(xlsx_path, sheet_name=name)
-        if df.empty:
-            continue
-        out.append(f"# {name}")
-        out.append(df.to_markdown(index=False))
-        out.append("")  # linha em branco entre abas
-
-    md = "\n".join(out).strip()
-    return md or "# (Sem dados nas abas selecionadas)"
-
-
-def _estimate_to_markdown(estimate_data: dict) -> str:
-    lines = []
-    name = estimate_data.get("name") or "Obra"
-    bdi = estimate_data.get("bdi_global")
-    header = f"# {name}"
-    if bdi is not None:
-        header += f"\n\n**BDI global:** {bdi:.2%}"
-    lines.append(header)
-
-    # Cabeçalho padrão
-    TABLE_HEADER = (
-        "| Tipagem | Código | Banco | Descrição | Tipo | Und | Quant. | Valor Unit | Total |\n"
-        "|---|---|---|---|---|:---:|---:|---:|---:|"
-    )
+async def _fail_job(import_id: str, exc: HTTPException) -> HTTPException:
+    """Marca o job como falho com o detalhe da resposta e devolve a exceção (para o ``raise``)."""
+    await run_in_threadpool(update_job, import_id, status=JOB_FAILED, error=str(exc.detail))
+    return exc
+
+
+async def _extract_pdf_with_progress(
+    import_id: str, tenant_id: str, content_hash: str, file_path: str, strategy: str
+) -> PdfMarkdownResult:
+    """
+    Extrai o PDF registrando o andamento (páginas prontas/total) no job já
+    reservado pelo endpoint. As faixas de páginas são aguardadas no event
+    loop: a requisição não ocupa uma thread do threadpool enquanto o pool de
+    processos trabalha.
+    """
+    await run_in_threadpool(update_job, import_id, content_hash=content_hash)
 
-    def walk(items, level=2):
-        for item in items or []:
-            t = item.get("estimate_item_type")
-
-            if t == "stage":
-                # título de seção
-                title = f'{"#"*level} {item.get("index","")} {item.get("name") or ""}'.strip()
-                if item.get("price_total") is not None:
-                    title += f" — {_fmt_money(item['price_total'])}"
-                lines.append(title)
-                walk(item.get("estimate_items") or item.get("estimate_item"), level + 1)
-
-            elif t in ("composition", "resource"):
-                # tabela única
-                if not lines or not lines[-1].startswith("| Tipagem"):
-                    lines.append("")
-                    lines.append(TABLE_HEADER)
-
-                desc = (item.get("name") or "").replace("|", "\\|")
-                lines.append(
-                    f"| {t} | {item.get('code','')} | {item.get('bank','')} | {desc} | "
-                    f"{item.get('type','')} | {item.get('unit_symbol') or ''} | "
-                    f"{'' if item.get('quantity') is None else item['quantity']} | "
-                    f"{'' if item.get('price_unit') is None else _fmt_money(item['price_unit'])} | "
-                    f"{'' if item.get('price_total') is None else _fmt_money(item['price_total'])} |"
-                )
-
-                # se for composição, também lista filhos
-                if t == "composition":
-                    for r in item.get("composition_child") or []:
-                        desc_r = (r.get("name") or "").replace("|", "\\|")
-                        lines.append(
-                            f"| resource | {r.get('code','')} | {r.get('bank','')} | {desc_r} | "
-                            f"{r.get('type','')} | {r.get('unit_symbol') or ''} | "
-                            f"{'' if r.get('quantity') is None else r['quantity']} | "
-                            f"{'' if r.get('price_unit') is None else _fmt_money(r['price_unit'])} | "
-                            f"{'' if r.get('price_total') is None else _fmt_money(r['price_total'])} |"
-                        )
-                lines.append("")
-
-    walk(estimate_data.get("estimate_items") or [], level=2)
-    return "\n".join(lines)
+    def on_progress(done: int, total: int):
+        update_job(import_id, progress={"pages_done": done, "pages_total": total})
 
+    try:
+        pdf = await extract_pdf_markdown_async(file_path, tenant_id, content_hash, strategy, progress=on_progress)
+    except Exception as e:
+        await run_in_threadpool(update_job, import_id, status=JOB_FAILED, error=str(e))
+        raise
+    await run_in_threadpool(
+        update_job, import_id, status=JOB_DONE,
+        pages_cached=pdf.pages_cached, pages_extracted=pdf.pages_extracted,
+    )
+    return pdf
+
+
+def _excel_markdown(file_path: str, filename: str, mode: str, cache_key: str):
+    """
+    Ramo do Excel (roda no threadpool): cache de parse; no miss, parser
+    semântico ou tabelas via pandas. Devolve (estimate_data, markdown,
+    engine_used, cache_hit).
+    """
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        return cached.get("estimate_data"), cached.get("markdown"), cached["engine_used"], True
+
+    estimate_data = md_text = None
+    if mode == "semantic":
+        # 1) Excel + semântico => parser -> markdown hierárquico (renderizado sob demanda)
+        estimate_data = parse_estimate_analytics_usecase(file_path, filename)
+        engine_used = "semantic-parser"
+    else:
+        # 2) Excel + raw => markdown tabular (NÃO usa PyMuPDF): openpyxl no
+        #    .xlsx/.xlsm, pandas (xlrd) só no .xls
+        #    (opcional: filtrar aba "analític" se quiser focar)
+        md_text = _excel_to_markdown_tables(file_path, only_sheet_contains="analític")
+        engine_used = excel_markdown_engine(file_path)
+
+    try:
+        if estimate_data is not None:
+            parse_cache.set(cache_key, {"estimate_data": estimate_data, "engine_used": engine_used})
+        else:
+            parse_cache.set(cache_key, {"markdown": md_text, "engine_used": engine_used})
+    except OSError:
+        # só falha de disco é tolerada (o Markdown sai sem cache); payload inválido é bug e sobe
+        logger.exception("Não foi possível gravar o cache de parse de %s", filename)
+    return estimate_data, md_text, engine_used, False
 
 
 # ===================================================================
@@ -263,82 +332,111 @@ def get_estimate_markdown_file(import_id: str):
         filename=f"orcamento_{import_id}.md"
     )
 @router.post("/estimate_markdown", status_code=status.HTTP_200_OK)
-def import_estimate_markdown(
+async def import_estimate_markdown(
     file: UploadFile = File(...),
     tenant_id: str = Depends(get_tenant),
     mode: str = "semantic",     # 'semantic' (parser) ou 'raw' (tabular/llm)
     strategy: str = "text",     # para PDF no 'raw': 'text' | 'lines' | 'lines_strict'
     page_chunks: bool = False,
     request: Request = None,    # <-- adicionado para montar o download_url
+    inline: bool = True,        # False: só o download_url, sem o Markdown no JSON
+    stream: bool = False,       # True: devolve o próprio Markdown (text/markdown) em streaming
+    import_id: Optional[str] = None,  # UUID gerado pelo cliente p/ acompanhar o progresso (PDF)
 ):
     allowed_extensions = [".xls", ".xlsx", ".pdf"]
     filename = (file.filename or "").lower()
     if not any(filename.endswith(ext) for ext in allowed_extensions):
         raise HTTPException(status_code=400, detail="Arquivo deve ser .xls, .xlsx ou .pdf")
 
-    # valida tamanho
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    if file_size > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {MAX_FILE_SIZE_MB}MB")
+    ext_is_pdf = filename.endswith(".pdf")
+    ext_is_xls = filename.endswith((".xls", ".xlsx"))
 
-    import_id = str(uuid4())
+    if ext_is_pdf and mode == "semantic":
+        # não faz sentido sem Excel -> avisa
+        raise HTTPException(400, detail="Para PDF use mode=raw (ou envie Excel para modo semântico).")
 
     tmp_dir = os.path.join(os.getcwd(), "tmp")
+    md_dir = os.path.join(tmp_dir, "markdown")
+    if import_id is None:
+        import_id = str(uuid4())
+    else:
+        try:
+            import_id = str(UUID(import_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="import_id deve ser um UUID.")
+        # job já removido pela retenção, mas o .md ainda existe: o id continua ocupado
+        if os.path.exists(os.path.join(md_dir, f"{import_id}.md")):
+            raise HTTPException(status_code=409, detail="import_id já utilizado.")
+
+    # reserva o id (com o tenant) antes de gravar qualquer arquivo com ele: INSERT
+    # simples, então duas requisições com o mesmo id não passam as duas
+    job = await run_in_threadpool(
+        reserve_job, import_id, tenant_id, status=JOB_PROCESSING, op=f"estimate_markdown:{mode}",
+        filename=file.filename,
+    )
+    if job is None:
+        raise HTTPException(status_code=409, detail="import_id já utilizado.")
+
     os.makedirs(tmp_dir, exist_ok=True)
     file_path = os.path.join(tmp_dir, f"{import_id}_{os.path.basename(filename)}")
-    with open(file_path, "wb") as f_out:
-        f_out.write(file.file.read())
-
-    ext_is_pdf = filename.endswith(".pdf")
-    ext_is_xls = filename.endswith((".xls", ".xlsx"))
+    # copia em blocos: valida tamanho (413) e calcula o hash na mesma passada
+    # (endpoint async: o que bloqueia roda no threadpool; o PDF espera o pool no event loop)
+    try:
+        upload = await run_in_threadpool(spool_upload, file, file_path, MAX_FILE_SIZE_BYTES)
+    except HTTPException as e:
+        raise await _fail_job(import_id, e)
+
+    # cache por conteúdo: mesmo arquivo + mesmo modo/opções => mesmo Markdown
+    content_hash = upload.sha256
+    if ext_is_pdf:
+        cache_key = None  # PDF: cache por página (services/pdf_markdown)
+    elif mode == "semantic":
+        cache_key = parse_cache.make_key(
+            tenant_id, content_hash, "estimate_markdown", "semantic", PARSER_VERSION, MARKDOWN_RENDER_VERSION
+        )
+    else:
+        cache_key = parse_cache.make_key(tenant_id, content_hash, "estimate_markdown", "raw", MARKDOWN_RENDER_VERSION)
 
     try:
-        engine_used = None
+        estimate_data = None
+        md_text = None
+        page_results = None
 
         if ext_is_xls:
-            if mode == "semantic":
-                # 1) Excel + semântico => parser -> markdown hierárquico
-                estimate_data = parse_excel_to_json_freeform(file_path)
-                Estimate(**estimate_data)
-                md_text = _estimate_to_markdown(estimate_data)
-                engine_used = "semantic-parser"
-            else:
-                # 2) Excel + raw => pandas -> markdown tabular (NÃO usa PyMuPDF)
-                #    (opcional: filtrar aba "analític" se quiser focar)
-                md_text = _excel_to_markdown_tables(file_path, only_sheet_contains="analític")
-                engine_used = "pandas"
+            estimate_data, md_text, engine_used, cache_hit = await run_in_threadpool(
+                _excel_markdown, file_path, filename, mode, cache_key
+            )
+            await run_in_threadpool(
+                update_job, import_id, status=JOB_DONE, content_hash=content_hash, engine_used=engine_used
+            )
         elif ext_is_pdf:
-            if mode == "semantic":
-                # não faz sentido sem Excel -> avisa
-                raise HTTPException(400, detail="Para PDF use mode=raw (ou envie Excel para modo semântico).")
-            # 3) PDF + raw => PyMuPDF4LLM
-            pymupdf4llm = _lazy_import_pymupdf4llm()
+            # 3) PDF + raw => PyMuPDF4LLM, páginas em paralelo e em cache
             # estratégia 'text' lida melhor com PDFs sem borda de tabela
-            md_text = pymupdf4llm.to_markdown(
-                file_path,
-                table_strategy=strategy or "text",
-                page_chunks=page_chunks
-            )
             engine_used = f"pymupdf4llm:{strategy or 'text'}"
+            pdf = await _extract_pdf_with_progress(import_id, tenant_id, content_hash, file_path, strategy or "text")
+            md_text = pdf.markdown
+            if page_chunks:
+                page_results = pdf.pages
+            cache_hit = pdf.pages_extracted == 0
 
         else:
             raise HTTPException(400, detail="Extensão não suportada.")
 
     except RuntimeError as e:
-        raise HTTPException(status_code=501, detail=str(e))
-    except HTTPException:
-        raise
+        raise await _fail_job(import_id, HTTPException(status_code=501, detail=str(e)))
+    except HTTPException as e:
+        raise await _fail_job(import_id, e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Falha ao gerar Markdown: {e}")
+        raise await _fail_job(import_id, HTTPException(status_code=500, detail=f"Falha ao gerar Markdown: {e}"))
 
-    # salva o .md com o mesmo import_id
-    md_dir = os.path.join(tmp_dir, "markdown")
+    def markdown_chunks():
+        if estimate_data is not None:
+            return iter_estimate_markdown(estimate_data)
+        return iter_text_chunks(md_text)
+
+    # .md salvo com o mesmo import_id (gravado abaixo, em pedaços)
     os.makedirs(md_dir, exist_ok=True)
     md_path = os.path.join(md_dir, f"{import_id}.md")
-    with open(md_path, "w", encoding="utf-8") as f:
-        f.write(md_text)
 
     # monta o link para download (GET /estimate_markdown/{import_id})
     download_url = None
@@ -348,24 +446,35 @@ def import_estimate_markdown(
         except Exception:
             download_url = None
 
-    enqueue_import_task({
-        "import_id": import_id,
-        "tenant_id": tenant_id,
-        "file_path": file_path,
-        "filename": file.filename,
-        "op": f"estimate_markdown:{mode}",
-        "engine_used": engine_used,
-    })
+    headers = {"X-Parse-Cache": "hit" if cache_hit else "miss"}
+    if stream:
+        # o mesmo gerador alimenta o arquivo e a resposta (sem montar a string inteira)
+        headers.update({"X-Import-Id": import_id, "X-Engine-Used": engine_used or ""})
+        if download_url:
+            headers["X-Download-Url"] = download_url
+        return StreamingResponse(
+            tee_to_file(markdown_chunks(), md_path),
+            media_type="text/markdown",  # o Starlette acrescenta o charset
+            headers=headers,
+        )
 
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content={
-            "import_id": import_id,
-            "mode": mode,
-            "engine_used": engine_used,
-            "message": "Markdown gerado.",
-            "markdown": md_text,
-            "download_url": download_url,  # <-- link no mesmo endpoint
-        }
-    )
+    if inline and page_results is None and md_text is None:
+        # semântico inline: uma renderização só alimenta o .md e o JSON
+        md_text = await run_in_threadpool(write_and_join_chunks, markdown_chunks(), md_path)
+    else:
+        await run_in_threadpool(write_chunks, markdown_chunks(), md_path)
 
+    content = {
+        "import_id": import_id,
+        "mode": mode,
+        "engine_used": engine_used,
+        "message": "Markdown gerado.",
+        "download_url": download_url,  # <-- link no mesmo endpoint
+        "cache_hit": cache_hit,
+    }
+    if inline:
+        if page_results is not None:
+            content["markdown"] = page_results  # page_chunks=True: um item por página
+        else:
+            content["markdown"] = md_text
+    return JSONResponse(status_code=status.HTTP_200_OK, content=content, headers=headers)
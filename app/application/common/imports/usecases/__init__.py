@@ -0,0 +1,2 @@
+# Pacote de casos de uso para imports no contexto common
+
@@ -0,0 +1,11 @@
+from app.application.common.imports.schemas import Estimate
+from app.services.estimate_parser import parse_excel_to_json_freeform
+
+
+def parse_estimate_analytics_usecase(file_path: str, filename: str) -> dict:
+    # .xlsx é lido em streaming (openpyxl read-only); .xls continua via pandas
+    estimate_data = parse_excel_to_json_freeform(file_path, streaming=filename.lower().endswith(".xlsx"))
+
+    # valida com o schema antes de publicar o resultado
+    Estimate(**estimate_data)
+    return estimate_data
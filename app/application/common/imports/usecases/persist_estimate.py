@@ -0,0 +1,37 @@
+from typing import Any, Dict, Optional
+
+from app.application.common.imports.schemas import Estimate
+from app.services.estimate_persistence import (
+    diff_estimate,
+    flatten_estimate,
+    load_estimate_snapshot,
+    persist_estimate,
+    persist_estimate_diff,
+)
+from app.services.supabase_manager import SupabaseManager
+
+
+def persist_estimate_usecase(
+    estimate_data: Dict[str, Any],
+    tenant_id: str,
+    jwt_token: str,
+    import_id: Optional[str] = None,
+    estimate_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    # valida de novo: o resultado pode ter vindo do cache de parse
+    Estimate(**estimate_data)
+
+    # JWT do usuário: as escritas passam pelo RLS do Supabase
+    manager = SupabaseManager(jwt_token)
+    if estimate_id is None:
+        batches = flatten_estimate(estimate_data, tenant_id, import_id=import_id)
+        summary = persist_estimate(manager, batches)
+    else:
+        # nova versão de um orçamento gravado: só o que mudou
+        snapshot = load_estimate_snapshot(manager, estimate_id)
+        if snapshot is None:
+            raise LookupError(estimate_id)
+        batches = flatten_estimate(estimate_data, tenant_id, estimate_id=estimate_id, import_id=import_id)
+        summary = persist_estimate_diff(manager, diff_estimate(batches, snapshot))
+    summary["counts"] = batches.counts()
+    return summary
@@ -3,36 +3,288 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt
 from jose.exceptions import JWTError
 import os
-from typing import Dict, Any
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuração do segredo e algoritmo do JWT (ajuste conforme necessário)
 JWT_SECRET = os.getenv("JWT_SECRET", "AquiToken")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 
+# Chaves assimétricas do Supabase: URL do JWKS (ex.: <SUPABASE_URL>/auth/v1/.well-known/jwks.json)
+# ou caminho de um arquivo local; vazio = só o segredo HS acima
+JWT_JWKS_URL = os.getenv("JWT_JWKS_URL") or None
+JWT_JWKS_REFRESH_SECONDS = float(os.getenv("JWT_JWKS_REFRESH_SECONDS", "600"))
+# Intervalo mínimo entre recargas forçadas por "kid" desconhecido
+JWT_JWKS_MIN_REFRESH_SECONDS = 30.0
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "PS256", "PS384", "PS512")
+
+# JWK sem "alg": algoritmos compatíveis com o tipo (e a curva) da chave
+_KEY_TYPE_ALGORITHMS = {
+    ("RSA", None): ["RS256", "RS384", "RS512", "PS256", "PS384", "PS512"],
+    ("EC", "P-256"): ["ES256"],
+    ("EC", "P-384"): ["ES384"],
+    ("EC", "P-521"): ["ES512"],
+}
+
+# Cache de tokens já verificados (chave = sha256 do token)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_MAX_TTL_SECONDS = float(os.getenv("JWT_CACHE_MAX_TTL_SECONDS", "3600"))
+JWT_NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("JWT_NEGATIVE_CACHE_TTL_SECONDS", "30"))
+
 security = HTTPBearer()
 
+
+# -------------------------------------------------------------------
+# JWKS (chaves públicas) com cache local
+# -------------------------------------------------------------------
+class JWKSUnavailableError(RuntimeError):
+    """O JWKS nunca pôde ser carregado: não há chave contra a qual verificar."""
+
+
+class JWKSCache:
+    """
+    Chaves públicas por ``kid``, carregadas de uma URL ou arquivo JWKS e
+    recarregadas a cada ``refresh_seconds``. Um ``kid`` desconhecido força
+    uma recarga (rotação de chave), no máximo uma vez por ``min_refresh_seconds``.
+    Se a recarga falhar, as chaves anteriores continuam valendo; se a
+    primeira carga falhar (rede, HTTP, arquivo, JSON), levanta
+    ``JWKSUnavailableError`` e só tenta de novo após ``min_refresh_seconds``.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        refresh_seconds: float = JWT_JWKS_REFRESH_SECONDS,
+        min_refresh_seconds: float = JWT_JWKS_MIN_REFRESH_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.clock = clock
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> Dict[str, Any]:
+        if self.source.startswith(("http://", "https://")):
+            import httpx
+
+            response = httpx.get(self.source, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        with open(self.source, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def refresh(self, force: bool = False) -> bool:
+        with self._lock:
+            now = self.clock()
+            if self._loaded_at is not None:
+                age = now - self._loaded_at
+                if age < (self.min_refresh_seconds if force else self.refresh_seconds):
+                    return False
+            elif self._failed_at is not None and now - self._failed_at < self.min_refresh_seconds:
+                # primeira carga falhou há pouco: não refaz o fetch a cada request
+                raise JWKSUnavailableError(f"JWKS indisponível: {self.source}")
+            try:
+                document = self._fetch()
+            except Exception as e:
+                logger.warning("Falha ao carregar o JWKS de %s", self.source, exc_info=True)
+                if self._loaded_at is None:
+                    self._failed_at = now
+                    raise JWKSUnavailableError(f"JWKS indisponível: {self.source}") from e
+                self._loaded_at = now  # mantém as chaves antigas e espera o próximo ciclo
+                return False
+            self._keys = {key["kid"]: key for key in document.get("keys", []) if key.get("kid")}
+            self._loaded_at = now
+            return True
+
+    def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        key = self._keys.get(kid)
+        if key is None and self.refresh(force=True):
+            key = self._keys.get(kid)
+        return key
+
+
+# -------------------------------------------------------------------
+# Cache de claims verificadas
+# -------------------------------------------------------------------
+class VerifiedTokenCache:
+    """
+    LRU limitado de tokens já verificados: claims válidas até o ``exp`` do
+    token; tokens inválidos guardam o erro por ``negative_ttl`` segundos.
+    Um acerto custa o hash do token e uma consulta ao dicionário.
+    """
+
+    def __init__(
+        self,
+        max_size: int = JWT_CACHE_SIZE,
+        max_ttl: float = JWT_CACHE_MAX_TTL_SECONDS,
+        negative_ttl: float = JWT_NEGATIVE_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # chave -> (expira_em, claims, erro)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]], Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[2] is not None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[1], entry[2]
+
+    def put_claims(self, key: str, claims: Dict[str, Any]):
+        now = self.clock()
+        expires_at = now + self.max_ttl
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        if expires_at > now:
+            self._put(key, (expires_at, claims, None))
+
+    def put_error(self, key: str, detail: str):
+        self._put(key, (self.clock() + self.negative_ttl, None, detail))
+
+    def _put(self, key: str, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.negative_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
+
+
+_token_cache = VerifiedTokenCache()
+_jwks: Optional[JWKSCache] = JWKSCache(JWT_JWKS_URL) if JWT_JWKS_URL else None
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    stats = _token_cache.stats()
+    if _jwks is not None:
+        stats["jwks_keys"] = len(_jwks._keys)
+    return stats
+
+
+def log_auth_cache_stats():
+    logger.info("Cache de tokens JWT: %s", get_auth_cache_stats())
+
+
+def _key_algorithms(key: Dict[str, Any]) -> List[str]:
+    """
+    Algoritmos aceitos para uma chave do JWKS: o ``alg`` da chave ou, sem
+    ele, os compatíveis com ``kty``/``crv``. Nunca o que o token declara.
+    """
+    if key.get("alg"):
+        algorithms = [key["alg"]] if key["alg"] in ASYMMETRIC_ALGORITHMS else []
+    else:
+        crv = key.get("crv") if key.get("kty") == "EC" else None
+        algorithms = _KEY_TYPE_ALGORITHMS.get((key.get("kty"), crv), [])
+    if not algorithms:
+        raise JWTError("Chave do JWKS sem algoritmo assimétrico reconhecido")
+    return algorithms
+
+
+def _verify_jwt(token: str) -> Dict[str, Any]:
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        if _jwks is None:
+            raise JWTError("Algoritmo assimétrico sem JWKS configurado (JWT_JWKS_URL)")
+        key = _jwks.get_key(header.get("kid"))
+        if key is None:
+            raise JWTError("Chave (kid) não encontrada no JWKS")
+        # o algoritmo aceito vem da chave, não do que o token declara
+        algorithms = _key_algorithms(key)
+    else:
+        key, algorithms = JWT_SECRET, [JWT_ALGORITHM]
+
+    # Desativa a verificação de audience
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        options={"verify_aud": False}  # ← Desativa verificação
+    )
+
+
 def decode_jwt(token: str) -> Dict[str, Any]:
+    if token.startswith("Bearer "):
+        token = token[7:]
+
+    cache_key = _token_cache.key(token)
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        claims, error = cached
+        if error is not None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=error)
+        return dict(claims)
+
     try:
-        if token.startswith("Bearer "):
-            token = token[7:]
-
-        # Desativa a verificação de audience
-        payload = jwt.decode(
-            token,
-            JWT_SECRET,
-            algorithms=[JWT_ALGORITHM],
-            options={"verify_aud": False}  # ← Desativa verificação
-        )
-        return payload
+        payload = _verify_jwt(token)
     except JWTError as e:
+        detail = f"Token JWT inválido ou expirado: {str(e)}"
+        _token_cache.put_error(cache_key, detail)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Token JWT inválido ou expirado: {str(e)}"
+            detail=detail
+        )
+    except JWKSUnavailableError:
+        # falha nossa (ou do Supabase), não do token: não entra no cache negativo
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Não foi possível obter as chaves de verificação do token. Tente novamente.",
+            headers={"Retry-After": str(int(JWT_JWKS_MIN_REFRESH_SECONDS))},
         )
+    _token_cache.put_claims(cache_key, payload)
+    return dict(payload)
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     token = credentials.credentials
@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.sqlite import get_connection
+
+# Índice (tenant_id, document_id) -> objeto no S3 + metadados do upload.
+# Evita listar o prefixo do tenant a cada preview/schema:infer.
+DOCUMENT_INDEX_PATH = os.getenv(
+    "DOCUMENT_INDEX_PATH", os.path.join(os.getcwd(), "tmp", "index", "documents.db")
+)
+DOCUMENT_INDEX_CACHE_SIZE = int(os.getenv("DOCUMENT_INDEX_CACHE_SIZE", "4096"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    tenant_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    sheets TEXT,
+    filename TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, document_id)
+);
+"""
+
+
+class DocumentIndex:
+    """
+    Metadados de documentos em SQLite (compartilhado pelos workers do nó) com
+    um LRU em memória na frente: lookup é uma leitura por chave primária, ou
+    nem isso quando o documento foi visto recentemente pelo processo.
+    """
+
+    def __init__(self, path: str, cache_size: int = DOCUMENT_INDEX_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._initialized = False
+        self._cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = get_connection(self.path)
+        if not self._initialized:
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    # -------- LRU --------
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._cache.get(key)
+            if record is not None:
+                self._cache.move_to_end(key)
+            return record
+
+    def _cache_put(self, key: Tuple[str, str], record: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = record
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # -------- API --------
+    def put(
+        self,
+        tenant_id: str,
+        document_id: str,
+        object_key: str,
+        ext: str,
+        size: Optional[int] = None,
+        sha256: Optional[str] = None,
+        sheets: Optional[List[Dict[str, Any]]] = None,
+        filename: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        record = {
+            "tenant_id": tenant_id,
+            "document_id": document_id,
+            "object_key": object_key,
+            "ext": ext,
+            "size": size,
+            "sha256": sha256,
+            "sheets": sheets,
+            "filename": filename,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._conn().execute(
+            "INSERT OR REPLACE INTO documents "
+            "(tenant_id, document_id, object_key, ext, size, sha256, sheets, filename, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                tenant_id, document_id, object_key, ext, size, sha256,
+                json.dumps(sheets) if sheets is not None else None, filename, record["created_at"],
+            ),
+        )
+        self._cache_put((tenant_id, document_id), record)
+        return record
+
+    def get(self, tenant_id: str, document_id: str) -> Optional[Dict[str, Any]]:
+        key = (tenant_id, document_id)
+        record = self._cache_get(key)
+        if record is not None:
+            return record
+        row = self._conn().execute(
+            "SELECT * FROM documents WHERE tenant_id = ? AND document_id = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["sheets"] = json.loads(row["sheets"]) if row["sheets"] is not None else None
+        self._cache_put(key, record)
+        return record
+
+    def delete(self, tenant_id: str, document_id: str):
+        with self._lock:
+            self._cache.pop((tenant_id, document_id), None)
+        self._conn().execute(
+            "DELETE FROM documents WHERE tenant_id = ? AND document_id = ?", (tenant_id, document_id)
+        )
+
+
+_index = DocumentIndex(DOCUMENT_INDEX_PATH)
+
+
+def get_document_index() -> DocumentIndex:
+    return _index
@@ -0,0 +1,170 @@
+import os
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from app.core.queue import IMPORT_QUEUE_PATH
+from app.core.sqlite import get_connection, immediate_transaction
+
+# Status possíveis de uma importação
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Retenção de jobs concluídos (o resultado é o orçamento inteiro em JSON):
+# no máximo JOB_HISTORY_LIMIT e nenhum mais velho que JOB_RETENTION_HOURS
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "1000"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+# Colunas próprias; demais campos (filename, op, progresso...) vão em 'extra'
+_COLUMNS = ("tenant_id", "status", "error", "result", "created_at", "updated_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    import_id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    result TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (status, updated_at);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobStore:
+    """
+    Registro de jobs no mesmo SQLite da fila, visível para todos os workers
+    do nó (quem enfileira e quem processa podem ser processos diferentes).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        history_limit: int = JOB_HISTORY_LIMIT,
+        retention_hours: float = JOB_RETENTION_HOURS,
+    ):
+        self.path = path
+        self.history_limit = history_limit
+        self.retention_hours = retention_hours
+        self._initialized = False
+
+    def _conn(self):
+        conn = get_connection(self.path)
+        if not self._initialized:
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        job = {"import_id": row["import_id"], **json.loads(row["extra"])}
+        for col in _COLUMNS:
+            job[col] = row[col]
+        job["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return job
+
+    def create(self, import_id: str, tenant_id: str, **fields: Any) -> Dict[str, Any]:
+        now = _now()
+        status = fields.pop("status", JOB_QUEUED)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (import_id, tenant_id, status, extra, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (import_id, tenant_id, status, json.dumps(fields), now, now),
+        )
+        self.prune()
+        return self.get(import_id)
+
+    def reserve(self, import_id: str, tenant_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """
+        Como ``create``, mas só se o id ainda não existir (INSERT simples: a
+        unicidade fica a cargo da chave primária, sem corrida entre checar e
+        gravar). Devolve ``None`` se o id já estiver em uso, de qualquer tenant.
+        """
+        now = _now()
+        status = fields.pop("status", JOB_QUEUED)
+        try:
+            self._conn().execute(
+                "INSERT INTO jobs (import_id, tenant_id, status, extra, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (import_id, tenant_id, status, json.dumps(fields), now, now),
+            )
+        except sqlite3.IntegrityError:
+            return None
+        self.prune()
+        return self.get(import_id)
+
+    def prune(self) -> int:
+        """
+        Apaga jobs concluídos (done/failed) além do limite de histórico ou
+        mais velhos que a retenção. Jobs na fila ou em processamento ficam.
+        Chamado a cada ``create``: as duas consultas usam o índice
+        (status, updated_at).
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=self.retention_hours)).isoformat()
+        finished = (JOB_DONE, JOB_FAILED)
+        conn = self._conn()
+        with immediate_transaction(conn):
+            removed = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*finished, cutoff)
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM jobs WHERE import_id IN ("
+                "SELECT import_id FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (*finished, self.history_limit),
+            ).rowcount
+        return removed
+
+    def update(self, import_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        with immediate_transaction(conn):
+            row = conn.execute("SELECT extra FROM jobs WHERE import_id = ?", (import_id,)).fetchone()
+            if row is None:
+                return None
+            extra = json.loads(row["extra"])
+            sets, params = ["updated_at = ?"], [_now()]
+            for key, value in fields.items():
+                if key in ("status", "error"):
+                    sets.append(f"{key} = ?")
+                    params.append(value)
+                elif key == "result":
+                    sets.append("result = ?")
+                    params.append(json.dumps(value) if value is not None else None)
+                else:
+                    extra[key] = value
+            sets.append("extra = ?")
+            params.append(json.dumps(extra))
+            conn.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE import_id = ?", (*params, import_id))
+        return self.get(import_id)
+
+    def get(self, import_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE import_id = ?", (import_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+
+_store = JobStore(IMPORT_QUEUE_PATH)
+
+
+def create_job(import_id: str, tenant_id: str, **fields: Any) -> Dict[str, Any]:
+    return _store.create(import_id, tenant_id, **fields)
+
+
+def reserve_job(import_id: str, tenant_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    return _store.reserve(import_id, tenant_id, **fields)
+
+
+def update_job(import_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    return _store.update(import_id, **fields)
+
+
+def get_job(import_id: str) -> Optional[Dict[str, Any]]:
+    return _store.get(import_id)
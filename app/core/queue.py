@@ -1,19 +1,257 @@
-import threading
-from queue import Queue
+import os
+import json
+import time
+import sqlite3
+from uuid import uuid4
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-# Fila thread-safe para simulação
-_import_queue = Queue()
+from app.core.sqlite import get_connection, immediate_transaction
 
-# Lock para leitura segura
-_queue_lock = threading.Lock()
+# Fila durável em SQLite (WAL): sobrevive a restart e é compartilhada pelos
+# workers do uvicorn no mesmo nó. Entrega "at-least-once": a tarefa só sai da
+# fila no ack; se o lease expirar ela volta a ficar visível.
+IMPORT_QUEUE_PATH = os.getenv("IMPORT_QUEUE_PATH", os.path.join(os.getcwd(), "tmp", "queue", "imports.db"))
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("IMPORT_VISIBILITY_TIMEOUT", "600"))
+MAX_ATTEMPTS = int(os.getenv("IMPORT_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = 2.0
+RETRY_BACKOFF_MAX_SECONDS = 300.0
+
+TASK_PENDING = "pending"
+TASK_LEASED = "leased"
+TASK_DEAD = "dead"
+
+_LEASE_EXPIRED_ERROR = "visibility timeout"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    leased_until REAL,
+    lease_token TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_ready ON tasks (status, available_at);
+"""
+
+
+@dataclass
+class QueuedTask:
+    id: int
+    payload: Dict[str, Any]
+    attempts: int
+    # token do lease deste dequeue: ack/retry/dead_letter/extend_lease só valem com ele
+    lease_token: Optional[str] = None
+
+
+class LeaseLostError(RuntimeError):
+    """O lease venceu e a tarefa foi reservada de novo (ou já saiu da fila): o chamador não é mais o dono."""
+
+
+class SQLiteTaskQueue:
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+        on_dead: Optional[Callable[[List["QueuedTask"], str], None]] = None,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        # chamado com as tarefas que o dequeue mandou para 'dead' (lease vencido sem tentativas)
+        self.on_dead = on_dead
+        self._initialized = False
+
+    def _conn(self):
+        conn = get_connection(self.path)
+        if not self._initialized:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "lease_token" not in columns:
+                # fila criada antes do token de lease
+                try:
+                    conn.execute("ALTER TABLE tasks ADD COLUMN lease_token TEXT")
+                except sqlite3.OperationalError:
+                    pass  # outro processo acabou de adicionar
+            self._initialized = True
+        return conn
+
+    # -------- Produção --------
+    def enqueue(self, task: Dict[str, Any], delay: float = 0) -> int:
+        return self.enqueue_many([task], delay)[0]
+
+    def enqueue_many(self, tasks: Iterable[Dict[str, Any]], delay: float = 0) -> List[int]:
+        now = time.time()
+        conn = self._conn()
+        ids = []
+        with immediate_transaction(conn):
+            for task in tasks:
+                cur = conn.execute(
+                    "INSERT INTO tasks (payload, status, available_at, created_at) VALUES (?, ?, ?, ?)",
+                    (json.dumps(task), TASK_PENDING, now + delay, now),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    # -------- Consumo --------
+    def dequeue(self, batch_size: int = 1, visibility_timeout: Optional[float] = None) -> List[QueuedTask]:
+        """
+        Reserva até ``batch_size`` tarefas visíveis (pendentes ou com lease
+        vencido) por ``visibility_timeout`` segundos. Cada reserva recebe um
+        ``lease_token`` novo: quem ficou com um lease vencido não consegue
+        mais fazer ack/retry da tarefa reservada por outro.
+        """
+        now = time.time()
+        lease = visibility_timeout if visibility_timeout is not None else self.visibility_timeout
+        conn = self._conn()
+        with immediate_transaction(conn):
+            # lease vencido sem tentativas restantes: não volta mais para a fila
+            expired = conn.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE status = ? AND leased_until <= ? AND attempts >= ?",
+                (TASK_LEASED, now, self.max_attempts),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status = ?, lease_token = NULL, last_error = COALESCE(last_error, ?) WHERE id = ?",
+                [(TASK_DEAD, _LEASE_EXPIRED_ERROR, row["id"]) for row in expired],
+            )
+            rows = conn.execute(
+                "SELECT id, payload, attempts FROM tasks "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND leased_until <= ?) "
+                "ORDER BY id LIMIT ?",
+                (TASK_PENDING, now, TASK_LEASED, now, batch_size),
+            ).fetchall()
+            tokens = [uuid4().hex for _ in rows]
+            if rows:
+                conn.executemany(
+                    "UPDATE tasks SET status = ?, leased_until = ?, lease_token = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    [(TASK_LEASED, now + lease, token, row["id"]) for row, token in zip(rows, tokens)],
+                )
+        if expired and self.on_dead is not None:
+            self.on_dead(
+                [QueuedTask(row["id"], json.loads(row["payload"]), row["attempts"]) for row in expired],
+                _LEASE_EXPIRED_ERROR,
+            )
+        return [
+            QueuedTask(row["id"], json.loads(row["payload"]), row["attempts"] + 1, token)
+            for row, token in zip(rows, tokens)
+        ]
+
+    # ack/retry/dead_letter: só quem tem o lease atual (id + token) mexe na
+    # tarefa; senão LeaseLostError (o lease venceu e outro worker a reservou)
+    def ack(self, task_id: int, lease_token: str):
+        cur = self._conn().execute(
+            "DELETE FROM tasks WHERE id = ? AND status = ? AND lease_token = ?", (task_id, TASK_LEASED, lease_token)
+        )
+        if cur.rowcount == 0:
+            raise LeaseLostError(f"Tarefa {task_id}: lease perdido, ack ignorado.")
+
+    def retry(self, task_id: int, lease_token: str, error: str) -> bool:
+        """
+        Devolve a tarefa com backoff exponencial. Retorna ``False`` quando as
+        tentativas acabaram (a tarefa fica como 'dead').
+        """
+        conn = self._conn()
+        with immediate_transaction(conn):
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE id = ? AND status = ? AND lease_token = ?",
+                (task_id, TASK_LEASED, lease_token),
+            ).fetchone()
+            if row is None:
+                raise LeaseLostError(f"Tarefa {task_id}: lease perdido, retry ignorado.")
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE tasks SET status = ?, leased_until = NULL, lease_token = NULL, last_error = ? WHERE id = ?",
+                    (TASK_DEAD, error, task_id),
+                )
+                return False
+            delay = min(self.backoff_seconds * (2 ** (row["attempts"] - 1)), RETRY_BACKOFF_MAX_SECONDS)
+            conn.execute(
+                "UPDATE tasks SET status = ?, leased_until = NULL, lease_token = NULL, available_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (TASK_PENDING, time.time() + delay, error, task_id),
+            )
+            return True
+
+    def dead_letter(self, task_id: int, lease_token: str, error: str):
+        """Marca a tarefa como 'dead' sem nova tentativa (erro que não se resolve repetindo)."""
+        cur = self._conn().execute(
+            "UPDATE tasks SET status = ?, leased_until = NULL, lease_token = NULL, last_error = ? "
+            "WHERE id = ? AND status = ? AND lease_token = ?",
+            (TASK_DEAD, error, task_id, TASK_LEASED, lease_token),
+        )
+        if cur.rowcount == 0:
+            raise LeaseLostError(f"Tarefa {task_id}: lease perdido, dead letter ignorado.")
+
+    def extend_lease(
+        self, leases: Iterable[Tuple[int, str]], visibility_timeout: Optional[float] = None
+    ) -> List[int]:
+        """
+        Heartbeat: renova por ``visibility_timeout`` segundos o lease das
+        tarefas ``(id, lease_token)`` ainda reservadas. Devolve os ids cujo
+        lease já foi perdido (não renovados).
+        """
+        lease = visibility_timeout if visibility_timeout is not None else self.visibility_timeout
+        until = time.time() + lease
+        conn = self._conn()
+        lost = []
+        with immediate_transaction(conn):
+            for task_id, lease_token in leases:
+                renewed = conn.execute(
+                    "UPDATE tasks SET leased_until = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                    (until, task_id, TASK_LEASED, lease_token),
+                ).rowcount
+                if not renewed:
+                    lost.append(task_id)
+        return lost
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Remove e devolve todas as tarefas pendentes."""
+        conn = self._conn()
+        with immediate_transaction(conn):
+            rows = conn.execute(
+                "SELECT id, payload FROM tasks WHERE status = ? ORDER BY id", (TASK_PENDING,)
+            ).fetchall()
+            conn.execute("DELETE FROM tasks WHERE status = ?", (TASK_PENDING,))
+        return [json.loads(row["payload"]) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def _fail_dead_import_jobs(tasks: List[QueuedTask], error: str):
+    # import tardio: app.core.jobs importa este módulo
+    from app.core.jobs import JOB_FAILED, update_job
+
+    for task in tasks:
+        if task.payload.get("import_id"):
+            update_job(task.payload["import_id"], status=JOB_FAILED, error=error)
+
+
+_import_queue = SQLiteTaskQueue(IMPORT_QUEUE_PATH, on_dead=_fail_dead_import_jobs)
+
+def get_import_queue() -> SQLiteTaskQueue:
+    return _import_queue
 
 def enqueue_import_task(task: dict):
-    with _queue_lock:
-        _import_queue.put(task)
+    _import_queue.enqueue(task)
+
+def dequeue_import_tasks(batch_size: int = 1) -> List[QueuedTask]:
+    return _import_queue.dequeue(batch_size)
+
+def ack_import_task(task_id: int, lease_token: str):
+    _import_queue.ack(task_id, lease_token)
+
+def retry_import_task(task_id: int, lease_token: str, error: str) -> bool:
+    return _import_queue.retry(task_id, lease_token, error)
 
 def get_all_tasks():
-    with _queue_lock:
-        tasks = []
-        while not _import_queue.empty():
-            tasks.append(_import_queue.get())
-        return tasks
+    return _import_queue.drain()
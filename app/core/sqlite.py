@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+# Conexões por (processo, thread, arquivo): sqlite3 não compartilha conexão
+# entre threads e não pode atravessar um fork.
+_local = threading.local()
+
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """Conexão em autocommit, com WAL, para um arquivo SQLite local."""
+    conns: Dict[Tuple[int, str], sqlite3.Connection] = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    key = (os.getpid(), path)
+    conn = conns.get(key)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conns[key] = conn
+    return conn
+
+
+@contextmanager
+def immediate_transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """``BEGIN IMMEDIATE``: reserva a escrita já no início (evita corrida entre processos)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
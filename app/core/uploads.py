@@ -0,0 +1,74 @@
+import os
+import hashlib
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile
+
+MAX_FILE_SIZE_MB = 30
+MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+
+# Tamanho de cada bloco copiado do corpo do upload (pico de memória por upload)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+class HashingReader:
+    """
+    Envolve o corpo do upload: calcula SHA-256 e tamanho conforme os bytes
+    passam e aborta com 413 assim que ``max_bytes`` é ultrapassado. Serve
+    tanto para copiar em disco quanto como fileobj (ex.: upload multipart S3).
+    """
+
+    def __init__(self, source: BinaryIO, max_bytes: Optional[int] = MAX_FILE_SIZE_BYTES):
+        self.source = source
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        if chunk:
+            self.size += len(chunk)
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Arquivo excede o limite de {self.max_bytes // (1024 * 1024)}MB",
+                )
+            self._hash.update(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def spool_upload(
+    file: UploadFile,
+    dest_path: str,
+    max_bytes: Optional[int] = MAX_FILE_SIZE_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> SpooledUpload:
+    """
+    Copia o upload para ``dest_path`` em blocos de ``chunk_size``, com hash e
+    validação de tamanho na mesma passada. Em erro (inclusive o 413) o
+    arquivo parcial é removido.
+    """
+    reader = HashingReader(file.file, max_bytes)
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        with open(dest_path, "wb") as f_out:
+            for chunk in iter(lambda: reader.read(chunk_size), b""):
+                f_out.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return SpooledUpload(path=dest_path, size=reader.size, sha256=reader.hexdigest())
@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import BrokenExecutor, CancelledError, Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from app.core.jobs import JOB_DONE, JOB_FAILED, JOB_PROCESSING, JOB_QUEUED, update_job
+from app.core.queue import LeaseLostError, QueuedTask, SQLiteTaskQueue, get_import_queue
+from app.application.common.imports.usecases.parse_estimate_analytics import parse_estimate_analytics_usecase
+from app.services.parse_cache import parse_cache
+
+logger = logging.getLogger(__name__)
+
+# Processos dedicados ao parse (limita CPU/memória usados por importações)
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# Intervalo para reavaliar o pedido de parada enquanto espera a fila
+_POLL_SECONDS = 0.5
+
+# Erros que podem não se repetir numa nova tentativa (processo morto, falta de
+# memória, rede, shutdown). Os demais (arquivo corrompido, formato não
+# suportado, validação) falham o job na hora.
+TRANSIENT_TASK_ERRORS = (BrokenExecutor, CancelledError, MemoryError, TimeoutError, ConnectionError, InterruptedError)
+
+
+def is_transient_task_error(exc: BaseException) -> bool:
+    return isinstance(exc, TRANSIENT_TASK_ERRORS)
+
+
+# -------------------------------------------------------------------
+# Handlers (rodam no processo filho: precisam ser funções de módulo)
+# -------------------------------------------------------------------
+def run_estimate_analytics(task: dict) -> dict:
+    result = parse_estimate_analytics_usecase(task["file_path"], task.get("filename") or task["file_path"])
+    if task.get("cache_key"):
+        try:
+            parse_cache.set(task["cache_key"], result)
+        except OSError:
+            logger.warning("Não foi possível gravar o cache de parse de %s", task["import_id"], exc_info=True)
+    return result
+
+
+TASK_HANDLERS: Dict[str, Callable[[dict], dict]] = {
+    "estimate_analytics": run_estimate_analytics,
+}
+
+
+class ImportWorker:
+    """
+    Consome a fila de importação numa thread e executa cada tarefa num
+    ``ProcessPoolExecutor`` limitado. Reserva até ``max_workers`` tarefas por
+    vez (dequeue em lote); o restante continua na fila durável. Sucesso faz
+    ack; erro transitório devolve a tarefa com backoff até esgotar as
+    tentativas, qualquer outro falha o job direto. Enquanto uma tarefa roda,
+    o lease é renovado a cada ``heartbeat_seconds`` (parse longo não volta
+    para a fila nem é pego por outro worker).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = IMPORT_WORKERS,
+        queue: Optional[SQLiteTaskQueue] = None,
+        poll_seconds: float = _POLL_SECONDS,
+        heartbeat_seconds: Optional[float] = None,
+    ):
+        self.max_workers = max_workers
+        self.queue = queue if queue is not None else get_import_queue()
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = (
+            heartbeat_seconds if heartbeat_seconds is not None else self.queue.visibility_timeout / 3
+        )
+        self._in_flight: Dict[int, QueuedTask] = {}
+        self._in_flight_lock = threading.Lock()
+        self._last_heartbeat = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._thread = threading.Thread(target=self._run, name="import-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            # tarefas canceladas voltam para a fila (retry) e são retomadas no próximo start
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def _reserve_slots(self) -> int:
+        if not self._slots.acquire(timeout=self.poll_seconds):
+            return 0
+        reserved = 1
+        while reserved < self.max_workers and self._slots.acquire(blocking=False):
+            reserved += 1
+        return reserved
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        if now - self._last_heartbeat < self.heartbeat_seconds:
+            return
+        self._last_heartbeat = now
+        with self._in_flight_lock:
+            leases = [(task.id, task.lease_token) for task in self._in_flight.values()]
+        if not leases:
+            return
+        try:
+            lost = self.queue.extend_lease(leases)
+        except Exception:
+            logger.exception("Falha ao renovar o lease das importações em andamento")
+            return
+        for task_id in lost:
+            # o resultado desta execução será descartado (ack/retry levantam LeaseLostError)
+            logger.warning("Lease da tarefa %s perdido: reservada por outro worker", task_id)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._heartbeat()
+            reserved = self._reserve_slots()
+            if not reserved:
+                continue
+            try:
+                tasks = self.queue.dequeue(batch_size=reserved)
+            except Exception:
+                logger.exception("Falha ao ler a fila de importação")
+                tasks = []
+            for _ in range(reserved - len(tasks)):
+                self._slots.release()
+            if not tasks:
+                self._stop.wait(self.poll_seconds)
+                continue
+            for task in tasks:
+                try:
+                    self._dispatch(task)
+                except Exception as e:
+                    # ex.: SQLite "database is locked" antes de a tarefa chegar ao
+                    # pool: a thread segue viva, a vaga é liberada e a tarefa volta à fila
+                    logger.exception("Falha ao despachar a tarefa %s da fila de importação", task.id)
+                    self._abandon(task, e)
+
+    def _abandon(self, task: QueuedTask, error: BaseException):
+        """Desfaz a reserva de uma tarefa que não chegou ao pool (``_dispatch`` falhou)."""
+        with self._in_flight_lock:
+            self._in_flight.pop(task.id, None)
+        self._slots.release()
+        try:
+            self.queue.retry(task.id, task.lease_token, str(error))
+        except Exception:
+            # sem retry, a tarefa volta sozinha quando o lease vencer
+            logger.exception("Falha ao devolver a tarefa %s à fila", task.id)
+
+    def _dispatch(self, task: QueuedTask):
+        """
+        Envia a tarefa ao pool. Se levantar exceção, a vaga ainda não foi
+        liberada (quem chama faz ``_abandon``); depois do submit, o
+        ``_on_done`` cuida de tudo e não propaga erros.
+        """
+        handler = TASK_HANDLERS.get(task.payload.get("op"))
+        if handler is None:
+            # sem handler a tarefa nunca vai rodar: fica como 'dead' (visível
+            # em stats/last_error) em vez de sumir com um ack silencioso
+            logger.error("Tarefa %s sem handler para op=%r", task.id, task.payload.get("op"))
+            self.queue.dead_letter(task.id, task.lease_token, f"Sem handler para op={task.payload.get('op')!r}")
+            self._slots.release()
+            return
+
+        import_id = task.payload["import_id"]
+        update_job(import_id, status=JOB_PROCESSING, attempts=task.attempts)
+        with self._in_flight_lock:
+            self._in_flight[task.id] = task
+        try:
+            future = self._executor.submit(handler, task.payload)
+        except Exception as e:
+            # pool fechado/quebrado no submit: a tarefa não chegou a rodar, volta para a fila
+            self._on_done(task, None, error=e, retryable=True)
+            return
+        future.add_done_callback(partial(self._on_done, task))
+
+    def _on_done(
+        self,
+        task: QueuedTask,
+        future: Optional[Future],
+        error: Optional[BaseException] = None,
+        retryable: bool = False,
+    ):
+        with self._in_flight_lock:
+            self._in_flight.pop(task.id, None)
+        self._slots.release()
+        try:
+            self._record_outcome(task, future, error, retryable)
+        except LeaseLostError:
+            # lease vencido e tarefa reservada de novo: o job agora é do novo dono
+            logger.warning("Importação %s: lease perdido, a tarefa segue com quem a reservou de novo",
+                           task.payload["import_id"])
+        except Exception:
+            # fila/jobs indisponíveis: a tarefa continua reservada e volta quando o lease vencer
+            logger.exception("Falha ao registrar o resultado da importação %s", task.payload["import_id"])
+
+    def _record_outcome(
+        self,
+        task: QueuedTask,
+        future: Optional[Future],
+        error: Optional[BaseException],
+        retryable: bool,
+    ):
+        import_id = task.payload["import_id"]
+        try:
+            if error is not None:
+                raise error
+            result = future.result()
+        except BaseException as e:
+            logger.exception("Falha ao processar importação %s (tentativa %s)", import_id, task.attempts)
+            if (retryable or is_transient_task_error(e)) and self.queue.retry(task.id, task.lease_token, str(e)):
+                update_job(import_id, status=JOB_QUEUED, error=str(e))
+            else:
+                if not retryable and not is_transient_task_error(e):
+                    self.queue.dead_letter(task.id, task.lease_token, str(e))
+                update_job(import_id, status=JOB_FAILED, error=str(e))
+        else:
+            # job antes do ack: se o ack falhar a tarefa roda de novo, mas o resultado não se perde
+            update_job(import_id, status=JOB_DONE, result=result, error=None)
+            self.queue.ack(task.id, task.lease_token)
+
+
+_worker = ImportWorker()
+
+
+def start_import_worker():
+    _worker.start()
+
+
+def stop_import_worker():
+    _worker.stop()
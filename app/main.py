@@ -1,5 +1,11 @@
 from fastapi import FastAPI
+from app.core.auth import log_auth_cache_stats
 from app.api.v1.endpoints import clients, locations, imports, documents
+from app.core.worker import start_import_worker, stop_import_worker
+from app.services.supabase_manager import close_postgrest_clients
+from app.services.office_pool import close_office_pool
+from app.services.excel_markdown import close_excel_markdown_pool
+from app.services.pdf_markdown import close_pdf_markdown_pool
 
 app = FastAPI(title="API SaaS - By Orceu")
 
@@ -7,3 +13,20 @@ app.include_router(clients.router, prefix="/v1/clients", tags=["clients"])
 app.include_router(locations.router, prefix="/v1/locations", tags=["locations"])
 app.include_router(imports.router, prefix="/v1/imports", tags=["imports"])
 app.include_router(documents.router, prefix="/v1/documents", tags=["documents"])
+
+# worker de importação (parse fora da thread da requisição)
+app.add_event_handler("startup", start_import_worker)
+app.add_event_handler("shutdown", stop_import_worker)
+
+# pool HTTP compartilhado do Supabase
+app.add_event_handler("shutdown", close_postgrest_clients)
+
+# processos do LibreOffice (conversão XLSX -> PDF)
+app.add_event_handler("shutdown", close_office_pool)
+
+# pools de processos do Markdown em modo raw (abas do Excel, páginas do PDF)
+app.add_event_handler("shutdown", close_excel_markdown_pool)
+app.add_event_handler("shutdown", close_pdf_markdown_pool)
+
+# acertos do cache de tokens JWT e chaves do JWKS carregadas
+app.add_event_handler("shutdown", log_auth_cache_stats)
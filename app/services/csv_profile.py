@@ -0,0 +1,147 @@
+# app/services/csv_profile.py
+
+import io
+import csv
+import mmap
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import numpy as np
+from chardet.universaldetector import UniversalDetector
+
+CSV_SAMPLE_ROWS = 20
+# Encoding: alimenta o detector aos poucos até ele decidir (ou até este limite)
+ENCODING_DETECT_MAX_BYTES = 64 * 1024
+_DETECT_CHUNK = 4096
+SNIFF_SAMPLE_CHARS = 4096
+# Contagem de registros: tamanho de cada view sobre o mmap
+COUNT_CHUNK_SIZE = 1024 * 1024
+
+# Encodings em que '\n' e as aspas não são um byte só: contagem pelo csv.reader
+_MULTIBYTE_NEWLINE_ENCODINGS = ("utf-16", "utf-32", "utf_16", "utf_32")
+
+
+def detect_encoding(f: BinaryIO, max_bytes: int = ENCODING_DETECT_MAX_BYTES) -> str:
+    detector = UniversalDetector()
+    read = 0
+    while read < max_bytes and not detector.done:
+        chunk = f.read(_DETECT_CHUNK)
+        if not chunk:
+            break
+        detector.feed(chunk)
+        read += len(chunk)
+    detector.close()
+    return detector.result.get("encoding") or "utf-8"
+
+
+def _count_records_binary(data, quotechar: bytes, delimiter: bytes, chunk_size: int = COUNT_CHUNK_SIZE) -> Optional[int]:
+    """
+    Conta registros CSV contando quebras de linha fora de aspas: uma quebra
+    está dentro de um campo quando o número de aspas antes dela é ímpar (""
+    escapado soma 2, então não muda a paridade). ``data`` pode ser um mmap:
+    os blocos são views numpy, sem cópia.
+
+    A paridade só vale se toda aspa estiver onde o ``csv.reader`` a trata
+    como delimitadora de campo: a que abre vem logo após delimitador, quebra
+    de linha ou outra aspa (escape); a que fecha vem antes de um desses ou do
+    fim. Uma aspa solta no meio de um campo (``TUBO 1/2"``) é literal para o
+    csv e devolve ``None``: quem chama conta pelo ``csv.reader``.
+    """
+    size = len(data)
+    if size == 0:
+        return 0
+    newline = b"\n" if data.find(b"\n") != -1 else b"\r"  # arquivos só com CR (Mac antigo)
+    last_byte = data[size - 1:size]
+    newline_byte, quote_byte = newline[0], quotechar[0]
+    # bytes que podem cercar uma aspa delimitadora
+    boundary = np.zeros(256, dtype=bool)
+    boundary[[delimiter[0], ord("\n"), ord("\r"), quote_byte]] = True
+    records = 0
+    in_quotes = 0
+    buf = np.frombuffer(data, dtype=np.uint8)
+    arr = None
+    try:
+        for start in range(0, size, chunk_size):
+            arr = buf[start:start + chunk_size]
+            quotes = np.flatnonzero(arr == quote_byte)
+            if not in_quotes and quotes.size == 0:
+                records += int(np.count_nonzero(arr == newline_byte))
+                continue
+            positions = quotes + start
+            opening = ((np.arange(quotes.size) + in_quotes) & 1) == 0
+            prev_ok = np.ones(quotes.size, dtype=bool)
+            has_prev = positions > 0
+            prev_ok[has_prev] = boundary[buf[positions[has_prev] - 1]]
+            next_ok = np.ones(quotes.size, dtype=bool)
+            has_next = positions < size - 1
+            next_ok[has_next] = boundary[buf[positions[has_next] + 1]]
+            if not np.all(np.where(opening, prev_ok, next_ok)):
+                return None
+            newlines = np.flatnonzero(arr == newline_byte)
+            quotes_before = np.searchsorted(quotes, newlines) + in_quotes
+            records += int(newlines.size - np.count_nonzero(quotes_before & 1))
+            in_quotes = (in_quotes + quotes.size) & 1
+    finally:
+        del buf, arr  # libera o buffer antes de o mmap ser fechado
+    # última linha sem quebra no fim, ou campo entre aspas que não fecha até o EOF
+    if in_quotes or last_byte not in (b"\n", b"\r"):
+        records += 1
+    return records
+
+
+def count_records(f: BinaryIO, encoding: str, delimiter: str = ",", quotechar: str = '"') -> int:
+    """
+    Total de registros (linhas lógicas) do CSV, respeitando campos entre
+    aspas. Contagem binária (mmap + numpy) quando as aspas são bem formadas;
+    senão (ou em encodings multibyte), pelo ``csv.reader``.
+    """
+    f.seek(0, io.SEEK_END)
+    if f.tell() == 0:
+        return 0
+    if not encoding.lower().startswith(_MULTIBYTE_NEWLINE_ENCODINGS):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            records = _count_records_binary(data, quotechar.encode(encoding), delimiter.encode(encoding))
+        if records is not None:
+            return records
+    f.seek(0)
+    text = io.TextIOWrapper(f, encoding=encoding, errors="ignore", newline="")
+    try:
+        return sum(1 for _ in csv.reader(text, delimiter=delimiter, quotechar=quotechar))
+    finally:
+        text.detach()
+
+
+def profile_csv(path: str, sample_rows: int = CSV_SAMPLE_ROWS) -> Dict[str, Any]:
+    """
+    Encoding, delimitador, primeiras ``sample_rows`` linhas e total de
+    registros, abrindo o arquivo uma única vez.
+    """
+    with open(path, "rb") as f:
+        encoding = detect_encoding(f)
+
+        f.seek(0)
+        text = io.TextIOWrapper(f, encoding=encoding, errors="ignore", newline="")
+        try:
+            sample = text.read(SNIFF_SAMPLE_CHARS)
+            try:
+                delimiter = csv.Sniffer().sniff(sample).delimiter if sample else ","
+            except csv.Error:
+                delimiter = ","
+
+            text.seek(0)
+            rows: List[List[str]] = []
+            for i, row in enumerate(csv.reader(text, delimiter=delimiter)):
+                if i >= sample_rows:
+                    break
+                # Trim + substitui None por ""
+                rows.append([str(cell).strip() if cell is not None else "" for cell in row])
+        finally:
+            text.detach()
+
+        total_rows = count_records(f, encoding, delimiter)
+
+    return {
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "sample_rows": rows,
+        "total_rows": total_rows,
+    }
@@ -0,0 +1,181 @@
+# app/services/download_cache.py
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.join(os.getcwd(), "tmp", "s3_cache"))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Entradas usadas há menos que isso não são removidas (podem estar sendo lidas)
+DOWNLOAD_CACHE_MIN_AGE_SECONDS = 60.0
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    Lock exclusivo entre processos (fcntl); sem fcntl, segue sem lock.
+    Devolve ``False`` se ``blocking=False`` e o lock estiver com outro.
+    A limpeza do cache apaga o ``.lock`` enquanto o segura: quem estava
+    esperando acorda com o lock de um arquivo que não está mais no caminho,
+    percebe pelo inode e tenta de novo no arquivo novo.
+    """
+    try:
+        import fcntl
+    except ImportError:  # Windows: o os.replace atômico ainda garante leitura íntegra
+        yield True
+        return
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    while True:
+        f = open(path, "a+b")
+        try:
+            fcntl.flock(f.fileno(), flags)
+        except BlockingIOError:
+            f.close()
+            yield False
+            return
+        try:
+            held = os.fstat(f.fileno())
+            current = os.stat(path)
+            if (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino):
+                break
+        except FileNotFoundError:
+            pass
+        f.close()  # lock de um .lock já removido: não protege nada
+    try:
+        yield True
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+class S3DownloadCache:
+    """
+    Cache read-through, em disco, de objetos do S3. A chave é object key +
+    ETag (objeto sobrescrito => outra entrada). Vários workers podem pedir o
+    mesmo objeto ao mesmo tempo: um baixa, os outros esperam o lock e leem.
+    Os arquivos devolvidos pertencem ao cache: não apague nem altere.
+    """
+
+    def __init__(
+        self,
+        storage,
+        root: str = DOWNLOAD_CACHE_DIR,
+        max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES,
+        min_age_seconds: float = DOWNLOAD_CACHE_MIN_AGE_SECONDS,
+    ):
+        self.storage = storage
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age_seconds = min_age_seconds
+
+    def _path(self, object_name: str, etag: str) -> str:
+        digest = hashlib.sha256(f"{object_name}|{etag}".encode("utf-8")).hexdigest()
+        ext = os.path.splitext(object_name)[1].lower()
+        return os.path.join(self.root, digest[:2], f"{digest}{ext}")
+
+    def lookup(self, object_name: str, etag: str) -> Optional[str]:
+        """Caminho local se a versão ``etag`` do objeto já estiver no cache."""
+        path = self._path(object_name, etag.strip('"'))
+        return path if self._touch(path) else None
+
+    def fetch(self, object_name: str, etag: Optional[str] = None) -> str:
+        """Caminho local do objeto, baixando só na primeira vez."""
+        if etag is None:
+            head = self.storage.head_object(object_name)
+            if head is None:
+                raise FileNotFoundError(object_name)
+            etag = head["ETag"]
+        path = self._path(object_name, etag.strip('"'))
+        if self._touch(path):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _file_lock(f"{path}.lock"):
+            if self._touch(path):  # outro worker baixou enquanto esperávamos
+                return path
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            os.close(fd)
+            try:
+                self.storage.download_file(object_name, tmp_path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        self._evict(keep=path)
+        return path
+
+    def seed(self, object_name: str, etag: str, src_path: str) -> str:
+        """
+        Move para o cache um arquivo local que acabou de ser enviado ao S3
+        (o próximo passo do pipeline não precisa baixar).
+        """
+        path = self._path(object_name, etag.strip('"'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            shutil.move(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict(keep=path)
+        return path
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)  # marca uso recente (LRU)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict(self, keep: Optional[str] = None):
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith((".lock", ".part")):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        recent = time.time() - self.min_age_seconds
+        for mtime, size, full in entries:
+            if mtime > recent:
+                break  # daqui em diante tudo foi usado há pouco
+            if full == keep:
+                continue
+            # com o lock da entrada: ninguém está baixando/gravando ela agora;
+            # o .lock só é apagado enquanto seguro (ver _file_lock)
+            with _file_lock(f"{full}.lock", blocking=False) as locked:
+                if not locked:
+                    continue
+                try:
+                    os.remove(full)
+                except (FileNotFoundError, PermissionError):
+                    continue
+                finally:
+                    try:
+                        os.remove(f"{full}.lock")
+                    except OSError:
+                        pass
+            total -= size
+            if total <= self.max_bytes:
+                break
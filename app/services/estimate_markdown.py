@@ -0,0 +1,153 @@
+# app/services/estimate_markdown.py
+
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Tamanho aproximado de cada pedaço entregue ao arquivo/resposta
+MARKDOWN_CHUNK_CHARS = 64 * 1024
+
+TABLE_HEADER = (
+    "| Tipagem | Código | Banco | Descrição | Tipo | Und | Quant. | Valor Unit | Total |\n"
+    "|---|---|---|---|---|:---:|---:|---:|---:|"
+)
+
+
+def fmt_money(x):
+    if x is None:
+        return ""
+    s = f"{x:,.2f}"
+    s = s.replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"R$ {s}"
+
+
+def _item_line(kind: str, item: Dict[str, Any]) -> str:
+    desc = (item.get("name") or "").replace("|", "\\|")
+    return (
+        f"| {kind} | {item.get('code','')} | {item.get('bank','')} | {desc} | "
+        f"{item.get('type','')} | {item.get('unit_symbol') or ''} | "
+        f"{'' if item.get('quantity') is None else item['quantity']} | "
+        f"{'' if item.get('price_unit') is None else fmt_money(item['price_unit'])} | "
+        f"{'' if item.get('price_total') is None else fmt_money(item['price_total'])} |"
+    )
+
+
+def iter_estimate_lines(estimate_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    Linhas do Markdown hierárquico do orçamento (sem o "\\n" final), numa
+    única passada pela árvore com pilha explícita.
+    """
+    name = estimate_data.get("name") or "Obra"
+    bdi = estimate_data.get("bdi_global")
+    header = f"# {name}"
+    if bdi is not None:
+        header += f"\n\n**BDI global:** {bdi:.2%}"
+    yield header
+    last = header
+
+    stack = [(iter(estimate_data.get("estimate_items") or []), 2)]
+    while stack:
+        items, level = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        t = item.get("estimate_item_type")
+
+        if t == "stage":
+            # título de seção
+            title = f'{"#"*level} {item.get("index","")} {item.get("name") or ""}'.strip()
+            if item.get("price_total") is not None:
+                title += f" — {fmt_money(item['price_total'])}"
+            yield title
+            last = title
+            stack.append((iter(item.get("estimate_items") or item.get("estimate_item") or []), level + 1))
+
+        elif t in ("composition", "resource"):
+            # tabela única
+            if not last.startswith("| Tipagem"):
+                yield ""
+                yield TABLE_HEADER
+            yield _item_line(t, item)
+
+            # se for composição, também lista filhos
+            if t == "composition":
+                for r in item.get("composition_child") or []:
+                    yield _item_line("resource", r)
+            yield ""
+            last = ""
+
+
+def iter_markdown_chunks(lines: Iterable[str], chunk_chars: int = MARKDOWN_CHUNK_CHARS) -> Iterator[str]:
+    """Junta as linhas com "\\n" (como ``"\\n".join``) em pedaços de ~``chunk_chars``."""
+    buffer = []
+    size = 0
+    first = True
+    for line in lines:
+        if not first:
+            buffer.append("\n")
+            size += 1
+        first = False
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_chars:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def iter_estimate_markdown(estimate_data: Dict[str, Any], chunk_chars: int = MARKDOWN_CHUNK_CHARS) -> Iterator[str]:
+    return iter_markdown_chunks(iter_estimate_lines(estimate_data), chunk_chars)
+
+
+def estimate_to_markdown(estimate_data: Dict[str, Any]) -> str:
+    return "".join(iter_estimate_markdown(estimate_data))
+
+
+def iter_text_chunks(text: str, chunk_chars: int = MARKDOWN_CHUNK_CHARS) -> Iterator[str]:
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+
+
+def tee_to_file(chunks: Iterable[str], path: str, encoding: str = "utf-8") -> Iterator[bytes]:
+    """
+    Grava os pedaços em ``path`` enquanto os repassa (codificados) a quem
+    consome, p.ex. uma ``StreamingResponse``. Escreve num ``.part`` e só
+    troca pelo arquivo final no fim: um download simultâneo nunca vê o
+    arquivo pela metade. Se o consumo for interrompido, o ``.part`` some.
+    """
+    tmp_path = f"{path}.part"
+    completed = False
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode(encoding)
+                f.write(data)
+                yield data
+        os.replace(tmp_path, path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_chunks(chunks: Iterable[str], path: str, encoding: str = "utf-8") -> int:
+    """Grava os pedaços em ``path`` (via ``tee_to_file``); devolve os bytes escritos."""
+    return sum(len(data) for data in tee_to_file(chunks, path, encoding))
+
+
+def write_and_join_chunks(chunks: Iterable[str], path: str, encoding: str = "utf-8") -> str:
+    """
+    Grava os pedaços em ``path`` e devolve o texto inteiro, juntado uma vez
+    só no fim: para quem precisa do arquivo e da string sem renderizar duas vezes.
+    """
+    parts: List[str] = []
+
+    def collect() -> Iterator[str]:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+
+    for _ in tee_to_file(collect(), path, encoding):
+        pass
+    return "".join(parts)
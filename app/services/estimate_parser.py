@@ -1,11 +1,19 @@
 # app/services/estimate_parser.py
 
 import re
-from typing import Optional, List, Dict, Any, Tuple
+import math
+from itertools import chain, islice
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Iterator, Sequence
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
 
 from app.utils.number import br_to_float
-from app.services.estimate_tree import ensure_stage_path, add_child_to_index
+from app.services.estimate_tree import EstimateTreeBuilder
+
+# Versão da saída do parser: altere quando o JSON gerado mudar (invalida o cache de parse)
+PARSER_VERSION = "1"
 
 # ----------------------------------
 # Regexes e splits
@@ -179,72 +187,133 @@ def _find_stage_by_index(root_list: List[Dict[str, Any]], idx: str) -> Optional[
                 return found
     return None
 
-def _finalize_schema_exact(estimate_data: Dict[str, Any]) -> Dict[str, Any]:
+def _finalize_schema_exact(
+    estimate_data: Dict[str, Any],
+    tree: Optional[EstimateTreeBuilder] = None,
+) -> Dict[str, Any]:
     """
     Aplica apenas a transformação exigida pelo JSON-alvo:
     - No estágio de índice "1", renomear 'estimate_items' -> 'estimate_item'
+    Com ``tree`` o estágio vem do índice do builder, sem percorrer a árvore.
     """
-    stage_1 = _find_stage_by_index(estimate_data.get("estimate_items", []), "1")
+    if tree is not None:
+        stage_1 = tree.find_stage("1")
+    else:
+        stage_1 = _find_stage_by_index(estimate_data.get("estimate_items", []), "1")
     if stage_1 and "estimate_items" in stage_1:
         stage_1["estimate_item"] = stage_1.pop("estimate_items")
     return estimate_data
 
+# ----------------------------------
+# Classificação colunar das linhas
+# ----------------------------------
+ROW_BLANK = 0
+ROW_HEADER = 1
+ROW_STAGE = 2
+ROW_ITEM = 3
+ROW_OTHER = 4
+
+TABULAR_MIN_COLUMNS = 9
+
+def _strip_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte a aba lida com dtype=str em células texto sem espaços nas pontas ('' para vazio)."""
+    return df.fillna("").astype(str).apply(lambda col: col.str.strip())
+
+def classify_rows(cells: pd.DataFrame) -> np.ndarray:
+    """
+    Classifica todas as linhas de uma vez (operações vetorizadas por coluna):
+    vazia, cabeçalho tabular, estágio (``INDEX_AT_START_RE`` na 1ª coluna),
+    item tabular (>= 9 colunas) ou outra.
+    """
+    n_rows, n_cols = cells.shape
+    if n_rows == 0 or n_cols == 0:
+        return np.full(n_rows, ROW_BLANK, dtype=np.int8)
+
+    first = cells.iloc[:, 0]
+    blank = (cells == "").all(axis=1).to_numpy()
+
+    if n_cols > 1:
+        joined = first.str.cat([cells.iloc[:, i] for i in range(1, n_cols)], sep="")
+    else:
+        joined = first
+    low = joined.str.lower()
+    has_codigo = low.str.contains("código", regex=False)
+    header = (
+        (has_codigo & low.str.contains("descr", regex=False) & low.str.contains("total", regex=False))
+        | (low.str.contains("tipagem", regex=False) & has_codigo)
+    ).to_numpy()
+
+    stage = first.str.match(INDEX_AT_START_RE.pattern, flags=INDEX_AT_START_RE.flags).to_numpy()
+
+    return np.select(
+        [blank, header, stage, np.full(n_rows, n_cols >= TABULAR_MIN_COLUMNS)],
+        [ROW_BLANK, ROW_HEADER, ROW_STAGE, ROW_ITEM],
+        default=ROW_OTHER,
+    ).astype(np.int8)
+
+def classify_cells(cells: Sequence[str]) -> int:
+    """Versão escalar de ``classify_rows`` para o modo streaming (uma linha por vez)."""
+    if not any(cells):
+        return ROW_BLANK
+    header_line = "".join(cells).lower()
+    if ("código" in header_line and "descr" in header_line and "total" in header_line) \
+       or ("tipagem" in header_line and "código" in header_line):
+        return ROW_HEADER
+    if INDEX_AT_START_RE.match(cells[0]):
+        return ROW_STAGE
+    if len(cells) >= TABULAR_MIN_COLUMNS:
+        return ROW_ITEM
+    return ROW_OTHER
+
 # ----------------------------------
 # Parser principal
 # ----------------------------------
-def choose_sheet(xls: pd.ExcelFile) -> str:
+def choose_sheet_name(sheet_names: List[str]) -> str:
     desired_names = [
         "analitico", "analítico", "analitico_orcamento",
         "planilha orçamentária analítica", "planilha orcamentaria analitica"
     ]
-    lower_names = [s.lower() for s in xls.sheet_names]
+    lower_names = [s.lower() for s in sheet_names]
     for name in desired_names:
         if name in lower_names:
-            return xls.sheet_names[lower_names.index(name)]
-    return xls.sheet_names[0]
-
-def parse_excel_to_json_freeform(file_path: str) -> dict:
-    xls = pd.ExcelFile(file_path)
-    sheet_name = choose_sheet(xls)
+            return sheet_names[lower_names.index(name)]
+    return sheet_names[0]
 
-    # lê a aba completa, sem header
-    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, dtype=str)
+def choose_sheet(xls: pd.ExcelFile) -> str:
+    return choose_sheet_name(xls.sheet_names)
 
-    # nome da obra + bdi
-    lines_joined = [" ".join(str(c) for c in row if pd.notna(c)) for _, row in df.iterrows()]
-    work_name, bdi_global = _extract_work_name_and_bdi(lines_joined)
+def _build_estimate(
+    classified_rows: Iterable[Tuple[int, Sequence[str]]],
+    head_lines: List[str],
+) -> dict:
+    """
+    Máquina de estados estágio/composição. Recebe apenas as linhas já
+    classificadas como ROW_STAGE ou ROW_ITEM, na ordem da planilha.
+    """
+    work_name, bdi_global = _extract_work_name_and_bdi(head_lines)
 
     estimate_data: Dict[str, Any] = {
         "name": work_name,
         "bdi_global": bdi_global,
         "estimate_items": []
     }
+    tree = EstimateTreeBuilder(estimate_data["estimate_items"])
 
     current_composition: Optional[Dict[str, Any]] = None
     last_stage_index_for_auto: Optional[str] = None
     auto_seq = 0
 
-    for _, row in df.iterrows():
-        cells = [str(c).strip() if pd.notna(c) else "" for c in row.tolist()]
-        if not any(cells):
-            continue
-
-        # cabeçalho tabular
-        header_line = "".join(cells).lower()
-        if ("código" in header_line and "descr" in header_line and "total" in header_line) \
-           or ("tipagem" in header_line and "código" in header_line):
-            continue
-
+    for kind, cells in classified_rows:
         # -------------------------
         # caso 1: stage (índice + nome)
         # -------------------------
-        m_idx = INDEX_AT_START_RE.match(cells[0])
-        if m_idx:
+        if kind == ROW_STAGE:
+            m_idx = INDEX_AT_START_RE.match(cells[0])
             idx = m_idx.group(1)
             name_stage = m_idx.group(2).strip()
             total_stage = br_to_float(cells[-1]) if cells[-1] else None
 
-            node = ensure_stage_path(estimate_data["estimate_items"], idx.split("."))
+            node = tree.ensure_stage(idx)
             node["name"] = clean_text(name_stage)
             if total_stage is not None:
                 node["price_total"] = total_stage
@@ -257,41 +326,182 @@ def parse_excel_to_json_freeform(file_path: str) -> dict:
         # -------------------------
         # caso 2: linha tabular (>=9 colunas)
         # -------------------------
-        if len(cells) >= 9:
-            tipagem = cells[0].lower()
-            item = {
-                "estimate_item_type": "composition" if "comp" in tipagem else "resource",
-                "code": clean_text(cells[1]),
-                "bank": clean_text(cells[2]),
-                "name": clean_text(cells[3]),
-                "type": clean_text(cells[4]),
-                "unit_symbol": normalize_unit(cells[5]),
-                "quantity": br_to_float(cells[6]),
-                "price_unit": br_to_float(cells[7]),
-                "price_total": br_to_float(cells[8]),
-            }
-
-            if item["estimate_item_type"] == "composition":
-                if last_stage_index_for_auto:
-                    auto_seq += 1
-                    comp_index = f"{last_stage_index_for_auto}.{auto_seq}"
-                else:
-                    comp_index = "1"
-                item["index"] = comp_index
-                item["composition_child"] = []
-                add_child_to_index(estimate_data["estimate_items"], comp_index, item)
-                current_composition = item
+        tipagem = cells[0].lower()
+        item = {
+            "estimate_item_type": "composition" if "comp" in tipagem else "resource",
+            "code": clean_text(cells[1]),
+            "bank": clean_text(cells[2]),
+            "name": clean_text(cells[3]),
+            "type": clean_text(cells[4]),
+            "unit_symbol": normalize_unit(cells[5]),
+            "quantity": br_to_float(cells[6]),
+            "price_unit": br_to_float(cells[7]),
+            "price_total": br_to_float(cells[8]),
+        }
+
+        if item["estimate_item_type"] == "composition":
+            if last_stage_index_for_auto:
+                auto_seq += 1
+                comp_index = f"{last_stage_index_for_auto}.{auto_seq}"
+            else:
+                comp_index = "1"
+            item["index"] = comp_index
+            item["composition_child"] = []
+            tree.add_child(comp_index, item)
+            current_composition = item
+        else:
+            if current_composition:
+                current_composition["composition_child"].append(item)
             else:
-                if current_composition:
-                    current_composition["composition_child"].append(item)
+                if last_stage_index_for_auto:
+                    tree.add_child(last_stage_index_for_auto, item)
                 else:
-                    if last_stage_index_for_auto:
-                        add_child_to_index(estimate_data["estimate_items"], last_stage_index_for_auto, item)
-                    else:
-                        estimate_data["estimate_items"].append(item)
-            continue
+                    tree.root.append(item)
 
     # ajuste final
-    estimate_data = _finalize_schema_exact(estimate_data)
+    estimate_data = _finalize_schema_exact(estimate_data, tree)
     return estimate_data
 
+def parse_dataframe_to_json_freeform(df: pd.DataFrame) -> dict:
+    """Monta o orçamento a partir da aba já lida (header=None, dtype=str)."""
+    # nome da obra + bdi (só as primeiras linhas são consultadas)
+    head_lines = [" ".join(str(c) for c in row if pd.notna(c)) for row in df.head(80).itertuples(index=False)]
+
+    cells = _strip_cells(df)
+    kinds = classify_rows(cells)
+    values = cells.to_numpy()
+    wanted = np.flatnonzero((kinds == ROW_STAGE) | (kinds == ROW_ITEM))
+
+    return _build_estimate(
+        ((kinds[pos], values[pos].tolist()) for pos in wanted),
+        head_lines,
+    )
+
+# ----------------------------------
+# Modo streaming (openpyxl read-only)
+# ----------------------------------
+# Textos que o pd.read_excel lê como NA (lista padrão de ``na_values`` do pandas)
+_PANDAS_NA_TEXTS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+_NA_TEXTS = _PANDAS_NA_TEXTS | frozenset(ERROR_CODES)
+
+def _excel_value_to_text(value: Any) -> Optional[str]:
+    """
+    Converte o valor da célula como o ``pd.read_excel(dtype=str)`` faria:
+    números inteiros sem '.0', erros e marcadores de NA viram ``None``.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isfinite(value):
+        as_int = int(value)
+        if as_int == value:
+            value = as_int
+    text = str(value)
+    if text in _NA_TEXTS:
+        return None
+    return text
+
+def _row_width(row: Sequence[Any]) -> int:
+    """Largura da linha aparada à direita (células vazias no fim não contam), como o pandas calcula."""
+    for pos in range(len(row), 0, -1):
+        if row[pos - 1] is not None and row[pos - 1] != "":
+            return pos
+    return 0
+
+def _iter_trimmed_rows(ws) -> Iterator[List[Optional[str]]]:
+    for row in ws.iter_rows(values_only=True):
+        yield [_excel_value_to_text(v) for v in row[:_row_width(row)]]
+
+def _walk_stages(items: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    stack = [items]
+    while stack:
+        for item in stack.pop():
+            if item.get("estimate_item_type") == "stage":
+                yield item
+                stack.append(item.get("estimate_items") or item.get("estimate_item") or [])
+
+def parse_excel_to_json_streaming(file_path: str) -> dict:
+    """
+    Lê a aba com openpyxl ``read_only=True`` e alimenta a máquina de estados
+    linha a linha, sem montar DataFrame: a memória não cresce com a planilha.
+
+    O pandas apara as linhas e as repreenche com a largura útil da aba, que
+    só se conhece no fim; aqui a aba é lida uma vez só e o que depende dela
+    é resolvido sem reler:
+    - item tabular exige largura >= ``TABULAR_MIN_COLUMNS``: linhas
+      candidatas ficam pendentes só até alguma linha atingir essa largura
+      (em geral o cabeçalho, logo no início);
+    - o total do estágio é a última coluna da aba: vale só para linhas que
+      chegam até ela, então os totais são reaplicados no fim com a largura final.
+    O resultado é o mesmo do modo pandas.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[choose_sheet_name(wb.sheetnames)]
+        # ignora a dimensão declarada (costuma incluir células só formatadas)
+        ws.reset_dimensions()
+
+        rows = _iter_trimmed_rows(ws)
+        head = list(islice(rows, 80))
+        head_lines = [" ".join(t for t in texts if t is not None) for texts in head]
+
+        width = 0
+        # (índice do estágio, largura da linha, texto da última célula), na ordem da aba
+        stage_totals: List[Tuple[str, int, str]] = []
+
+        def classified() -> Iterator[Tuple[int, List[str]]]:
+            nonlocal width
+            pending: List[Tuple[int, List[str]]] = []
+            for texts in chain(head, rows):
+                width = max(width, len(texts))
+                cells = [t.strip() if t is not None else "" for t in texts]
+                if len(cells) < TABULAR_MIN_COLUMNS:
+                    cells.extend([""] * (TABULAR_MIN_COLUMNS - len(cells)))
+                kind = classify_cells(cells)
+                if kind == ROW_STAGE:
+                    stage_totals.append((INDEX_AT_START_RE.match(cells[0]).group(1), len(texts), cells[len(texts) - 1]))
+                elif kind != ROW_ITEM:
+                    continue
+                if width < TABULAR_MIN_COLUMNS:
+                    pending.append((kind, cells))
+                    continue
+                if pending:
+                    yield from pending
+                    pending.clear()
+                yield kind, cells
+            # aba estreita: nenhuma candidata vira item (o pandas as classifica como 'outra')
+            yield from ((kind, cells) for kind, cells in pending if kind == ROW_STAGE)
+
+        estimate_data = _build_estimate(classified(), head_lines)
+    finally:
+        wb.close()
+
+    # totais com a largura final: só linhas que alcançam a última coluna
+    totals: Dict[str, Optional[float]] = {}
+    for idx, row_width, text in stage_totals:
+        value = br_to_float(text) if row_width == width and text else None
+        if value is not None:
+            totals[idx] = value
+        else:
+            totals.setdefault(idx, None)
+    for stage in _walk_stages(estimate_data["estimate_items"]):
+        if stage["index"] in totals:
+            stage["price_total"] = totals[stage["index"]]
+    return estimate_data
+
+def parse_excel_to_json_freeform(file_path: str, streaming: bool = False) -> dict:
+    """
+    ``streaming=True`` usa o leitor openpyxl read-only (apenas .xlsx/.xlsm);
+    o padrão mantém a leitura via pandas, que também aceita .xls.
+    """
+    if streaming:
+        return parse_excel_to_json_streaming(file_path)
+
+    xls = pd.ExcelFile(file_path)
+    sheet_name = choose_sheet(xls)
+
+    # lê a aba completa, sem header (reaproveita o arquivo já aberto)
+    df = pd.read_excel(xls, sheet_name=sheet_name, header=None, dtype=str)
+    return parse_dataframe_to_json_freeform(df)
@@ -0,0 +1,383 @@
+# app/services/estimate_persistence.py
+
+import os
+import json
+import uuid
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.supabase_manager import SUPABASE_BULK_MAX_WORKERS
+
+# Tabelas do orçamento persistido
+ESTIMATES_TABLE = "estimates"
+STAGES_TABLE = "estimate_stages"
+COMPOSITIONS_TABLE = "estimate_compositions"
+RESOURCES_TABLE = "estimate_resources"
+
+# Orçamentos grandes: chunks maiores que o padrão (linhas pequenas, sem retorno)
+ESTIMATE_WRITE_CHUNK_SIZE = int(os.getenv("ESTIMATE_WRITE_CHUNK_SIZE", "1000"))
+
+_ITEM_FIELDS = ("index", "code", "bank", "name", "type", "unit_symbol", "quantity", "price_unit", "price_total")
+_STAGE_FIELDS = ("index", "name", "price_total")
+# Tabelas dos nós, na ordem em que os pais precisam existir
+NODE_TABLES = (STAGES_TABLE, COMPOSITIONS_TABLE, RESOURCES_TABLE)
+
+
+@dataclass
+class EstimateBatches:
+    """
+    Orçamento achatado em linhas por tabela, com ids (UUID gerado no
+    cliente) e referências aos pais já resolvidos. ``stages`` vem agrupado
+    por profundidade: cada nível só referencia estágios de níveis anteriores.
+    """
+
+    estimate: Dict[str, Any]
+    stages: List[List[Dict[str, Any]]] = field(default_factory=list)
+    compositions: List[Dict[str, Any]] = field(default_factory=list)
+    resources: List[Dict[str, Any]] = field(default_factory=list)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            ESTIMATES_TABLE: 1,
+            STAGES_TABLE: sum(len(level) for level in self.stages),
+            COMPOSITIONS_TABLE: len(self.compositions),
+            RESOURCES_TABLE: len(self.resources),
+        }
+
+    def node_rows(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            STAGES_TABLE: [row for level in self.stages for row in level],
+            COMPOSITIONS_TABLE: self.compositions,
+            RESOURCES_TABLE: self.resources,
+        }
+
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _node_id(estimate_id: str, node_key: str) -> str:
+    # determinístico: o mesmo nó ganha o mesmo id em todas as versões do orçamento
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{estimate_id}/{node_key}"))
+
+
+def node_fingerprint(row: Dict[str, Any], fields: Tuple[str, ...] = _ITEM_FIELDS) -> str:
+    """
+    Impressão digital do conteúdo de um nó: índice, código, banco,
+    quantidade, preços e os demais campos gravados, mais a posição no pai.
+    A ligação com o pai fica na ``node_key``, não aqui. Um nó que só mudou
+    de posição (irmão inserido antes dele) sai como atualizado, sem mexer
+    nos filhos.
+    """
+    payload = json.dumps([row.get("position")] + [row.get(key) for key in fields], default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _local_key(kind: str, item: Dict[str, Any], position: int, seen: Dict[str, int]) -> str:
+    """
+    Chave do nó dentro do pai. Composições e recursos são identificados
+    por código/banco: o índice deles é gerado pela posição no parser
+    (``estágio.N``) e mudaria em todos os irmãos seguintes a cada inserção.
+    Índice e posição entram no fingerprint (campos atualizáveis), não na
+    identidade. Estágios não têm código: usam o índice da planilha. Sem
+    código nem índice, vale a posição. Repetições no mesmo pai ganham um
+    sufixo de ocorrência.
+    """
+    if kind != "s" and item.get("code"):
+        key = f"{kind}:{item['code']}|{item.get('bank') or ''}"
+    elif item.get("index"):
+        key = f"{kind}@{item['index']}"
+    else:
+        key = f"{kind}#{position}"
+    key = key.replace("/", "%2F")  # "/" separa os níveis da node_key
+    seen[key] = seen.get(key, 0) + 1
+    return key if seen[key] == 1 else f"{key}~{seen[key]}"
+
+
+def _item_row(item: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(base)
+    for key in _ITEM_FIELDS:
+        row[key] = item.get(key)
+    row["fingerprint"] = node_fingerprint(row)
+    return row
+
+
+def flatten_estimate(
+    estimate_data: Dict[str, Any],
+    tenant_id: str,
+    estimate_id: Optional[str] = None,
+    import_id: Optional[str] = None,
+) -> EstimateBatches:
+    """
+    Percorre a árvore de ``parse_excel_to_json_freeform`` (pilha explícita,
+    sem recursão) e devolve as linhas de cada tabela. Todas as linhas de uma
+    tabela têm as mesmas colunas (requisito do insert em lote do PostgREST);
+    ``position`` guarda a ordem do item dentro do pai.
+
+    Cada nó leva uma ``node_key`` (caminho de chaves locais desde a raiz),
+    um id derivado dela e o ``fingerprint`` do conteúdo: uma nova versão do
+    mesmo orçamento pode ser comparada nó a nó (ver ``diff_estimate``).
+    """
+    estimate_id = estimate_id or _new_id()
+    batches = EstimateBatches(estimate={
+        "id": estimate_id,
+        "tenant_id": tenant_id,
+        "import_id": import_id,
+        "name": estimate_data.get("name"),
+        "bdi_global": estimate_data.get("bdi_global"),
+    })
+    common = {"tenant_id": tenant_id, "estimate_id": estimate_id}
+
+    # (itens, id do estágio pai, node_key do pai, profundidade do próximo estágio)
+    stack = [(estimate_data.get("estimate_items") or [], None, "", 0)]
+    while stack:
+        items, stage_id, parent_key, depth = stack.pop()
+        seen: Dict[str, int] = {}
+        for position, item in enumerate(items):
+            kind = item.get("estimate_item_type")
+            if kind == "stage":
+                node_key = f"{parent_key}/{_local_key('s', item, position, seen)}"
+                row_id = _node_id(estimate_id, node_key)
+                if len(batches.stages) <= depth:
+                    batches.stages.append([])
+                row = {
+                    **common,
+                    "id": row_id,
+                    "node_key": node_key,
+                    "parent_stage_id": stage_id,
+                    "position": position,
+                    "index": item.get("index"),
+                    "name": item.get("name"),
+                    "price_total": item.get("price_total"),
+                }
+                row["fingerprint"] = node_fingerprint(row, _STAGE_FIELDS)
+                batches.stages[depth].append(row)
+                stack.append((item.get("estimate_items") or [], row_id, node_key, depth + 1))
+            elif kind == "composition":
+                node_key = f"{parent_key}/{_local_key('c', item, position, seen)}"
+                row_id = _node_id(estimate_id, node_key)
+                batches.compositions.append(_item_row(item, {
+                    **common, "id": row_id, "node_key": node_key, "stage_id": stage_id, "position": position,
+                }))
+                child_seen: Dict[str, int] = {}
+                for child_position, child in enumerate(item.get("composition_child") or []):
+                    child_key = f"{node_key}/{_local_key('r', child, child_position, child_seen)}"
+                    batches.resources.append(_item_row(child, {
+                        **common, "id": _node_id(estimate_id, child_key), "node_key": child_key,
+                        "stage_id": None, "composition_id": row_id, "position": child_position,
+                    }))
+            else:
+                node_key = f"{parent_key}/{_local_key('r', item, position, seen)}"
+                batches.resources.append(_item_row(item, {
+                    **common, "id": _node_id(estimate_id, node_key), "node_key": node_key,
+                    "stage_id": stage_id, "composition_id": None, "position": position,
+                }))
+    return batches
+
+
+def persist_estimate(
+    manager,
+    batches: EstimateBatches,
+    chunk_size: int = ESTIMATE_WRITE_CHUNK_SIZE,
+    max_workers: int = SUPABASE_BULK_MAX_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Grava as linhas via ``SupabaseManager.bulk_write``, pais antes dos
+    filhos: orçamento, estágios (um lote por nível), composições e recursos.
+    Se um lote falhar, os seguintes não são enviados (os filhos apontariam
+    para linhas inexistentes) e o que já foi gravado é desfeito apagando a
+    linha do orçamento: os nós caem junto pelo ``ON DELETE CASCADE``
+    (migration em ``supabase/migrations``). ``rolled_back`` indica se a
+    limpeza deu certo; se não, ``errors`` traz também a falha dela.
+    """
+    steps = [(ESTIMATES_TABLE, "inserted", [batches.estimate])]
+    steps += [(STAGES_TABLE, "inserted", level) for level in batches.stages]
+    steps += [(COMPOSITIONS_TABLE, "inserted", batches.compositions), (RESOURCES_TABLE, "inserted", batches.resources)]
+
+    tables = {table: {"inserted": 0, "failed": 0} for table in batches.counts()}
+    summary = _apply_steps(manager, batches.estimate["id"], steps, tables, chunk_size, max_workers)
+    if not summary["ok"]:
+        # apaga mesmo se o próprio insert do orçamento falhou: um timeout
+        # pode ter sido aplicado no banco
+        cleanup = manager.bulk_delete(ESTIMATES_TABLE, [batches.estimate["id"]], max_workers=1)
+        summary["rolled_back"] = cleanup.ok
+        summary["errors"].extend(
+            {"table": ESTIMATES_TABLE, "offset": e["offset"], "rows": e["rows"], "error": e["error"], "cleanup": True}
+            for e in cleanup.errors
+        )
+    return summary
+
+
+def _apply_steps(
+    manager,
+    estimate_id: str,
+    steps: List[Tuple[str, str, List[Any]]],
+    tables: Dict[str, Dict[str, int]],
+    chunk_size: int,
+    max_workers: int,
+    upsert_inserts: bool = False,
+) -> Dict[str, Any]:
+    """
+    Executa os passos ``(tabela, ação, linhas)`` em ordem: ``inserted`` é
+    insert (upsert por id com ``upsert_inserts``), ``updated`` é upsert por
+    id e ``deleted`` recebe ids. Para no primeiro passo com falha.
+    """
+    summary: Dict[str, Any] = {
+        "estimate_id": estimate_id,
+        "ok": True,
+        "tables": tables,
+        "errors": [],
+    }
+    for table, action, rows in steps:
+        if not rows:
+            continue
+        if action == "deleted":
+            result = manager.bulk_delete(table, rows, max_workers=max_workers)
+            done = result.deleted
+        else:
+            result = manager.bulk_write(
+                table, rows, chunk_size=chunk_size, max_workers=max_workers, returning=False,
+                **({"upsert": True, "on_conflict": "id"} if action == "updated" or upsert_inserts else {}),
+            )
+            done = result.inserted
+        tables[table][action] += done
+        tables[table]["failed"] += result.failed
+        if not result.ok:
+            summary["ok"] = False
+            summary["errors"].extend(
+                {"table": table, "offset": e["offset"], "rows": e["rows"], "error": e["error"]}
+                for e in result.errors
+            )
+            break
+    return summary
+
+
+# -------------------------------------------------------------------
+# Reimportação incremental
+# -------------------------------------------------------------------
+_SNAPSHOT_COLUMNS = "id,node_key,fingerprint"
+
+
+@dataclass
+class EstimateDiff:
+    """
+    Diferença entre a versão gravada de um orçamento e uma nova, por tabela
+    de nós: linhas novas, linhas alteradas (mesma ``node_key``, outro
+    fingerprint) e linhas gravadas que sumiram (``id`` + ``node_key``).
+    Nós iguais não geram escrita.
+    """
+
+    estimate: Dict[str, Any]
+    inserted: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    updated: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    deleted: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    unchanged: Dict[str, int] = field(default_factory=dict)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        return {
+            table: {
+                "inserted": len(self.inserted.get(table, [])),
+                "updated": len(self.updated.get(table, [])),
+                "deleted": len(self.deleted.get(table, [])),
+                "unchanged": self.unchanged.get(table, 0),
+            }
+            for table in NODE_TABLES
+        }
+
+    @property
+    def changed(self) -> int:
+        return sum(c["inserted"] + c["updated"] + c["deleted"] for c in self.counts().values())
+
+
+def _depth(row: Dict[str, Any]) -> int:
+    # linhas gravadas antes da node_key existir ficam no nível 0
+    return (row.get("node_key") or "").count("/")
+
+
+def load_estimate_snapshot(manager, estimate_id: str) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Versão gravada do orçamento, só ``id``, ``node_key`` e ``fingerprint``
+    de cada nó (leitura paginada, bem mais leve que as linhas inteiras).
+    ``None`` se o orçamento não existe (ou o RLS não deixa ver).
+    """
+    if not manager.get(ESTIMATES_TABLE, {"id": estimate_id}):
+        return None
+    return {
+        table: manager.select_all(table, _SNAPSHOT_COLUMNS, {"estimate_id": estimate_id})
+        for table in NODE_TABLES
+    }
+
+
+def diff_estimate(batches: EstimateBatches, snapshot: Dict[str, List[Dict[str, Any]]]) -> EstimateDiff:
+    """
+    Compara a nova versão (``flatten_estimate`` com o ``estimate_id`` já
+    gravado) com o ``snapshot`` de ``load_estimate_snapshot``, casando os
+    nós pela ``node_key``. Um nó que muda de pai muda de chave: sai como
+    removido e entra como novo (com a subárvore).
+    """
+    diff = EstimateDiff(estimate=batches.estimate)
+    for table, rows in batches.node_rows().items():
+        previous = {row["node_key"]: row for row in snapshot.get(table, []) if row.get("node_key")}
+        inserted, updated = [], []
+        current = set()
+        for row in rows:
+            current.add(row["node_key"])
+            old = previous.get(row["node_key"])
+            if old is None:
+                inserted.append(row)
+            elif old["fingerprint"] != row["fingerprint"]:
+                updated.append(row)
+        diff.inserted[table] = inserted
+        diff.updated[table] = updated
+        diff.deleted[table] = [
+            {"id": row["id"], "node_key": row.get("node_key")}
+            for row in snapshot.get(table, [])
+            if row.get("node_key") not in current
+        ]
+        diff.unchanged[table] = len(rows) - len(inserted) - len(updated)
+    return diff
+
+
+def persist_estimate_diff(
+    manager,
+    diff: EstimateDiff,
+    chunk_size: int = ESTIMATE_WRITE_CHUNK_SIZE,
+    max_workers: int = SUPABASE_BULK_MAX_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Aplica só o que mudou: atualiza a linha do orçamento, grava nós novos e
+    alterados (pais antes dos filhos, estágios por nível) e depois apaga os
+    removidos (filhos antes dos pais). O número de requests acompanha o
+    tamanho da mudança, não o do orçamento.
+
+    Não é atômico: cada lote é uma transação própria e uma falha deixa o
+    orçamento com parte da diferença aplicada (``ok=False`` no resumo). Mas
+    é retomável: os ids derivam da ``node_key`` e toda escrita é upsert ou
+    delete por id, então repetir a mesma reimportação (novo snapshot + novo
+    diff) aplica só o que faltou e converge para a nova versão.
+    """
+    steps: List[Tuple[str, str, List[Any]]] = [(ESTIMATES_TABLE, "updated", [diff.estimate])]
+    for table in NODE_TABLES:
+        for action in ("inserted", "updated"):
+            rows = getattr(diff, action)[table]
+            if table == STAGES_TABLE:
+                for depth in sorted({_depth(row) for row in rows}):
+                    steps.append((table, action, [row for row in rows if _depth(row) == depth]))
+            else:
+                steps.append((table, action, rows))
+    for table in reversed(NODE_TABLES):
+        rows = diff.deleted[table]
+        if table == STAGES_TABLE:
+            for depth in sorted({_depth(row) for row in rows}, reverse=True):
+                steps.append((table, "deleted", [row["id"] for row in rows if _depth(row) == depth]))
+        else:
+            steps.append((table, "deleted", [row["id"] for row in rows]))
+
+    tables = {
+        table: {"inserted": 0, "updated": 0, "deleted": 0, "failed": 0}
+        for table in (ESTIMATES_TABLE, *NODE_TABLES)
+    }
+    summary = _apply_steps(manager, diff.estimate["id"], steps, tables, chunk_size, max_workers, upsert_inserts=True)
+    summary["diff"] = diff.counts()
+    return summary
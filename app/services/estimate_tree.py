@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 def ensure_stage_path(root_list: List[Dict[str, Any]], idx_parts: List[str]) -> Dict[str, Any]:
     current_list = root_list
@@ -30,4 +30,44 @@ def add_child_to_index(root_list: List[Dict[str, Any]], idx: str, child: Dict[st
         return
     parent_parts = parts[:-1]
     parent_node = ensure_stage_path(root_list, parent_parts)
-    parent_node["estimate_items"].append(child)
\ No newline at end of file
+    parent_node["estimate_items"].append(child)
+
+class EstimateTreeBuilder:
+    """
+    Monta a árvore de estágios mantendo um índice "índice pontuado" -> nó.
+
+    Os pais são criados sob demanda (mesma ordem de ``ensure_stage_path``),
+    então inserir um nó custa O(profundidade) em vez de varrer os filhos de
+    cada nível.
+    """
+
+    def __init__(self, root_list: Optional[List[Dict[str, Any]]] = None):
+        self.root: List[Dict[str, Any]] = root_list if root_list is not None else []
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def ensure_stage(self, idx: str) -> Dict[str, Any]:
+        node = self._stages.get(idx)
+        if node is not None:
+            return node
+        sep = idx.rfind(".")
+        siblings = self.root if sep == -1 else self.ensure_stage(idx[:sep])["estimate_items"]
+        node = {
+            "estimate_item_type": "stage",
+            "index": idx,
+            "name": None,
+            "price_total": None,
+            "estimate_items": []
+        }
+        siblings.append(node)
+        self._stages[idx] = node
+        return node
+
+    def add_child(self, idx: str, child: Dict[str, Any]):
+        sep = idx.rfind(".")
+        if sep == -1:
+            self.root.append(child)
+            return
+        self.ensure_stage(idx[:sep])["estimate_items"].append(child)
+
+    def find_stage(self, idx: str) -> Optional[Dict[str, Any]]:
+        return self._stages.get(idx)
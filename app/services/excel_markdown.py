@@ -0,0 +1,201 @@
+# app/services/excel_markdown.py
+
+import os
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.etree.ElementTree import iterparse
+
+from openpyxl import load_workbook
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Processos para renderizar abas em paralelo (modo raw do /estimate_markdown)
+EXCEL_MARKDOWN_WORKERS = int(os.getenv("EXCEL_MARKDOWN_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+EMPTY_MARKDOWN = "# (Sem dados nas abas selecionadas)"
+
+
+# -------------------------------------------------------------------
+# Tabela pipe (sem tabulate)
+# -------------------------------------------------------------------
+def format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value != value:  # NaN
+        return ""
+    text = str(value)
+    if "|" in text or "\n" in text or "\r" in text:
+        text = text.replace("|", "\\|").replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+    return text
+
+
+def iter_pipe_table(header: Sequence[Any], rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """
+    Linhas de uma tabela Markdown (pipe) sem alinhar colunas: uma passada,
+    custo linear no número de células.
+    """
+    width = len(header)
+    yield "| " + " | ".join(format_cell(h) for h in header) + " |"
+    yield "|" + "---|" * width
+    for row in rows:
+        cells = [format_cell(v) for v in row[:width]]
+        if len(cells) < width:
+            cells.extend([""] * (width - len(cells)))
+        yield "| " + " | ".join(cells) + " |"
+
+
+def pipe_table(header: Sequence[Any], rows: Iterable[Sequence[Any]]) -> str:
+    return "\n".join(iter_pipe_table(header, rows))
+
+
+def _unique_header(cells: Sequence[Any]) -> List[str]:
+    """Cabeçalho como o ``pd.read_excel``: vazios viram "Unnamed: i", repetidos "x.1"."""
+    seen = {}
+    header = []
+    for i, cell in enumerate(cells):
+        name = f"Unnamed: {i}" if cell is None or cell == "" else str(cell)
+        base, count = name, seen.get(name, 0)
+        while name in seen:
+            count += 1
+            name = f"{base}.{count}"
+        seen[base] = count
+        seen[name] = 0
+        header.append(name)
+    return header
+
+
+def _trimmed_rows(rows: Iterable[Sequence[Any]]) -> List[Tuple[Any, ...]]:
+    """Linhas aparadas à direita, sem as linhas vazias do fim (como o pandas)."""
+    result: List[Tuple[Any, ...]] = []
+    pending_blank = 0
+    for row in rows:
+        end = len(row)
+        while end and (row[end - 1] is None or row[end - 1] == ""):
+            end -= 1
+        if not end:
+            pending_blank += 1  # só entra se vier uma linha com dados depois
+            continue
+        if pending_blank:
+            result.extend([()] * pending_blank)
+            pending_blank = 0
+        result.append(tuple(row[:end]))
+    return result
+
+
+# -------------------------------------------------------------------
+# Abas
+# -------------------------------------------------------------------
+def xlsx_sheet_names(path: str) -> List[str]:
+    """Nomes das abas lidos só do xl/workbook.xml (sem strings compartilhadas nem células)."""
+    names = []
+    with zipfile.ZipFile(path) as archive, archive.open("xl/workbook.xml") as src:
+        for _, el in iterparse(src):
+            if el.tag.rsplit("}", 1)[-1] == "sheet":
+                names.append(el.get("name"))
+    return names
+
+
+def choose_sheets(sheet_names: Sequence[str], only_sheet_contains: Optional[str] = None) -> List[str]:
+    return (
+        [s for s in sheet_names if only_sheet_contains and only_sheet_contains.lower() in s.lower()]
+        or list(sheet_names)
+    )
+
+
+def render_xlsx_sheet(path: str, sheet_name: str) -> Optional[str]:
+    """
+    Markdown (``# aba`` + tabela) de uma aba, ou ``None`` se ela não tiver
+    linhas de dados. Abre o arquivo em read-only: só o XML desta aba é lido.
+    Mesmas regras do ``pd.read_excel``: linha 1 = cabeçalho, linhas vazias
+    no meio ficam, as do fim não.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        if not hasattr(ws, "iter_rows"):  # chartsheet
+            return None
+        rows = _trimmed_rows(ws.iter_rows(values_only=True))
+    finally:
+        wb.close()
+    if len(rows) < 2:
+        return None
+    width = max(len(r) for r in rows)
+    header = _unique_header(list(rows[0]) + [None] * (width - len(rows[0])))
+    return f"# {sheet_name}\n" + pipe_table(header, rows[1:])
+
+
+def _render_xlsx_sheet_task(args: Tuple[str, str]) -> Optional[str]:
+    return render_xlsx_sheet(*args)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=EXCEL_MARKDOWN_WORKERS)
+        return _executor
+
+
+def close_excel_markdown_pool():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _join_sections(sections: Iterable[Optional[str]]) -> str:
+    md = "\n\n".join(s for s in sections if s)
+    return md or EMPTY_MARKDOWN
+
+
+def _is_xlsx(path: str) -> bool:
+    return path.lower().endswith((".xlsx", ".xlsm"))
+
+
+def excel_markdown_engine(path: str) -> str:
+    """Quem lê o arquivo em ``excel_to_markdown_tables`` (vai em ``engine_used``)."""
+    return "openpyxl" if _is_xlsx(path) else "pandas"
+
+
+def excel_to_markdown_tables(
+    path: str,
+    only_sheet_contains: Optional[str] = None,
+    parallel: bool = True,
+) -> str:
+    """
+    Uma tabela Markdown por aba escolhida (todas, ou as que contêm
+    ``only_sheet_contains`` no nome). Em .xlsx as abas são renderizadas em
+    paralelo, num pool de processos, e remontadas na ordem do arquivo; .xls
+    (xlrd) é aberto uma vez e lido aba a aba.
+    """
+    if not _is_xlsx(path):
+        return _xls_to_markdown_tables(path, only_sheet_contains)
+
+    chosen = choose_sheets(xlsx_sheet_names(path), only_sheet_contains)
+    if not parallel or len(chosen) <= 1 or EXCEL_MARKDOWN_WORKERS <= 1:
+        return _join_sections(render_xlsx_sheet(path, name) for name in chosen)
+    # map devolve na ordem de envio, não na de término
+    tasks = [(path, name) for name in chosen]
+    return _join_sections(_get_executor().map(_render_xlsx_sheet_task, tasks))
+
+
+def _xls_to_markdown_tables(path: str, only_sheet_contains: Optional[str] = None) -> str:
+    import pandas as pd  # lazy
+
+    with pd.ExcelFile(path) as xls:
+        sections = []
+        for name in choose_sheets(xls.sheet_names, only_sheet_contains):
+            df = xls.parse(name)
+            if df.empty:
+                continue
+            rows = df.itertuples(index=False, name=None)
+            sections.append(f"# {name}\n" + pipe_table([str(c) for c in df.columns], rows))
+    return _join_sections(sections)
@@ -0,0 +1,302 @@
+# app/services/excel_preview.py
+
+import re
+import zipfile
+import posixpath
+from bisect import bisect_right
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import fromstring, iterparse
+
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+PREVIEW_MAX_ROWS = 20
+
+_CELL_REF_RE = re.compile(r"([A-Z]+)(\d+)")
+_MERGE_CELL_RE = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+# maior trecho que pode conter uma tag <mergeCell> partida entre dois blocos
+_MERGE_SCAN_OVERLAP = 512
+_MERGE_SCAN_CHUNK = 1024 * 1024
+
+MergedRange = Tuple[int, int, int, int]  # (min_row, min_col, max_row, max_col)
+
+
+def _scan_dimensions(archive: zipfile.ZipFile, worksheet_path: str) -> Tuple[int, int]:
+    """
+    Última linha/coluna usadas, varrendo só as tags <row>/<c> do XML da aba
+    (sem criar células). Usado quando a planilha não traz <dimension>.
+    """
+    max_row = max_col = 0
+    with archive.open(worksheet_path) as src:
+        for _, el in iterparse(src):
+            tag = el.tag.rsplit("}", 1)[-1]
+            if tag == "c":
+                m = _CELL_REF_RE.fullmatch(el.get("r") or "")
+                if m:
+                    max_col = max(max_col, column_index_from_string(m.group(1)))
+                    max_row = max(max_row, int(m.group(2)))
+                el.clear()
+            elif tag == "row":
+                max_row = max(max_row, int(el.get("r") or 0))
+                el.clear()
+    return max_row, max_col
+
+
+def _part_target(base_dir: str, target: str) -> str:
+    # alvo de um relacionamento: absoluto no pacote ("/xl/...") ou relativo à pasta da origem
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """Id -> (tipo, caminho) dos relacionamentos de ``part`` ("" = o pacote)."""
+    base_dir, name = posixpath.split(part)
+    rels_path = posixpath.join(base_dir, "_rels", f"{name}.rels")
+    try:
+        root = fromstring(archive.read(rels_path))
+    except KeyError:
+        return {}
+    return {
+        rel.get("Id"): (rel.get("Type") or "", _part_target(base_dir, rel.get("Target") or ""))
+        for rel in root
+        if rel.tag.rsplit("}", 1)[-1] == "Relationship"
+    }
+
+
+def worksheet_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """
+    Caminho do XML de cada aba no zip, por nome, lido dos próprios
+    relacionamentos do pacote (``_rels/.rels`` -> workbook -> abas), sem
+    depender de atributos internos do openpyxl.
+    """
+    workbook = next(
+        (path for kind, path in _relationships(archive, "").values() if kind.endswith("/officeDocument")),
+        "xl/workbook.xml",
+    )
+    rels = _relationships(archive, workbook)
+    paths = {}
+    for el in fromstring(archive.read(workbook)).iter():
+        if el.tag.rsplit("}", 1)[-1] != "sheet":
+            continue
+        # r:id (namespace transitional ou strict)
+        rel_id = next((v for k, v in el.attrib.items() if k.endswith("}id")), None)
+        if rel_id in rels:
+            paths[el.get("name")] = rels[rel_id][1]
+    return paths
+
+
+class WorkbookXml:
+    """
+    Acesso direto ao XML das abas, para o que o openpyxl read-only não expõe
+    (varredura de dimensões, células mescladas). O zip só é aberto (mais uma
+    leitura do diretório central) quando alguma aba precisa dele.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO]):
+        self.source = source
+        self._archive: Optional[zipfile.ZipFile] = None
+        self._paths: Dict[str, str] = {}
+
+    def locate(self, sheet_name: str) -> Tuple[zipfile.ZipFile, str]:
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.source)
+            self._paths = worksheet_paths(self._archive)
+        return self._archive, self._paths[sheet_name]
+
+    def close(self):
+        # não fecha o file-like de quem chamou: ZipFile só fecha o que abriu
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+
+def _sheet_size(ws, xml: WorkbookXml) -> Tuple[int, int]:
+    max_row, max_col = ws.max_row, ws.max_column
+    # sem <dimension> (ou só "A1", comum em geradores) => varredura leve do XML
+    if max_row is None or max_col is None or (max_row, max_col) == (1, 1):
+        max_row, max_col = _scan_dimensions(*xml.locate(ws.title))
+    # planilha vazia: o openpyxl completo reporta 1 linha x 1 coluna
+    return max(max_row, 1), max(max_col, 1)
+
+
+def _select_sheets(wb, sheet_names: Optional[Iterable[Union[str, int]]]) -> List[str]:
+    if sheet_names is None:
+        return wb.sheetnames
+    return [wb.sheetnames[name] if isinstance(name, int) else name for name in sheet_names]
+
+
+def preview_workbook(
+    source: Union[str, BinaryIO],
+    max_rows: int = PREVIEW_MAX_ROWS,
+    sheet_names: Optional[Iterable[Union[str, int]]] = None,
+    merges: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Primeiras ``max_rows`` linhas (valores crus) e total de linhas de cada aba,
+    lendo em modo read-only: só o começo do XML de cada aba é descomprimido.
+    ``source`` pode ser um caminho ou um file-like com seek (ex.: leitor por
+    range do S3), então nem sempre é preciso ter o arquivo inteiro.
+    ``sheet_names`` limita às abas pedidas (nome ou posição); as demais nem
+    são abertas.
+
+    ``merges=True`` preenche as células mescladas, mas custa a aba inteira:
+    o ``<mergeCells>`` fica depois do ``<sheetData>``, então o XML todo é
+    descomprimido e varrido (e, num leitor por range, baixado), por menor
+    que seja ``max_rows``. Por isso é opcional.
+    """
+    wb = load_workbook(source, read_only=True, data_only=True)
+    xml = WorkbookXml(source)
+    try:
+        result = {}
+        for name in _select_sheets(wb, sheet_names):
+            ws = wb[name]
+            total_rows, max_col = _sheet_size(ws, xml)
+            last_row = min(max_rows, total_rows)
+            if merges:
+                rows = [tuple(row) for row in iter_rows_with_merges(ws, xml, last_row)]
+            else:
+                rows = list(ws.iter_rows(min_row=1, max_row=last_row, max_col=max_col, values_only=True))
+            result[name] = {"rows": rows, "total_rows": total_rows}
+        return result
+    finally:
+        xml.close()
+        wb.close()
+
+
+# -------------------------------------------------------------------
+# Células mescladas
+# -------------------------------------------------------------------
+def read_merged_ranges(
+    archive: zipfile.ZipFile, worksheet_path: str, max_row: Optional[int] = None
+) -> List[MergedRange]:
+    """
+    Intervalos mesclados da aba. O bloco <mergeCells> fica depois do
+    <sheetData>, então o XML inteiro é descomprimido em blocos (O(tamanho
+    da aba), mesmo para poucas linhas) e só as tags <mergeCell> são
+    procuradas (sem parse das células). Com ``max_row``, intervalos que
+    começam depois dessa linha são descartados (a memória fica limitada).
+    """
+    ranges: List[MergedRange] = []
+    carry = b""
+    with archive.open(worksheet_path) as src:
+        while True:
+            chunk = src.read(_MERGE_SCAN_CHUNK)
+            buffer = carry + chunk
+            # tags que começam perto do fim podem estar incompletas: ficam para o próximo bloco
+            limit = len(buffer) - _MERGE_SCAN_OVERLAP if chunk else len(buffer)
+            last_end = 0
+            for m in _MERGE_CELL_RE.finditer(buffer):
+                if m.start() >= limit:
+                    break
+                c1, r1, c2, r2 = m.group(1), m.group(2), m.group(3) or m.group(1), m.group(4) or m.group(2)
+                last_end = m.end()
+                if max_row is not None and int(r1) > max_row:
+                    continue
+                ranges.append((
+                    int(r1), column_index_from_string(c1.decode()),
+                    int(r2), column_index_from_string(c2.decode()),
+                ))
+            if not chunk:
+                return ranges
+            carry = buffer[max(limit, last_end):]
+
+
+class MergedRangeIndex:
+    """
+    Índice de intervalos mesclados, com memória proporcional ao número de
+    intervalos (não à área coberta). Pensado para varrer as linhas em ordem:
+    mantém só os intervalos ativos na linha atual, ordenados por coluna,
+    e resolve cada célula com bisect.
+    """
+
+    def __init__(self, ranges: Iterable[MergedRange]):
+        self._ranges = sorted(ranges)
+        self._next = 0
+        self._row: Optional[int] = None
+        self._active: List[MergedRange] = []
+        self._starts: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def _seek_row(self, row: int):
+        if row == self._row:
+            return
+        if self._row is not None and row < self._row:
+            self._next, self._active = 0, []  # voltou: refaz a varredura
+        active = [rng for rng in self._active if rng[2] >= row]
+        while self._next < len(self._ranges) and self._ranges[self._next][0] <= row:
+            rng = self._ranges[self._next]
+            if rng[2] >= row:
+                active.append(rng)
+            self._next += 1
+        active.sort(key=lambda rng: rng[1])
+        self._row, self._active = row, active
+        self._starts = [rng[1] for rng in active]
+
+    def range_at(self, row: int, col: int) -> Optional[MergedRange]:
+        """Intervalo mesclado que contém (row, col), ou ``None``."""
+        self._seek_row(row)
+        i = bisect_right(self._starts, col) - 1
+        if i >= 0 and self._active[i][3] >= col:
+            return self._active[i]
+        return None
+
+    def active_ranges(self, row: int) -> List[MergedRange]:
+        self._seek_row(row)
+        return self._active
+
+
+def iter_rows_with_merges(ws, xml: WorkbookXml, max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    Linhas (valores) de uma aba read-only com as células mescladas
+    preenchidas com o valor da célula superior esquerda. Guarda em memória só
+    os valores dos intervalos que ainda cruzam a linha corrente. ``xml`` é o
+    ``WorkbookXml`` do mesmo arquivo (os merges vêm direto do XML da aba,
+    que é lido inteiro: ver ``read_merged_ranges``).
+    """
+    total_rows, max_col = _sheet_size(ws, xml)
+    last_row = total_rows if max_rows is None else max_rows
+    index = MergedRangeIndex(read_merged_ranges(*xml.locate(ws.title), max_row=last_row))
+    top_left_values: Dict[MergedRange, Any] = {}
+
+    rows = ws.iter_rows(min_row=1, max_row=min(last_row, total_rows), max_col=max_col, values_only=True)
+    for row_idx in range(1, last_row + 1):
+        values = list(next(rows, None) or (None,) * max_col)
+        if len(index):
+            active = index.active_ranges(row_idx)
+            for rng in active:
+                min_row, min_col, _, max_c = rng
+                if min_row == row_idx:
+                    top_left_values[rng] = values[min_col - 1] if min_col <= max_col else None
+                value = top_left_values.get(rng)
+                for col in range(min_col, min(max_c, max_col) + 1):
+                    if (row_idx, col) != (min_row, min_col):
+                        values[col - 1] = value
+            for rng in list(top_left_values):
+                if rng[2] <= row_idx:
+                    del top_left_values[rng]
+        yield values
+
+
+def preview_workbook_with_merges(
+    source: Union[str, BinaryIO],
+    max_rows: int = PREVIEW_MAX_ROWS,
+    sheet_names: Optional[Iterable[Union[str, int]]] = None,
+) -> Dict[str, List[List[Any]]]:
+    """
+    Primeiras ``max_rows`` linhas das abas pedidas (padrão: todas), com
+    merges resolvidos. Custa a aba inteira, não ``max_rows`` (ver
+    ``read_merged_ranges``): para preview comum use ``preview_workbook``
+    e peça só as abas que precisam dos merges.
+    """
+    wb = load_workbook(source, read_only=True, data_only=True)
+    xml = WorkbookXml(source)
+    try:
+        return {
+            name: list(iter_rows_with_merges(wb[name], xml, max_rows)) for name in _select_sheets(wb, sheet_names)
+        }
+    finally:
+        xml.close()
+        wb.close()
@@ -0,0 +1,308 @@
+# app/services/office_pool.py
+
+import os
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Processos LibreOffice mantidos abertos (= conversões simultâneas)
+OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", "2"))
+OFFICE_JOB_TIMEOUT_SECONDS = float(os.getenv("OFFICE_JOB_TIMEOUT_SECONDS", "120"))
+# Espera por um worker livre antes de desistir
+OFFICE_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("OFFICE_ACQUIRE_TIMEOUT_SECONDS", "300"))
+OFFICE_START_TIMEOUT_SECONDS = float(os.getenv("OFFICE_START_TIMEOUT_SECONDS", "30"))
+# Recicla o processo depois de N conversões (vazamentos de memória do soffice)
+OFFICE_MAX_JOBS_PER_WORKER = int(os.getenv("OFFICE_MAX_JOBS_PER_WORKER", "200"))
+OFFICE_PROFILE_DIR = os.getenv("OFFICE_PROFILE_DIR", os.path.join(os.getcwd(), "tmp", "office_profiles"))
+
+
+def find_soffice() -> Optional[str]:
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def _lazy_import_uno():
+    try:
+        import uno  # type: ignore
+        return uno
+    except Exception as e:
+        raise RuntimeError("Dependência faltando: instale o 'python3-uno' do LibreOffice.") from e
+
+
+def office_pool_available() -> bool:
+    """LibreOffice no PATH e binding UNO importável neste Python."""
+    if not find_soffice():
+        return False
+    try:
+        _lazy_import_uno()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _profile_url(path: str) -> str:
+    return "file://" + os.path.abspath(path).replace(os.sep, "/")
+
+
+class OfficeWorker:
+    """
+    Um ``soffice --headless`` de vida longa, com perfil de usuário próprio
+    e aceitando conexões UNO num pipe nomeado. Converte documentos sem pagar
+    a inicialização a cada vez. O perfil é um diretório novo por instância
+    (nome + pid + sufixo aleatório): workers de processos uvicorn diferentes
+    não disputam o mesmo ``UserInstallation``. Ele é apagado em ``kill``/``stop``.
+    """
+
+    def __init__(self, name: str, profile_root: str = OFFICE_PROFILE_DIR,
+                 start_timeout: float = OFFICE_START_TIMEOUT_SECONDS):
+        self.name = name
+        os.makedirs(profile_root, exist_ok=True)
+        self.profile_dir = tempfile.mkdtemp(prefix=f"{name}_{os.getpid()}_", dir=profile_root)
+        self.start_timeout = start_timeout
+        self.jobs = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._desktop = None
+
+    def start(self):
+        uno = _lazy_import_uno()
+        soffice = find_soffice()
+        if not soffice:
+            raise RuntimeError("LibreOffice ('soffice') não encontrado no PATH para converter XLSX -> PDF.")
+        os.makedirs(self.profile_dir, exist_ok=True)
+        pipe = f"orceu_office_{self.name}_{os.getpid()}"
+        self._process = subprocess.Popen(
+            [
+                soffice, "--headless", "--invisible", "--nologo", "--norestore",
+                "--nodefault", "--nofirststartwizard",
+                f"-env:UserInstallation={_profile_url(self.profile_dir)}",
+                f"--accept=pipe,name={pipe};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:pipe,name={pipe};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self.kill()
+                    raise RuntimeError(f"LibreOffice ({self.name}) não respondeu ao iniciar.")
+                time.sleep(0.1)
+        self._desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        self.jobs = 0
+
+    def is_healthy(self) -> bool:
+        if self._process is None or self._process.poll() is not None or self._desktop is None:
+            return False
+        try:
+            self._desktop.getFrames()  # ida e volta pela ponte UNO
+            return True
+        except Exception:
+            return False
+
+    def convert_to_pdf(self, src_path: str, pdf_path: str):
+        uno = _lazy_import_uno()
+        from com.sun.star.beans import PropertyValue  # type: ignore
+
+        def props(**values):
+            result = []
+            for key, value in values.items():
+                prop = PropertyValue()
+                prop.Name, prop.Value = key, value
+                result.append(prop)
+            return tuple(result)
+
+        doc = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(src_path)), "_blank", 0, props(Hidden=True, ReadOnly=True)
+        )
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)), props(FilterName="calc_pdf_Export"))
+        finally:
+            doc.close(True)
+        self.jobs += 1
+
+    def kill(self):
+        self._desktop = None
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+        self._process = None
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def stop(self):
+        if self._desktop is not None:
+            try:
+                self._desktop.terminate()
+                self._process.wait(timeout=10)
+            except Exception:
+                pass
+        self.kill()
+
+
+class OfficePool:
+    """
+    Pool de ``OfficeWorker``: no máximo ``size`` conversões simultâneas (as
+    demais esperam um worker livre), health check ao pegar o worker, timeout
+    por conversão (o processo é morto e substituído) e reciclagem depois de
+    ``max_jobs`` conversões. Os workers sobem sob demanda.
+    """
+
+    def __init__(
+        self,
+        size: int = OFFICE_POOL_SIZE,
+        job_timeout: float = OFFICE_JOB_TIMEOUT_SECONDS,
+        acquire_timeout: float = OFFICE_ACQUIRE_TIMEOUT_SECONDS,
+        max_jobs: int = OFFICE_MAX_JOBS_PER_WORKER,
+        worker_factory: Callable[[str], OfficeWorker] = OfficeWorker,
+    ):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_jobs = max_jobs
+        self.worker_factory = worker_factory
+        self._idle: "queue.LifoQueue[Optional[OfficeWorker]]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)  # vaga ainda sem processo
+        self._workers: List[OfficeWorker] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._closed = False
+
+    def _new_worker(self) -> OfficeWorker:
+        with self._lock:
+            self._seq += 1
+            worker = self.worker_factory(f"w{self._seq}")
+        try:
+            worker.start()
+        except BaseException:
+            worker.kill()  # processo parcial e perfil temporário
+            raise
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: OfficeWorker):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    @contextmanager
+    def _checkout(self) -> Iterator[OfficeWorker]:
+        if self._closed:
+            raise RuntimeError("Pool do LibreOffice encerrado.")
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError("Nenhum worker do LibreOffice livre.")
+        try:
+            if worker is not None and (worker.jobs >= self.max_jobs or not worker.is_healthy()):
+                logger.info("Reiniciando worker do LibreOffice %s", worker.name)
+                self._discard(worker)
+                worker = None
+            if worker is None:
+                worker = self._new_worker()
+        except BaseException:
+            self._idle.put(None)
+            raise
+        try:
+            yield worker
+        except BaseException:
+            self._discard(worker)  # estado desconhecido: não volta ao pool
+            self._idle.put(None)
+            raise
+        else:
+            self._idle.put(worker)
+
+    def convert_to_pdf(self, src_path: str, pdf_path: str, timeout: Optional[float] = None):
+        timeout = self.job_timeout if timeout is None else timeout
+        with self._checkout() as worker:
+            timed_out = threading.Event()
+
+            def on_timeout():
+                timed_out.set()
+                worker.kill()  # a chamada UNO em andamento falha em seguida
+
+            timer = threading.Timer(timeout, on_timeout)
+            timer.daemon = True
+            timer.start()
+            try:
+                worker.convert_to_pdf(src_path, pdf_path)
+            except Exception as e:
+                if timed_out.is_set():
+                    raise TimeoutError(f"Conversão excedeu {timeout:.0f}s: {os.path.basename(src_path)}") from e
+                raise
+            finally:
+                timer.cancel()
+            if timed_out.is_set():
+                raise TimeoutError(f"Conversão excedeu {timeout:.0f}s: {os.path.basename(src_path)}")
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+
+def convert_with_soffice_cli(src_path: str, pdf_path: str, timeout: float = OFFICE_JOB_TIMEOUT_SECONDS):
+    """
+    Conversão avulsa (um processo por chamada), para quando não há UNO.
+    Usa um perfil temporário próprio: chamadas simultâneas não colidem.
+    """
+    soffice = find_soffice()
+    if not soffice:
+        raise RuntimeError("LibreOffice ('soffice') não encontrado no PATH para converter XLSX -> PDF.")
+    with tempfile.TemporaryDirectory(prefix="soffice_") as tmp:
+        outdir = os.path.join(tmp, "out")
+        subprocess.run(
+            [
+                soffice, "--headless", "--norestore", "--nolockcheck",
+                f"-env:UserInstallation={_profile_url(os.path.join(tmp, 'profile'))}",
+                "--convert-to", "pdf", "--outdir", outdir, src_path,
+            ],
+            check=True,
+            timeout=timeout,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(src_path))[0] + ".pdf")
+        shutil.move(produced, pdf_path)
+
+
+_pool: Optional[OfficePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool() -> OfficePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficePool()
+        return _pool
+
+
+def close_office_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
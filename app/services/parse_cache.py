@@ -0,0 +1,139 @@
+# app/services/parse_cache.py
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(os.getcwd(), "tmp", "parse_cache"))
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024
+# O total em disco é contado em memória; a varredura do diretório só acontece
+# ao passar do limite ou quando a contagem fica velha (outros processos gravam)
+PARSE_CACHE_RESCAN_SECONDS = float(os.getenv("PARSE_CACHE_RESCAN_SECONDS", "300"))
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache em disco, endereçado por conteúdo, para resultados de parse
+    (JSON do orçamento, Markdown...). Cada entrada é um arquivo JSON; o mtime
+    marca o último uso e a remoção segue LRU quando ``max_bytes`` é excedido.
+    """
+
+    def __init__(
+        self,
+        root: str = PARSE_CACHE_DIR,
+        max_bytes: int = PARSE_CACHE_MAX_BYTES,
+        rescan_seconds: float = PARSE_CACHE_RESCAN_SECONDS,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.rescan_seconds = rescan_seconds
+        self._total: Optional[int] = None  # bytes em disco, desde a última varredura
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tenant_id: str, content_hash: str, *parts: Any) -> str:
+        """
+        Chave a partir do tenant + hash do arquivo + versão do parser, modo,
+        opções... Separada por tenant: um tenant não consegue descobrir (pelo
+        hit/miss) se outro já enviou o mesmo arquivo.
+        """
+        raw = "|".join([tenant_id, content_hash, *(str(p) for p in parts)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)  # marca uso recente (LRU)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        # grava em arquivo temporário e troca atomicamente (leitores nunca veem meio arquivo)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        try:
+            added = os.path.getsize(path) - replaced
+        except OSError:
+            added = 0
+        self._account(added)
+
+    def _account(self, added: int):
+        with self._lock:
+            stale = self._total is None or time.monotonic() - self._scanned_at > self.rescan_seconds
+            if not stale:
+                self._total += added
+                if self._total <= self.max_bytes:
+                    return
+            self._evict()
+
+    def _evict(self):
+        """Varre o diretório, remove as entradas menos usadas até caber e atualiza o total."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+        self._total, self._scanned_at = total, time.monotonic()
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, full in entries:
+            try:
+                os.remove(full)
+            except (FileNotFoundError, PermissionError):
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._total = total
+
+
+parse_cache = ParseCache()
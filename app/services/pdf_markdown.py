@@ -0,0 +1,289 @@
+# app/services/pdf_markdown.py
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.services.parse_cache import ParseCache, parse_cache
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Processos para extrair páginas em paralelo e páginas por tarefa
+PDF_MARKDOWN_WORKERS = int(os.getenv("PDF_MARKDOWN_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+
+# Entra na chave do cache por página (junto com a versão do pymupdf4llm)
+PDF_PAGE_CACHE_VERSION = "1"
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _lazy_import_pymupdf4llm():
+    try:
+        import pymupdf4llm  # type: ignore
+        return pymupdf4llm
+    except Exception as e:
+        raise RuntimeError("Dependência faltando: instale 'pymupdf4llm'.") from e
+
+
+def _jsonable(value: Any) -> Any:
+    """Chunk do pymupdf4llm em tipos JSON (Rect/tuplas viram listas)."""
+    def default(obj):
+        try:
+            return list(obj)
+        except TypeError:
+            return str(obj)
+    return json.loads(json.dumps(value, default=default))
+
+
+def page_count(path: str) -> int:
+    _lazy_import_pymupdf4llm()
+    try:
+        import pymupdf  # type: ignore
+    except ImportError:  # versões antigas só expõem o nome 'fitz'
+        import fitz as pymupdf  # type: ignore
+    with pymupdf.open(path) as doc:
+        return doc.page_count
+
+
+def identify_headers(path: str):
+    """
+    Níveis de título (tamanho da fonte -> "#", "##", ...) do documento
+    inteiro, como o ``to_markdown`` sem ``pages`` calcula. Cada faixa recebe
+    o mesmo objeto: calculados só com as páginas da faixa, os níveis
+    mudariam de uma faixa para outra e a concatenação não bateria com o
+    Markdown do documento inteiro. O objeto é picklável (dicionário e float).
+
+    ``None`` com o motor de layout (``pymupdf.layout``): ele não aceita
+    ``hdr_info`` e não expõe ``IdentifyHeaders``; ver ``page_batch``.
+    """
+    identify = getattr(_lazy_import_pymupdf4llm(), "IdentifyHeaders", None)
+    return identify(path) if identify is not None else None
+
+
+def page_batch() -> Optional[int]:
+    """
+    Tamanho do bloco de páginas quando a saída de uma página depende da
+    faixa em que ela foi extraída (motor de layout: os níveis de título
+    saem só das páginas da faixa). Nesse caso as faixas são blocos
+    alinhados de ``PDF_PAGES_PER_TASK`` páginas, sempre extraídos inteiros,
+    e o tamanho entra na chave do cache. ``None`` quando os títulos são
+    calculados uma vez para o documento (``identify_headers``).
+    """
+    if getattr(_lazy_import_pymupdf4llm(), "IdentifyHeaders", None) is not None:
+        return None
+    return PDF_PAGES_PER_TASK
+
+
+def extract_pages(path: str, pages: Sequence[int], strategy: str, headers=None) -> List[Dict[str, Any]]:
+    """
+    Markdown de ``pages`` (0-based), um chunk por página, na ordem pedida.
+    Roda no processo filho: abre o PDF por conta própria. ``headers`` vem
+    de ``identify_headers``; sem ele o pymupdf4llm refaz a varredura.
+    """
+    pymupdf4llm = _lazy_import_pymupdf4llm()
+    options = {"hdr_info": headers} if headers is not None else {}
+    chunks = pymupdf4llm.to_markdown(
+        path,
+        pages=list(pages),
+        table_strategy=strategy,
+        page_chunks=True,
+        show_progress=False,
+        **options,
+    )
+    return [_jsonable(chunk) for chunk in chunks]
+
+
+def _extract_pages_task(args) -> List[Dict[str, Any]]:
+    return extract_pages(*args)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PDF_MARKDOWN_WORKERS)
+        return _executor
+
+
+def close_pdf_markdown_pool():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+@dataclass
+class PdfMarkdownResult:
+    pages: List[Dict[str, Any]] = field(default_factory=list)
+    pages_cached: int = 0
+    pages_extracted: int = 0
+
+    @property
+    def markdown(self) -> str:
+        # concatenação das páginas: igual ao to_markdown do documento inteiro,
+        # exceto pelos níveis de título com o motor de layout (ver page_batch)
+        return "".join(page.get("text") or "" for page in self.pages)
+
+
+def page_cache_key(
+    tenant_id: str, content_hash: str, page_number: int, strategy: str, batch: Optional[int] = None
+) -> str:
+    pymupdf4llm = _lazy_import_pymupdf4llm()
+    version = getattr(pymupdf4llm, "__version__", None) or getattr(pymupdf4llm, "version", "")
+    parts = ["pdf_page", PDF_PAGE_CACHE_VERSION, version, strategy]
+    if batch is not None:
+        parts.append(f"batch={batch}")
+    return ParseCache.make_key(tenant_id, content_hash, *parts, page_number)
+
+
+class _PageExtraction:
+    """
+    Estado de uma extração: páginas que vieram do cache, faixas que faltam
+    e a gravação de cada faixa pronta (cache + progresso). A versão
+    síncrona e a assíncrona só diferem em como esperam as faixas.
+    """
+
+    def __init__(self, path, tenant_id, content_hash, strategy, progress, cache):
+        self.path = path
+        self.strategy = strategy
+        self.progress = progress
+        self.cache = cache
+        self.total = page_count(path)
+        self.result = PdfMarkdownResult(pages=[None] * self.total)  # type: ignore[list-item]
+        batch = page_batch()
+        self.keys = [page_cache_key(tenant_id, content_hash, n, strategy, batch) for n in range(self.total)]
+
+        missing = []
+        for n, key in enumerate(self.keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.append(n)
+            else:
+                self.result.pages[n] = cached
+        if batch is None:
+            self.ranges = [missing[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(missing), PDF_PAGES_PER_TASK)]
+        else:
+            # bloco com alguma página faltando é refeito inteiro (mesma faixa, mesma saída)
+            blocks = sorted({n // batch for n in missing})
+            self.ranges = [list(range(b * batch, min((b + 1) * batch, self.total))) for b in blocks]
+        self.result.pages_cached = self.total - sum(len(pages) for pages in self.ranges)
+        self.done = self.result.pages_cached
+        self._report()
+
+    def _report(self):
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+
+    def store(self, pages: List[int], chunks: List[Dict[str, Any]]):
+        for n, chunk in zip(pages, chunks):
+            self.result.pages[n] = chunk
+            try:
+                self.cache.set(self.keys[n], chunk)
+            except OSError:
+                # disco cheio/sem permissão: a página segue no resultado, só não fica em cache
+                logger.exception("Não foi possível gravar no cache a página %s de %s", n + 1, self.path)
+        self.result.pages_extracted += len(pages)
+        self.done += len(pages)
+        self._report()
+
+    def finish(self) -> PdfMarkdownResult:
+        # metadados do cache apontam para o arquivo de quando a página foi extraída
+        for page in self.result.pages:
+            if isinstance(page.get("metadata"), dict):
+                page["metadata"]["file_path"] = self.path
+        return self.result
+
+
+def extract_pdf_markdown(
+    path: str,
+    tenant_id: str,
+    content_hash: str,
+    strategy: str = "text",
+    progress: Optional[ProgressCallback] = None,
+    parallel: bool = True,
+    cache: ParseCache = parse_cache,
+) -> PdfMarkdownResult:
+    """
+    Markdown do PDF página a página. Cada página fica no cache por (tenant,
+    hash do arquivo, página, ``strategy``): repetir o pedido, trocar ``page_chunks``
+    ou retomar uma extração interrompida só processa as páginas que faltam;
+    outra estratégia refaz apenas as páginas dela. As que faltam são
+    divididas em faixas de ``PDF_PAGES_PER_TASK`` e extraídas num pool de
+    processos; ``progress(páginas_prontas, total)`` é chamado a cada faixa.
+    Os níveis de título saem de uma única varredura do documento inteiro
+    (``identify_headers``), passada a todas as faixas; com o motor de
+    layout, que não aceita isso, as faixas são blocos fixos (``page_batch``).
+    """
+    job = _PageExtraction(path, tenant_id, content_hash, strategy, progress, cache)
+    if not job.ranges:
+        return job.finish()
+
+    if parallel and len(job.ranges) > 1 and PDF_MARKDOWN_WORKERS > 1:
+        executor = _get_executor()
+        headers = executor.submit(identify_headers, path).result()
+        futures = {
+            executor.submit(_extract_pages_task, (path, pages, strategy, headers)): pages for pages in job.ranges
+        }
+        try:
+            for future in as_completed(futures):
+                job.store(futures[future], future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+    else:
+        headers = identify_headers(path)
+        for pages in job.ranges:
+            job.store(pages, extract_pages(path, pages, strategy, headers))
+    return job.finish()
+
+
+async def extract_pdf_markdown_async(
+    path: str,
+    tenant_id: str,
+    content_hash: str,
+    strategy: str = "text",
+    progress: Optional[ProgressCallback] = None,
+    cache: ParseCache = parse_cache,
+) -> PdfMarkdownResult:
+    """
+    ``extract_pdf_markdown`` para endpoints ``async``: as faixas vão para o
+    mesmo pool de processos e são aguardadas no event loop, sem prender uma
+    thread enquanto o pool trabalha. Cache e progresso (disco e SQLite)
+    rodam no threadpool.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    job = await run_in_threadpool(_PageExtraction, path, tenant_id, content_hash, strategy, progress, cache)
+    if not job.ranges:
+        return await run_in_threadpool(job.finish)
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    headers = await loop.run_in_executor(executor, identify_headers, path)
+
+    async def extract(pages: List[int]):
+        return pages, await loop.run_in_executor(executor, _extract_pages_task, (path, pages, strategy, headers))
+
+    tasks = [asyncio.ensure_future(extract(pages)) for pages in job.ranges]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            pages, chunks = await next_done
+            await run_in_threadpool(job.store, pages, chunks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return await run_in_threadpool(job.finish)
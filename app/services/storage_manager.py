@@ -1,15 +1,148 @@
 # app/services/storage_manager.py
 
+import io
 import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import BinaryIO, Iterator, Optional
+
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from dotenv import load_dotenv
 load_dotenv()
 
+_MB = 1024 * 1024
+
+# Pool HTTP do client (compartilhado por todas as threads/uploads simultâneos)
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_S3_MAX_POOL_CONNECTIONS", "50"))
+# Transferências: acima do limiar o upload/download vira multipart em paralelo
+S3_MULTIPART_THRESHOLD = int(os.getenv("AWS_S3_MULTIPART_THRESHOLD_MB", "8")) * _MB
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("AWS_S3_MULTIPART_CHUNKSIZE_MB", "8")) * _MB
+S3_MAX_CONCURRENCY = int(os.getenv("AWS_S3_MAX_CONCURRENCY", "8"))
+# Endpoint alternativo (MinIO, stand-in local...); vazio = AWS
+S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
+
+STREAM_CHUNK_SIZE = _MB
+
+# Marcador de "pasta" (objeto vazio) criado uma única vez por prefixo
+FOLDER_MARKER = ".keep"
+
+# Leitura por range: tamanho do bloco e quantos blocos ficam em memória
+RANGE_BLOCK_SIZE = 256 * 1024
+RANGE_CACHE_BLOCKS = 64
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    File-like somente leitura, com seek, que busca do S3 apenas os blocos
+    realmente lidos (GET com Range). Blocos vizinhos pedidos juntos viram uma
+    única requisição; os últimos ``cache_blocks`` ficam em memória (o zipfile
+    volta várias vezes ao diretório central no fim do arquivo).
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        object_name: str,
+        size: int,
+        block_size: int = RANGE_BLOCK_SIZE,
+        cache_blocks: int = RANGE_CACHE_BLOCKS,
+    ):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.object_name = object_name
+        self.size = size
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self._blocks.clear()
+        super().close()
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if pos < 0:
+            raise ValueError("posição negativa")
+        self._pos = pos
+        return pos
+
+    def _fetch(self, first: int, last: int):
+        start = first * self.block_size
+        end = min((last + 1) * self.block_size, self.size) - 1
+        body = self.client.get_object(
+            Bucket=self.bucket, Key=self.object_name, Range=f"bytes={start}-{end}"
+        )["Body"].read()
+        self.requests += 1
+        self.bytes_fetched += len(body)
+        for idx in range(first, last + 1):
+            offset = (idx - first) * self.block_size
+            self._blocks[idx] = body[offset:offset + self.block_size]
+            self._blocks.move_to_end(idx)
+
+    def readinto(self, buffer) -> int:
+        end = min(self._pos + len(buffer), self.size)
+        if self._pos >= end:
+            return 0
+        first, last = self._pos // self.block_size, (end - 1) // self.block_size
+        missing = [idx for idx in range(first, last + 1) if idx not in self._blocks]
+        # agrupa blocos faltantes contíguos num único GET
+        run_start = None
+        for i, idx in enumerate(missing):
+            if run_start is None:
+                run_start = idx
+            if i + 1 == len(missing) or missing[i + 1] != idx + 1:
+                self._fetch(run_start, idx)
+                run_start = None
+
+        view = memoryview(buffer)
+        written = 0
+        for idx in range(first, last + 1):
+            block = self._blocks[idx]
+            self._blocks.move_to_end(idx)
+            lo = max(self._pos + written - idx * self.block_size, 0)
+            chunk = block[lo:lo + (end - self._pos - written)]
+            view[written:written + len(chunk)] = chunk
+            written += len(chunk)
+        self._pos += written
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return written
+
 
 class S3FileManager:
-    def __init__(self):
+    def __init__(
+        self,
+        max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+        transfer_config: Optional[TransferConfig] = None,
+    ):
         self.bucket = os.getenv("AWS_S3_BUCKET_NAME")
         region = os.getenv("AWS_DEFAULT_REGION")
         access_key = os.getenv("AWS_ACCESS_KEY_ID")
@@ -18,20 +151,70 @@ class S3FileManager:
         if not all([self.bucket, region, access_key, secret_key]):
             raise RuntimeError("Variáveis AWS_* não configuradas no .env")
 
+        self.max_pool_connections = max_pool_connections
         self.client = boto3.client(
             "s3",
             region_name=region,
             aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
+            aws_secret_access_key=secret_key,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"max_attempts": 5, "mode": "standard"},
+                tcp_keepalive=True,
+            ),
+        )
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=S3_MAX_CONCURRENCY,
+            use_threads=True,
         )
+        # prefixos cujo marcador já existe (evita HEAD/PUT repetidos no processo)
+        self._known_prefixes: set[str] = set()
+        self._prefix_lock = threading.Lock()
 
     # -------- Arquivos --------
     def upload_file(self, file_path: str, object_name: str) -> str:
-        self.client.upload_file(file_path, self.bucket, object_name)
+        self.client.upload_file(file_path, self.bucket, object_name, Config=self.transfer_config)
+        return object_name
+
+    def upload_fileobj(self, fileobj: BinaryIO, object_name: str) -> str:
+        """Envia a partir de um file-like (multipart em blocos, sem arquivo local)."""
+        self.client.upload_fileobj(fileobj, self.bucket, object_name, Config=self.transfer_config)
         return object_name
 
     def download_file(self, object_name: str, dest_path: str):
-        self.client.download_file(self.bucket, object_name, dest_path)
+        self.client.download_file(self.bucket, object_name, dest_path, Config=self.transfer_config)
+
+    def download_fileobj(self, object_name: str, fileobj: BinaryIO):
+        self.client.download_fileobj(self.bucket, object_name, fileobj, Config=self.transfer_config)
+
+    def iter_object(self, object_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Lê o objeto em blocos (GET único, sem materializar o corpo inteiro)."""
+        body = self.client.get_object(Bucket=self.bucket, Key=object_name)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def open_range_reader(self, object_name: str, size: Optional[int] = None, **kwargs) -> S3RangeReader:
+        """Abre o objeto para leitura aleatória por range (sem baixar tudo)."""
+        if size is None:
+            head = self.head_object(object_name)
+            if head is None:
+                raise FileNotFoundError(object_name)
+            size = head["ContentLength"]
+        return S3RangeReader(self.client, self.bucket, object_name, size, **kwargs)
+
+    def head_object(self, object_name: str) -> Optional[dict]:
+        """Metadados do objeto (HEAD) ou ``None`` se não existir."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=object_name)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
 
     def delete_file(self, object_name: str):
         self.client.delete_object(Bucket=self.bucket, Key=object_name)
@@ -56,6 +239,23 @@ class S3FileManager:
         resp = self.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix, MaxKeys=1)
         return "Contents" in resp
 
+    def ensure_folder_marker(self, prefix: str) -> bool:
+        """
+        Garante o marcador vazio ``{prefix}.keep``. Idempotente: após a primeira
+        confirmação o prefixo fica no cache local e não gera mais chamadas ao S3.
+        Retorna ``True`` quando o marcador foi criado agora.
+        """
+        if prefix in self._known_prefixes:
+            return False
+        key = f"{prefix}{FOLDER_MARKER}"
+        created = False
+        if self.head_object(key) is None:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=b"")
+            created = True
+        with self._prefix_lock:
+            self._known_prefixes.add(prefix)
+        return created
+
     def delete_folder(self, prefix: str):
         """Remove todos os objetos de uma pasta lógica."""
         resp = self.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
@@ -63,3 +263,79 @@ class S3FileManager:
             return
         objects = [{"Key": obj["Key"]} for obj in resp["Contents"]]
         self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+        with self._prefix_lock:
+            self._known_prefixes = {p for p in self._known_prefixes if not p.startswith(prefix)}
+
+
+class AsyncS3FileManager:
+    """
+    Versão ``await``-ável do S3FileManager para endpoints ``async def``.
+    O client boto3 é thread-safe: cada chamada bloqueante roda num pool de
+    threads próprio, do tamanho do pool de conexões, sem travar o event loop.
+    """
+
+    def __init__(self, manager: Optional[S3FileManager] = None, max_workers: Optional[int] = None):
+        self.manager = manager or S3FileManager()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.manager.max_pool_connections,
+            thread_name_prefix="s3",
+        )
+
+    @property
+    def bucket(self) -> str:
+        return self.manager.bucket
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    async def upload_file(self, file_path: str, object_name: str) -> str:
+        return await self._run(self.manager.upload_file, file_path, object_name)
+
+    async def upload_fileobj(self, fileobj: BinaryIO, object_name: str) -> str:
+        return await self._run(self.manager.upload_fileobj, fileobj, object_name)
+
+    async def download_file(self, object_name: str, dest_path: str):
+        return await self._run(self.manager.download_file, object_name, dest_path)
+
+    async def download_fileobj(self, object_name: str, fileobj: BinaryIO):
+        return await self._run(self.manager.download_fileobj, object_name, fileobj)
+
+    async def iter_object(self, object_name: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        """Gerador assíncrono de blocos do objeto (cada leitura roda no pool)."""
+        chunks = await self._run(self.manager.iter_object, object_name, chunk_size)
+        try:
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await self._run(chunks.close)
+
+    async def head_object(self, object_name: str) -> Optional[dict]:
+        return await self._run(self.manager.head_object, object_name)
+
+    async def delete_file(self, object_name: str):
+        return await self._run(self.manager.delete_file, object_name)
+
+    def generate_presigned_url(self, object_name: str, expiration: int = 3600) -> str:
+        # só assina localmente, sem I/O
+        return self.manager.generate_presigned_url(object_name, expiration)
+
+    async def list_folder(self, prefix: str) -> list[str]:
+        return await self._run(self.manager.list_folder, prefix)
+
+    async def folder_exists(self, prefix: str) -> bool:
+        return await self._run(self.manager.folder_exists, prefix)
+
+    async def ensure_folder_marker(self, prefix: str) -> bool:
+        if prefix in self.manager._known_prefixes:
+            return False
+        return await self._run(self.manager.ensure_folder_marker, prefix)
+
+    async def delete_folder(self, prefix: str):
+        return await self._run(self.manager.delete_folder, prefix)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
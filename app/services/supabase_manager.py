@@ -1,28 +1,173 @@
 # app/services/supabase_manager.py
 
 import os
-from supabase import create_client, Client
-from typing import List, Dict, Any, Optional
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+from postgrest import SyncPostgrestClient, SyncRequestBuilder
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool HTTP compartilhado pelo processo (keep-alive entre requisições)
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "120"))
+
+# Escrita em lote: tamanho de cada request, chunks simultâneos e retentativas
+SUPABASE_BULK_CHUNK_SIZE = int(os.getenv("SUPABASE_BULK_CHUNK_SIZE", "500"))
+SUPABASE_BULK_MAX_WORKERS = int(os.getenv("SUPABASE_BULK_MAX_WORKERS", "4"))
+SUPABASE_BULK_MAX_RETRIES = int(os.getenv("SUPABASE_BULK_MAX_RETRIES", "3"))
+SUPABASE_BULK_BACKOFF_SECONDS = float(os.getenv("SUPABASE_BULK_BACKOFF_SECONDS", "0.5"))
+SUPABASE_BULK_BACKOFF_MAX_SECONDS = 10.0
+# Delete por lista de ids vai na URL (in.(...)): chunks menores que os de insert
+SUPABASE_DELETE_CHUNK_SIZE = int(os.getenv("SUPABASE_DELETE_CHUNK_SIZE", "200"))
+# Leitura paginada: não pode passar do max-rows do PostgREST (padrão do Supabase: 1000)
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+
+# Erros transitórios: HTTP de gateway/limite e SQLSTATEs de timeout, conflito
+# de serialização, deadlock, falta de conexões e conexão perdida (08xxx)
+_TRANSIENT_HTTP_STATUS = {408, 425, 429, 500, 502, 503, 504}
+_TRANSIENT_SQLSTATES = {"57014", "40001", "40P01", "53300", "53400", "57P01", "57P03"}
+# Subconjunto em que a escrita com certeza não foi aplicada: o request não
+# saiu do cliente, o servidor recusou antes de executar, ou o Postgres fez
+# rollback. Só esses são retentados em escritas não idempotentes (insert puro).
+_UNSENT_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_UNAPPLIED_HTTP_STATUS = {429, 503}
+_UNAPPLIED_SQLSTATES = {"57014", "40001", "40P01", "53300", "53400", "57P03"}
+
+
+def is_transient_error(exc: BaseException, idempotent: bool = True) -> bool:
+    """
+    Se vale a pena reenviar o chunk que falhou com ``exc``. Com
+    ``idempotent=False`` (insert sem upsert), só quando a escrita com certeza
+    não foi aplicada: um ReadTimeout, um 504 ou a conexão caindo no meio
+    podem vir depois do commit, e reenviar duplicaria as linhas.
+    """
+    if isinstance(exc, httpx.TransportError):  # timeout, conexão recusada/resetada
+        return idempotent or isinstance(exc, _UNSENT_TRANSPORT_ERRORS)
+    if isinstance(exc, APIError):
+        code = str(exc.code or "")
+        statuses = _TRANSIENT_HTTP_STATUS if idempotent else _UNAPPLIED_HTTP_STATUS
+        if code.isdigit() and int(code) in statuses:  # corpo não-JSON: code = status HTTP
+            return True
+        if not idempotent:
+            return code in _UNAPPLIED_SQLSTATES
+        return code in _TRANSIENT_SQLSTATES or code.startswith("08")
+    return False
+
+
+# -------------------------------------------------------------------
+# Client compartilhado
+# -------------------------------------------------------------------
+_clients: Dict[Tuple[str, str], SyncPostgrestClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_postgrest_client() -> SyncPostgrestClient:
+    """
+    Client PostgREST do processo (um por SUPABASE_URL/ANON_KEY), com um único
+    pool httpx: as conexões ficam abertas e são reaproveitadas por todas as
+    requisições e threads. Autenticado só com a anon key.
+    """
+    url = os.getenv("SUPABASE_URL")
+    anon_key = os.getenv("SUPABASE_ANON_KEY")  # chave pública (não service_role!)
+
+    if not url or not anon_key:
+        raise RuntimeError("Variáveis SUPABASE_URL e SUPABASE_ANON_KEY não configuradas no .env")
+
+    key = (url, anon_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            rest_url = f"{url.rstrip('/')}/rest/v1"
+            http_client = httpx.Client(
+                base_url=rest_url,
+                timeout=SUPABASE_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                follow_redirects=True,
+            )
+            client = SyncPostgrestClient(
+                rest_url,
+                headers={"apikey": anon_key, "Authorization": f"Bearer {anon_key}"},
+                http_client=http_client,
+            )
+            _clients[key] = client
+    return client
+
+
+def close_postgrest_clients():
+    """Fecha os pools HTTP (shutdown da aplicação)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.session.close()
+
+
+def _user_postgrest_client(base: SyncPostgrestClient, jwt_token: str) -> SyncPostgrestClient:
+    """
+    Client com o Authorization do usuário, pela API pública do postgrest
+    (``auth``), sobre a sessão httpx do client compartilhado: só os headers
+    são próprios, o pool de conexões é o mesmo. Não deve ser fechado (a
+    sessão é do processo, ver ``close_postgrest_clients``).
+    """
+    client = SyncPostgrestClient(str(base.base_url), headers=dict(base.headers), http_client=base.session)
+    return client.auth(jwt_token)
+
+
+@dataclass
+class BulkWriteResult:
+    """
+    Resumo de um ``bulk_write``/``bulk_delete``: linhas gravadas (ou
+    apagadas), linhas que falharam e por quê.
+    """
+
+    inserted: int = 0
+    failed: int = 0
+    deleted: int = 0
+    data: List[Dict[str, Any]] = field(default_factory=list)
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.failed == 0
 
 
 class SupabaseManager:
     """
     Classe genérica para gerenciar interações com o Supabase.
     Suporta autenticação via JWT para respeitar RLS.
+
+    Barata de construir (uma por requisição): usa o client PostgREST
+    compartilhado do processo e só sobrepõe o header Authorization.
     """
 
     def __init__(self, jwt_token: Optional[str] = None):
-        url = os.getenv("SUPABASE_URL")
-        anon_key = os.getenv("SUPABASE_ANON_KEY")  # chave pública (não service_role!)
-
-        if not url or not anon_key:
-            raise RuntimeError("Variáveis SUPABASE_URL e SUPABASE_ANON_KEY não configuradas no .env")
-
-        self.client: Client = create_client(url, anon_key)
-
+        base = get_postgrest_client()
         # Se for passado um JWT (usuário logado), ele será usado nas requisições
-        if jwt_token:
-            self.client.postgrest.auth(jwt_token)
+        self.postgrest = _user_postgrest_client(base, jwt_token) if jwt_token else base
+
+    def table(self, table: str) -> SyncRequestBuilder:
+        return self.postgrest.from_(table)
 
     # --------------------------
     # Métodos genéricos
@@ -30,17 +175,22 @@ class SupabaseManager:
 
     def insert(self, table: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Insere um registro em uma tabela."""
-        response = self.client.table(table).insert(data).execute()
+        response = self.table(table).insert(data).execute()
         return response.data
 
     def bulk_insert(self, table: str, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Insere vários registros de uma vez."""
-        response = self.client.table(table).insert(data).execute()
-        return response.data
+        """
+        Insere vários registros, em chunks (ver ``bulk_write``). Levanta o
+        primeiro erro se algum chunk falhar; os chunks já gravados ficam.
+        """
+        result = self.bulk_write(table, data)
+        if result.errors:
+            raise result.errors[0]["exception"]
+        return result.data
 
     def get(self, table: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Consulta registros de uma tabela com filtros opcionais."""
-        query = self.client.table(table).select("*")
+        query = self.table(table).select("*")
         if filters:
             for col, val in filters.items():
                 query = query.eq(col, val)
@@ -49,7 +199,7 @@ class SupabaseManager:
 
     def update(self, table: str, filters: Dict[str, Any], new_values: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Atualiza registros que correspondem aos filtros."""
-        query = self.client.table(table).update(new_values)
+        query = self.table(table).update(new_values)
         for col, val in filters.items():
             query = query.eq(col, val)
         response = query.execute()
@@ -57,8 +207,189 @@ class SupabaseManager:
 
     def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Deleta registros que correspondem aos filtros."""
-        query = self.client.table(table).delete()
+        query = self.table(table).delete()
         for col, val in filters.items():
             query = query.eq(col, val)
         response = query.execute()
         return response.data
+
+    # --------------------------
+    # Escrita em lote
+    # --------------------------
+
+    def bulk_write(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        chunk_size: int = SUPABASE_BULK_CHUNK_SIZE,
+        max_workers: int = SUPABASE_BULK_MAX_WORKERS,
+        upsert: bool = False,
+        on_conflict: Optional[str] = None,
+        max_retries: int = SUPABASE_BULK_MAX_RETRIES,
+        backoff_seconds: float = SUPABASE_BULK_BACKOFF_SECONDS,
+        returning: bool = True,
+    ) -> BulkWriteResult:
+        """
+        Grava ``rows`` em chunks de ``chunk_size`` linhas, com no máximo
+        ``max_workers`` requests simultâneos. Erros transitórios (rede, 5xx,
+        429, timeout do Postgres...) são retentados com backoff exponencial;
+        os demais marcam o chunk como falho sem parar os outros. Cada chunk é
+        atômico, o lote inteiro não. Insert puro (sem upsert) não é
+        idempotente: só é retentado quando a escrita com certeza não foi
+        aplicada (ver ``is_transient_error``).
+
+        ``upsert=True`` usa ``on_conflict`` (colunas separadas por vírgula)
+        como alvo do conflito. ``returning=False`` não devolve as linhas
+        gravadas (menos tráfego em cargas grandes).
+        """
+        returning_method = ReturnMethod.representation if returning else ReturnMethod.minimal
+
+        def query(chunk_rows):
+            builder = self.table(table)
+            if upsert:
+                return builder.upsert(chunk_rows, on_conflict=on_conflict or "", returning=returning_method)
+            return builder.insert(chunk_rows, returning=returning_method)
+
+        result = BulkWriteResult()
+        for start, chunk_rows, data, exc in self._run_chunks(
+            "bulk_write", table, rows, chunk_size, max_workers, query, max_retries, backoff_seconds,
+            idempotent=upsert,
+        ):
+            if exc is None:
+                result.inserted += len(chunk_rows)
+                if returning and data:
+                    result.data.extend(data)
+            else:
+                self._record_failure(result, start, chunk_rows, exc)
+        return result
+
+    def bulk_delete(
+        self,
+        table: str,
+        ids: List[Any],
+        column: str = "id",
+        chunk_size: int = SUPABASE_DELETE_CHUNK_SIZE,
+        max_workers: int = SUPABASE_BULK_MAX_WORKERS,
+        max_retries: int = SUPABASE_BULK_MAX_RETRIES,
+        backoff_seconds: float = SUPABASE_BULK_BACKOFF_SECONDS,
+    ) -> BulkWriteResult:
+        """
+        Apaga as linhas cujo ``column`` está em ``ids`` (``in.(...)``, um
+        request por chunk), com os mesmos retries e semântica de erro do
+        ``bulk_write``. ``deleted`` conta os ids enviados nos chunks que deram
+        certo (ids inexistentes não são erro).
+        """
+        def query(chunk_ids):
+            return self.table(table).delete(returning=ReturnMethod.minimal).in_(column, chunk_ids)
+
+        result = BulkWriteResult()
+        for start, chunk_ids, _, exc in self._run_chunks(
+            "bulk_delete", table, ids, chunk_size, max_workers, query, max_retries, backoff_seconds
+        ):
+            if exc is None:
+                result.deleted += len(chunk_ids)
+            else:
+                self._record_failure(result, start, chunk_ids, exc)
+        return result
+
+    def select_all(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+        order: str = "id",
+        page_size: int = SUPABASE_PAGE_SIZE,
+        max_retries: int = SUPABASE_BULK_MAX_RETRIES,
+        backoff_seconds: float = SUPABASE_BULK_BACKOFF_SECONDS,
+    ) -> List[Dict[str, Any]]:
+        """
+        Todas as linhas que casam com ``filters``, em páginas de
+        ``page_size`` (Range), ordenadas por ``order`` para a paginação ser
+        estável. ``page_size`` não pode passar do max-rows do servidor: uma
+        página incompleta encerra a leitura.
+        """
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            def query(start=start):
+                q = self.table(table).select(columns)
+                for col, val in (filters or {}).items():
+                    q = q.eq(col, val)
+                return q.order(order).range(start, start + page_size - 1)
+
+            page = self._execute_with_retry(query, max_retries, backoff_seconds)
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            start += page_size
+
+    def _run_chunks(
+        self,
+        operation: str,
+        table: str,
+        items: List[Any],
+        chunk_size: int,
+        max_workers: int,
+        query,
+        max_retries: int,
+        backoff_seconds: float,
+        idempotent: bool = True,
+    ):
+        """
+        Executa ``query(chunk)`` para cada chunk de ``items`` (em paralelo,
+        até ``max_workers``) e gera ``(offset, chunk, dados, exceção)`` na
+        ordem dos chunks.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size deve ser >= 1")
+        if not items:
+            return
+
+        chunks = [(start, items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)]
+
+        def run(chunk):
+            start, chunk_items = chunk
+            try:
+                return start, chunk_items, self._execute_with_retry(
+                    lambda: query(chunk_items), max_retries, backoff_seconds, idempotent
+                ), None
+            except Exception as exc:
+                logger.warning("%s %s: chunk em %d (%d linhas) falhou: %s", operation, table, start, len(chunk_items), exc)
+                return start, chunk_items, None, exc
+
+        workers = max(1, min(max_workers, len(chunks)))
+        if workers == 1:
+            yield from map(run, chunks)
+            return
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="supabase-bulk")
+        try:
+            yield from executor.map(run, chunks)  # resultados na ordem dos chunks
+        finally:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _record_failure(result: BulkWriteResult, start: int, chunk: List[Any], exc: Exception):
+        result.failed += len(chunk)
+        result.errors.append({
+            "offset": start,
+            "rows": len(chunk),
+            "error": str(exc),
+            "exception": exc,
+        })
+
+    @staticmethod
+    def _execute_with_retry(
+        build_query, max_retries: int, backoff_seconds: float, idempotent: bool = True
+    ) -> List[Dict[str, Any]]:
+        attempt = 0
+        while True:
+            try:
+                # monta a query de novo a cada tentativa (o builder não é reutilizável)
+                return build_query().execute().data
+            except Exception as exc:
+                if attempt >= max_retries or not is_transient_error(exc, idempotent):
+                    raise
+                # backoff exponencial com jitter (evita os chunks voltarem todos juntos)
+                delay = min(backoff_seconds * (2 ** attempt), SUPABASE_BULK_BACKOFF_MAX_SECONDS)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
@@ -1,26 +1,63 @@
 import re
-from typing import Optional
+import math
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
 
 NUMBER_RE = re.compile(r"[-+]?\d{1,3}(?:\.\d{3})*(?:,\d+)?|\d+(?:,\d+)?")
 
+# únicos textos que float() aceita sem começar por dígito, sinal ou separador
+_FLOAT_WORDS = frozenset(("inf", "infinity", "nan"))
+
+# orçamentos repetem muito os mesmos textos ("1,00", preços unitários...)
+BR_FLOAT_CACHE_SIZE = 65536
+
+@lru_cache(maxsize=BR_FLOAT_CACHE_SIZE)
+def _parse_br_text(s: str) -> Optional[float]:
+    s = s.strip()
+    if not s:
+        return None
+    s = s.replace("\u00a0", " ")
+    normalized = s.replace(".", "").replace(",", ".")
+    head = s[0]
+    if head.isdecimal() or head in "+-.,":
+        # tenta conversão direta após normalização
+        try:
+            return float(normalized)
+        except ValueError:
+            pass
+    elif normalized.lower() in _FLOAT_WORDS:
+        return float(normalized)
+    # células de texto ("SINAPI", "R$ 12,50"...) vão direto para a busca
+    m = NUMBER_RE.search(s)
+    if not m:
+        return None
+    token = m.group(0).replace(".", "").replace(",", ".")
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
 def br_to_float(s: Optional[str]) -> Optional[float]:
     if s is None:
         return None
     if isinstance(s, (int, float)):
         return float(s)
-    s = str(s).strip()
-    if not s:
-        return None
-    s = s.replace("\u00a0", " ")
-    # tenta conversão direta após normalização
-    try:
-        return float(s.replace(".", "").replace(",", "."))
-    except Exception:
-        m = NUMBER_RE.search(s)
-        if not m:
-            return None
-        token = m.group(0).replace(".", "").replace(",", ".")
-        try:
-            return float(token)
-        except Exception:
-            return None
\ No newline at end of file
+    return _parse_br_text(s if isinstance(s, str) else str(s))
+
+def br_to_float_array(values: Iterable[Any]) -> np.ndarray:
+    """
+    Converte uma coluna inteira para ``float64`` (NaN onde não há número).
+    Cada valor distinto é convertido uma única vez.
+    """
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype=object), use_na_sentinel=True)
+    parsed = np.array(
+        [v if (v := br_to_float(u)) is not None else math.nan for u in uniques],
+        dtype=np.float64,
+    )
+    out = np.full(len(codes), math.nan, dtype=np.float64)
+    mask = codes >= 0
+    out[mask] = parsed[codes[mask]]
+    return out
@@ -0,0 +1,50 @@
+# benchmarks/bench_csv_profile.py
+#
+# Preview de CSV: fluxo antigo (chardet + sniff + amostra + contagem linha a
+# linha em modo texto, quatro aberturas) vs profile_csv (uma abertura,
+# contagem binária via mmap).
+#
+#   python -m benchmarks.bench_csv_profile [MB]
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import chardet
+
+from app.services.csv_profile import profile_csv
+
+ROW = 'SINAPI;"Concreto usinado fck=25MPa, bombeado";m3;482,17;1250,00;"obs ""a"""\n'
+
+
+def _legacy(path: str) -> int:
+    with open(path, "rb") as f:
+        encoding = chardet.detect(f.read(5000)).get("encoding", "utf-8")
+    with open(path, "r", encoding=encoding, errors="ignore") as f:
+        delimiter = csv.Sniffer().sniff(f.read(4096)).delimiter
+    with open(path, "r", encoding=encoding, errors="ignore") as f:
+        for i, _ in enumerate(csv.reader(f, delimiter=delimiter)):
+            if i >= 20:
+                break
+    with open(path, encoding=encoding, errors="ignore") as f:
+        return sum(1 for _ in f)
+
+
+def main(size_mb: int = 200) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "precos.csv")
+        block = ROW * 10000
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(max(1, size_mb * 1024 * 1024 // len(block))):
+                f.write(block)
+
+        for label, fn in (("antigo", _legacy), ("profile_csv", lambda p: profile_csv(p)["total_rows"])):
+            start = time.perf_counter()
+            total = fn(path)
+            print(f"{label:<12} {time.perf_counter() - start:8.2f}s  {total} linhas")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,125 @@
+# benchmarks/bench_estimate_parser.py
+#
+# Compara o laço antigo (df.iterrows duas vezes) com a classificação colunar
+# de parse_dataframe_to_json_freeform numa aba sintética de 50k linhas.
+#
+#   python -m benchmarks.bench_estimate_parser [linhas]
+
+import sys
+import time
+import random
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from app.utils.number import br_to_float
+from app.services.estimate_tree import ensure_stage_path, add_child_to_index
+from app.services.estimate_parser import (
+    INDEX_AT_START_RE,
+    clean_text,
+    normalize_unit,
+    _extract_work_name_and_bdi,
+    _finalize_schema_exact,
+    parse_dataframe_to_json_freeform,
+)
+
+
+def build_frame(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    random.seed(seed)
+    rows = [
+        ["Obra: Benchmark", None, None, None, None, "BDI 25,00%", None, None, None],
+        ["Tipagem", "Código", "Banco", "Descrição", "Tipo", "Und", "Quant.", "Valor Unit", "Total"],
+    ]
+    stage = 0
+    while len(rows) < n_rows:
+        stage += 1
+        rows.append([f"{stage} ETAPA {stage}", None, None, None, None, None, None, None, "10.000,00"])
+        for c in range(20):
+            rows.append(["Composição", str(90000 + c), "SINAPI", f"Composição {c}", "SERV", "m2",
+                         "1,00", f"{random.randint(1, 999)},50", "1.234,56"])
+            for r in range(6):
+                rows.append(["Insumo", str(100 + r), "SINAPI", f"Insumo {r}", "MAT", "kg",
+                             "2,0000", "12,50", "25,00"])
+            if random.random() < 0.1:
+                rows.append([None] * 9)
+    return pd.DataFrame(rows[:n_rows], dtype=str)
+
+
+def legacy_parse_frame(df: pd.DataFrame) -> dict:
+    """Cópia do laço anterior à classificação colunar (referência)."""
+    lines_joined = [" ".join(str(c) for c in row if pd.notna(c)) for _, row in df.iterrows()]
+    work_name, bdi_global = _extract_work_name_and_bdi(lines_joined)
+    estimate_data: Dict[str, Any] = {"name": work_name, "bdi_global": bdi_global, "estimate_items": []}
+    current_composition: Optional[Dict[str, Any]] = None
+    last_stage_index_for_auto: Optional[str] = None
+    auto_seq = 0
+    for _, row in df.iterrows():
+        cells = [str(c).strip() if pd.notna(c) else "" for c in row.tolist()]
+        if not any(cells):
+            continue
+        header_line = "".join(cells).lower()
+        if ("código" in header_line and "descr" in header_line and "total" in header_line) \
+           or ("tipagem" in header_line and "código" in header_line):
+            continue
+        m_idx = INDEX_AT_START_RE.match(cells[0])
+        if m_idx:
+            idx = m_idx.group(1)
+            total_stage = br_to_float(cells[-1]) if cells[-1] else None
+            node = ensure_stage_path(estimate_data["estimate_items"], idx.split("."))
+            node["name"] = clean_text(m_idx.group(2).strip())
+            if total_stage is not None:
+                node["price_total"] = total_stage
+            current_composition = None
+            last_stage_index_for_auto = idx
+            auto_seq = 0
+            continue
+        if len(cells) >= 9:
+            item = {
+                "estimate_item_type": "composition" if "comp" in cells[0].lower() else "resource",
+                "code": clean_text(cells[1]), "bank": clean_text(cells[2]),
+                "name": clean_text(cells[3]), "type": clean_text(cells[4]),
+                "unit_symbol": normalize_unit(cells[5]), "quantity": br_to_float(cells[6]),
+                "price_unit": br_to_float(cells[7]), "price_total": br_to_float(cells[8]),
+            }
+            if item["estimate_item_type"] == "composition":
+                if last_stage_index_for_auto:
+                    auto_seq += 1
+                    comp_index = f"{last_stage_index_for_auto}.{auto_seq}"
+                else:
+                    comp_index = "1"
+                item["index"] = comp_index
+                item["composition_child"] = []
+                add_child_to_index(estimate_data["estimate_items"], comp_index, item)
+                current_composition = item
+            elif current_composition:
+                current_composition["composition_child"].append(item)
+            elif last_stage_index_for_auto:
+                add_child_to_index(estimate_data["estimate_items"], last_stage_index_for_auto, item)
+            else:
+                estimate_data["estimate_items"].append(item)
+    return _finalize_schema_exact(estimate_data)
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n_rows: int = 50_000) -> None:
+    df = build_frame(n_rows)
+    assert legacy_parse_frame(df) == parse_dataframe_to_json_freeform(df)
+
+    legacy = _best_of(lambda: legacy_parse_frame(df))
+    columnar = _best_of(lambda: parse_dataframe_to_json_freeform(df))
+    print(f"linhas={n_rows}")
+    print(f"iterrows (anterior): {legacy * 1000:8.1f} ms")
+    print(f"colunar:             {columnar * 1000:8.1f} ms")
+    print(f"speedup:             {legacy / columnar:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,145 @@
+# benchmarks/bench_estimate_persistence.py
+#
+# Persistência de um orçamento sintético (N itens) contra um PostgREST
+# local: achatamento + escrita em lotes (persist_estimate) vs um insert por
+# nó, como seria percorrendo a árvore. Por fim, uma nova versão com ~1% dos
+# nós alterados gravada de forma incremental (diff_estimate) vs do zero.
+#
+#   python -m benchmarks.bench_estimate_persistence [ITENS]
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import copy
+
+from app.services.estimate_persistence import (
+    NODE_TABLES, diff_estimate, flatten_estimate, persist_estimate, persist_estimate_diff,
+)
+from app.services.supabase_manager import SupabaseManager, close_postgrest_clients
+
+_requests = 0
+_lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        global _requests
+        json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with _lock:
+            _requests += 1
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_DELETE(self):
+        global _requests
+        with _lock:
+            _requests += 1
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def _estimate(items: int) -> dict:
+    """Estágios 1..S com subestágios; cada composição com 3 recursos."""
+    stages = []
+    per_sub = 25
+    count = 0
+    s = 0
+    while count < items:
+        s += 1
+        stage = {"estimate_item_type": "stage", "index": str(s), "name": f"Etapa {s}", "price_total": 0.0, "estimate_items": []}
+        for sub in range(1, 5):
+            node = {"estimate_item_type": "stage", "index": f"{s}.{sub}", "name": "Sub", "price_total": None, "estimate_items": []}
+            for c in range(1, per_sub + 1):
+                children = [
+                    {"estimate_item_type": "resource", "code": f"R{r}", "name": "Insumo", "quantity": 1.0, "price_unit": 2.0}
+                    for r in range(3)
+                ]
+                node["estimate_items"].append({
+                    "estimate_item_type": "composition", "index": f"{s}.{sub}.{c}", "code": f"C{c}",
+                    "name": "Composição", "quantity": 1.0, "price_total": 6.0, "composition_child": children,
+                })
+                count += 1 + len(children)
+            stage["estimate_items"].append(node)
+        stages.append(stage)
+    return {"name": "Obra", "bdi_global": 0.2, "estimate_items": stages}
+
+
+def _per_node(manager: SupabaseManager, batches) -> None:
+    manager.insert("estimates", batches.estimate)
+    for table, rows in [("estimate_stages", [r for level in batches.stages for r in level]),
+                        ("estimate_compositions", batches.compositions),
+                        ("estimate_resources", batches.resources)]:
+        for row in rows:
+            manager.insert(table, row)
+
+
+def _revise(estimate: dict, every: int = 100) -> dict:
+    """Nova versão: muda a quantidade de 1 a cada ``every`` composições."""
+    revised = copy.deepcopy(estimate)
+    n = 0
+    for stage in revised["estimate_items"]:
+        for sub in stage["estimate_items"]:
+            for comp in sub["estimate_items"]:
+                n += 1
+                if n % every == 0:
+                    comp["quantity"] = 2.0
+    return revised
+
+
+def main(items: int = 20000) -> None:
+    global _requests
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["SUPABASE_ANON_KEY"] = "anon-key"
+    manager = SupabaseManager("user-jwt")
+    estimate = _estimate(items)
+
+    try:
+        for label, fn in (
+            ("em lotes", lambda b: persist_estimate(manager, b)),
+            ("um insert por nó", lambda b: _per_node(manager, b)),
+        ):
+            _requests = 0
+            start = time.perf_counter()
+            batches = flatten_estimate(estimate, "tenant-1")
+            fn(batches)
+            rows = sum(batches.counts().values())
+            print(f"{label:<18} {time.perf_counter() - start:8.2f}s  {rows} linhas  {_requests} requests")
+
+        # versão gravada: o snapshot sairia do Supabase (select_all); aqui vem do flatten
+        stored = flatten_estimate(estimate, "tenant-1")
+        estimate_id = stored.estimate["id"]
+        snapshot = {table: rows for table, rows in stored.node_rows().items()}
+        revised = _revise(estimate)
+        for label, fn in (
+            ("nova versão diff", lambda: persist_estimate_diff(
+                manager, diff_estimate(flatten_estimate(revised, "tenant-1", estimate_id=estimate_id), snapshot))),
+            ("nova versão cheia", lambda: persist_estimate(manager, flatten_estimate(revised, "tenant-1"))),
+        ):
+            _requests = 0
+            start = time.perf_counter()
+            summary = fn()
+            written = sum(
+                sum(v for k, v in summary["tables"][table].items() if k != "failed") for table in NODE_TABLES
+            )
+            print(f"{label:<18} {time.perf_counter() - start:8.2f}s  {written} linhas  {_requests} requests")
+    finally:
+        close_postgrest_clients()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,68 @@
+# benchmarks/bench_estimate_streaming.py
+#
+# Pico de RSS e tempo do parser em modo pandas vs streaming (openpyxl
+# read-only) para planilhas sintéticas de tamanhos crescentes. Cada medição
+# roda num processo novo para que o pico de RSS seja só daquela leitura.
+#
+#   python -m benchmarks.bench_estimate_streaming
+
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import Workbook
+
+from app.services.estimate_parser import parse_excel_to_json_freeform
+
+
+def build_workbook(path: str, n_rows: int) -> None:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Analítico")
+    ws.append(["Obra: Benchmark"])
+    ws.append(["Tipagem", "Código", "Banco", "Descrição", "Tipo", "Und", "Quant.", "Valor Unit", "Total"])
+    written, stage = 2, 0
+    while written < n_rows:
+        stage += 1
+        ws.append([f"{stage} ETAPA {stage}", None, None, None, None, None, None, None, "10.000,00"])
+        written += 1
+        for c in range(20):
+            ws.append(["Composição", 90000 + c, "SINAPI", f"Composição {c}", "SERV", "m2", 1, 123.5, 1234.56])
+            for r in range(6):
+                ws.append(["Insumo", 100 + r, "SINAPI", f"Insumo {r}", "MAT", "kg", 2, 12.5, 25])
+            written += 7
+    wb.save(path)
+
+
+def _measure_in_child(path: str, streaming: bool):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    parse_excel_to_json_freeform(path, streaming=streaming)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux
+    return elapsed, (peak - baseline) / 1024
+
+
+def measure(path: str, streaming: bool):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_measure_in_child, path, streaming).result()
+
+
+def main(sizes=(10_000, 50_000, 100_000)) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in sizes:
+            path = os.path.join(tmp, f"bench_{n_rows}.xlsx")
+            build_workbook(path, n_rows)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            for streaming in (False, True):
+                elapsed, peak = measure(path, streaming)
+                mode = "streaming" if streaming else "pandas"
+                print(f"linhas={n_rows:>7} arquivo={size_mb:5.1f}MB {mode:<9} "
+                      f"tempo={elapsed:6.2f}s RSS+={peak:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main(tuple(int(a) for a in sys.argv[1:]) or (10_000, 50_000, 100_000))
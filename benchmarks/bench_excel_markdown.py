@@ -0,0 +1,65 @@
+# benchmarks/bench_excel_markdown.py
+#
+# Modo raw do /estimate_markdown: fluxo antigo (pd.read_excel por aba,
+# reabrindo o arquivo, + DataFrame.to_markdown/tabulate) vs
+# excel_to_markdown_tables serial e em paralelo (uma aba por processo).
+# Sem tabulate instalado, o antigo mede só a leitura.
+#
+#   python -m benchmarks.bench_excel_markdown [ABAS] [LINHAS_POR_ABA]
+
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app.services.excel_markdown import close_excel_markdown_pool, excel_to_markdown_tables
+
+
+def _make_workbook(path: str, sheets: int, rows: int) -> None:
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Aba {s}")
+        ws.append(["Código", "Descrição", "Und", "Quant.", "Valor Unit", "Total"])
+        # abas de tamanhos diferentes: a maior define o tempo do paralelo
+        for i in range(rows if s == 0 else rows // 2):
+            ws.append([f"C{i}", f"Serviço {s}.{i}", "m2", i * 0.5, 12.34, i * 6.17])
+    wb.save(path)
+
+
+def _legacy(path: str) -> int:
+    try:
+        import tabulate  # noqa: F401
+        render = True
+    except ImportError:
+        render = False
+    xls = pd.ExcelFile(path)
+    out = []
+    for name in xls.sheet_names:
+        df = pd.read_excel(path, sheet_name=name)
+        out.append(df.to_markdown(index=False) if render else "")
+    return sum(len(s) for s in out)
+
+
+def main(sheets: int = 4, rows: int = 20000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "abas.xlsx")
+        _make_workbook(path, sheets, rows)
+        excel_to_markdown_tables(path)  # sobe o pool antes de medir
+
+        for label, fn in (
+            ("antigo (pandas)", _legacy),
+            ("serial", lambda p: len(excel_to_markdown_tables(p, parallel=False))),
+            ("paralelo", lambda p: len(excel_to_markdown_tables(p))),
+        ):
+            start = time.perf_counter()
+            size = fn(path)
+            print(f"{label:<16} {time.perf_counter() - start:8.2f}s  {size} chars")
+    close_excel_markdown_pool()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
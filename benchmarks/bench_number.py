@@ -0,0 +1,74 @@
+# benchmarks/bench_number.py
+#
+# Latência por chamada de br_to_float (versão anterior vs atual) e conversão
+# de uma coluna inteira com br_to_float_array.
+#
+#   python -m benchmarks.bench_number
+
+import random
+import time
+from typing import Optional
+
+from app.utils.number import NUMBER_RE, br_to_float, br_to_float_array
+
+
+def legacy_br_to_float(s: Optional[str]) -> Optional[float]:
+    """Cópia da implementação anterior (referência)."""
+    if s is None:
+        return None
+    if isinstance(s, (int, float)):
+        return float(s)
+    s = str(s).strip()
+    if not s:
+        return None
+    s = s.replace(" ", " ")
+    try:
+        return float(s.replace(".", "").replace(",", "."))
+    except Exception:
+        m = NUMBER_RE.search(s)
+        if not m:
+            return None
+        token = m.group(0).replace(".", "").replace(",", ".")
+        try:
+            return float(token)
+        except Exception:
+            return None
+
+
+def build_scenarios(n: int, seed: int = 7) -> dict:
+    random.seed(seed)
+    repeated_pool = ["1,00", "2,0000", "0,5000", "10,00"] + [
+        f"{random.randint(1, 99)}.{random.randint(100, 999)},{random.randint(10, 99)}" for _ in range(2000)
+    ]
+    return {
+        # quantidades e preços unitários que se repetem ao longo do orçamento
+        "repetidos": [random.choice(repeated_pool) for _ in range(n)],
+        # totais praticamente únicos (cache não ajuda)
+        "únicos": [f"{i // 1000}.{i % 1000:03d},{random.randint(10, 99)}" for i in range(1000, 1000 + n)],
+        # células de texto em colunas numéricas (caminho da exceção)
+        "texto": [random.choice(["SINAPI", "Composição", "m2", "R$ 12,50", "Total", "-"]) for _ in range(n)],
+    }
+
+
+def per_call_ns(fn, cells) -> float:
+    start = time.perf_counter_ns()
+    for c in cells:
+        fn(c)
+    return (time.perf_counter_ns() - start) / len(cells)
+
+
+def main(n: int = 200_000) -> None:
+    print(f"chamadas por cenário={n}")
+    for name, cells in build_scenarios(n).items():
+        assert [legacy_br_to_float(c) for c in cells] == [br_to_float(c) for c in cells]
+        legacy = per_call_ns(legacy_br_to_float, cells)
+        current = per_call_ns(br_to_float, cells)
+        start = time.perf_counter()
+        br_to_float_array(cells)
+        batch_ns = (time.perf_counter() - start) * 1e9 / n
+        print(f"{name:<10} anterior={legacy:6.0f} ns  atual={current:6.0f} ns ({legacy / current:5.2f}x)  "
+              f"br_to_float_array={batch_ns:6.0f} ns/célula")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_office_pool.py
+#
+# XLSX -> PDF: um soffice avulso por conversão (perfil novo a cada vez) vs
+# pool de processos LibreOffice já abertos (OfficePool). Precisa do
+# LibreOffice no PATH e, para o pool, do binding UNO (python3-uno).
+#
+#   python -m benchmarks.bench_office_pool [N]
+
+import os
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+from app.services.office_pool import OfficePool, convert_with_soffice_cli, find_soffice, office_pool_available
+
+
+def _make_xlsx(path: str, rows: int = 500) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Código", "Descrição", "Und", "Quant.", "Valor Unit", "Total"])
+    for i in range(rows):
+        ws.append([f"C{i}", f"Serviço {i}", "m2", 1.5, 10.0, 15.0])
+    wb.save(path)
+
+
+def _run(label: str, n: int, fn) -> None:
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label:<22} média {sum(timings) / n:6.2f}s  mediana {timings[n // 2]:6.2f}s")
+
+
+def main(n: int = 5) -> None:
+    if not find_soffice():
+        print("LibreOffice ('soffice') não encontrado no PATH.")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "orcamento.xlsx")
+        _make_xlsx(src)
+        _run("soffice avulso", n, lambda i: convert_with_soffice_cli(src, os.path.join(tmp, f"cold{i}.pdf")))
+
+        if not office_pool_available():
+            print("Binding UNO indisponível: pool não medido.")
+            return
+        pool = OfficePool(size=1)
+        try:
+            start = time.perf_counter()
+            pool.convert_to_pdf(src, os.path.join(tmp, "warmup.pdf"))
+            print(f"{'pool (1a, com start)':<22} {time.perf_counter() - start:6.2f}s")
+            _run("pool", n, lambda i: pool.convert_to_pdf(src, os.path.join(tmp, f"pool{i}.pdf")))
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,55 @@
+# benchmarks/bench_pdf_markdown.py
+#
+# PDF -> Markdown: pymupdf4llm.to_markdown no documento inteiro vs
+# extract_pdf_markdown (faixas de páginas em processos + cache por página):
+# primeira execução e repetição (do cache; trocar page_chunks idem).
+#
+#   python -m benchmarks.bench_pdf_markdown [PAGINAS]
+
+import sys
+import tempfile
+import time
+
+import pymupdf
+import pymupdf4llm
+
+from app.services.parse_cache import ParseCache
+from app.services.pdf_markdown import PDF_MARKDOWN_WORKERS, close_pdf_markdown_pool, extract_pdf_markdown
+
+
+def _make_pdf(path: str, pages: int) -> None:
+    doc = pymupdf.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Capítulo {i + 1}", fontsize=18)
+        page.insert_text((72, 90), f"Texto corrido do edital, item {i}.", fontsize=10)
+        for r in range(8):
+            for c in range(4):
+                rect = pymupdf.Rect(72 + c * 120, 120 + r * 20, 192 + c * 120, 140 + r * 20)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                page.insert_text((rect.x0 + 3, rect.y1 - 6), f"R{r}C{c}", fontsize=9)
+    doc.save(path)
+
+
+def _run(label: str, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    print(f"{label:<28} {time.perf_counter() - start:8.2f}s")
+
+
+def main(pages: int = 40) -> None:
+    print(f"PDF_MARKDOWN_WORKERS={PDF_MARKDOWN_WORKERS}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/edital.pdf"
+        _make_pdf(path, pages)
+        cache = ParseCache(root=f"{tmp}/cache")
+        try:
+            _run("to_markdown (inteiro)", lambda: pymupdf4llm.to_markdown(path, table_strategy="lines_strict"))
+            _run("por página, 1a vez", lambda: extract_pdf_markdown(path, "tenant-1", "h", "lines_strict", cache=cache))
+            _run("por página, repetição", lambda: extract_pdf_markdown(path, "tenant-1", "h", "lines_strict", cache=cache))
+        finally:
+            close_pdf_markdown_pool()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
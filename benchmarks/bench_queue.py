@@ -0,0 +1,65 @@
+# benchmarks/bench_queue.py
+#
+# Vazão (tarefas/s) da fila SQLite: enqueue unitário e em lote, dequeue+ack
+# com lotes de tamanhos diferentes e vários processos consumindo a mesma fila.
+#
+#   python -m benchmarks.bench_queue [tarefas]
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core.queue import SQLiteTaskQueue
+
+PAYLOAD = {"import_id": "x" * 36, "tenant_id": "t" * 36, "file_path": "/tmp/arquivo.xlsx", "op": "estimate_analytics"}
+
+
+def _consume(path: str, batch_size: int) -> int:
+    queue = SQLiteTaskQueue(path)
+    done = 0
+    while True:
+        tasks = queue.dequeue(batch_size=batch_size)
+        if not tasks:
+            return done
+        for task in tasks:
+            queue.ack(task.id)
+        done += len(tasks)
+
+
+def _rate(n: int, start: float) -> str:
+    return f"{n / (time.perf_counter() - start):10.0f} tarefas/s"
+
+
+def main(n: int = 5000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        queue = SQLiteTaskQueue(path)
+
+        start = time.perf_counter()
+        for _ in range(n):
+            queue.enqueue(PAYLOAD)
+        print(f"enqueue unitário          {_rate(n, start)}")
+
+        for batch_size in (1, 32):
+            start = time.perf_counter()
+            consumed = _consume(path, batch_size)
+            print(f"dequeue+ack lote={batch_size:<3}      {_rate(consumed, start)}")
+            queue.enqueue_many([PAYLOAD] * n)
+
+        for workers in (2, 4):
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                consumed = sum(pool.map(_consume, [path] * workers, [32] * workers))
+            assert consumed == n, consumed
+            print(f"{workers} processos, lote=32     {_rate(consumed, start)}")
+            queue.enqueue_many([PAYLOAD] * n)
+
+        start = time.perf_counter()
+        queue.enqueue_many([PAYLOAD] * n)
+        print(f"enqueue em lote ({n})   {_rate(n, start)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,80 @@
+# benchmarks/bench_s3_uploads.py
+#
+# Uploads simultâneos de N arquivos de X MB: client boto3 padrão (pool de 10
+# conexões, TransferConfig default, threads do executor padrão) vs
+# AsyncS3FileManager (pool configurado + multipart ajustado).
+#
+# Usa AWS_S3_ENDPOINT_URL (MinIO/S3 real) quando definido; senão, o moto em
+# processo. Com o moto os 100 x 30MB ficam em memória (~3GB): reduza o
+# tamanho se necessário.
+#
+#   python -m benchmarks.bench_s3_uploads [MB] [concorrências...]
+#   python -m benchmarks.bench_s3_uploads 30 1 10 100
+
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import boto3
+
+os.environ.setdefault("AWS_S3_BUCKET_NAME", "orceu-bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+from app.services.storage_manager import S3_ENDPOINT_URL, AsyncS3FileManager, S3FileManager  # noqa: E402
+
+
+def _backend():
+    if S3_ENDPOINT_URL:
+        return contextlib.nullcontext()
+    from moto import mock_aws
+    return mock_aws()
+
+
+async def _baseline(client, bucket: str, path: str, n: int):
+    await asyncio.gather(*(
+        asyncio.to_thread(client.upload_file, path, bucket, f"bench/default/{i}") for i in range(n)
+    ))
+
+
+async def _tuned(manager: AsyncS3FileManager, path: str, n: int):
+    await asyncio.gather(*(manager.upload_file(path, f"bench/tuned/{i}") for i in range(n)))
+
+
+def _timed(coro) -> float:
+    start = time.perf_counter()
+    asyncio.run(coro)
+    return time.perf_counter() - start
+
+
+def main(size_mb: int = 30, concurrencies=(1, 10, 100)) -> None:
+    with _backend(), tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "payload.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size_mb * 1024 * 1024))
+
+        manager = S3FileManager()
+        bucket = manager.bucket
+        with contextlib.suppress(Exception):
+            manager.client.create_bucket(Bucket=bucket)
+        default_client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+        async_manager = AsyncS3FileManager(manager)
+
+        print(f"{size_mb}MB por arquivo, pool={manager.max_pool_connections}")
+        print(f"{'uploads':>8} {'padrão (s)':>12} {'ajustado (s)':>14} {'MB/s ajustado':>15}")
+        for n in concurrencies:
+            t_default = _timed(_baseline(default_client, bucket, path, n))
+            manager.delete_folder("bench/default/")
+            t_tuned = _timed(_tuned(async_manager, path, n))
+            manager.delete_folder("bench/tuned/")
+            print(f"{n:>8} {t_default:>12.2f} {t_tuned:>14.2f} {n * size_mb / t_tuned:>15.1f}")
+        async_manager.close()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 30, tuple(args[1:]) or (1, 10, 100))
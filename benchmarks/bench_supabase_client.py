@@ -0,0 +1,77 @@
+# benchmarks/bench_supabase_client.py
+#
+# Custo de montar o acesso ao Supabase por requisição: create_client +
+# postgrest.auth (antigo, sessão HTTP nova a cada vez) vs SupabaseManager
+# sobre o client compartilhado (só sobrepõe o Authorization). Mede só a
+# construção e também construção + um SELECT contra um PostgREST local
+# com keep-alive.
+#
+#   python -m benchmarks.bench_supabase_client [N]
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase import create_client
+
+from app.services.supabase_manager import SupabaseManager, close_postgrest_clients
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        payload = b'[{"id": 1}]'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def _legacy(url: str, key: str, token: str):
+    client = create_client(url, key)
+    client.postgrest.auth(token)
+    return client
+
+
+def _run(label: str, n: int, fn):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.3f}s  {elapsed / n * 1e6:9.1f} us/req")
+
+
+def main(n: int = 200) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    key, token = "anon-key", "user-jwt"
+    os.environ["SUPABASE_URL"], os.environ["SUPABASE_ANON_KEY"] = url, key
+    SupabaseManager()  # aquece o client compartilhado
+
+    try:
+        _run("setup: create_client + auth", n, lambda: _legacy(url, key, token))
+        _run("setup: SupabaseManager(jwt)", n, lambda: SupabaseManager(token))
+
+        def legacy_request():
+            client = _legacy(url, key, token)
+            client.table("items").select("*").execute()
+            client.postgrest.session.close()
+
+        _run("setup + GET: create_client + auth", n, legacy_request)
+        _run("setup + GET: SupabaseManager(jwt)", n, lambda: SupabaseManager(token).get("items"))
+    finally:
+        close_postgrest_clients()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,116 @@
+-- Orçamentos persistidos por app/services/estimate_persistence.py
+-- (POST /v1/imports/{import_id}/persist).
+--
+-- Os ids são gerados no cliente (uuid5 da node_key, ver _node_id) e os nós
+-- apontam para o orçamento com ON DELETE CASCADE: apagar a linha de
+-- "estimates" remove a árvore inteira, que é como uma gravação inicial que
+-- falhou no meio é desfeita.
+--
+-- tenant_id é o "sub" do JWT (app/core/dependencies.py:get_tenant); as
+-- escritas usam o JWT do usuário, então o RLS abaixo é o que isola os tenants.
+
+create table if not exists public.estimates (
+    id          uuid primary key,
+    tenant_id   text not null,
+    import_id   text,
+    name        text,
+    bdi_global  numeric,
+    created_at  timestamptz not null default now()
+);
+
+create index if not exists estimates_tenant_idx on public.estimates (tenant_id);
+
+create table if not exists public.estimate_stages (
+    id               uuid primary key,
+    tenant_id        text not null,
+    estimate_id      uuid not null references public.estimates (id) on delete cascade,
+    parent_stage_id  uuid references public.estimate_stages (id) on delete cascade,
+    node_key         text not null,
+    fingerprint      text not null,
+    position         integer not null,
+    "index"          text,
+    name             text,
+    price_total      numeric,
+    unique (estimate_id, node_key)
+);
+
+create table if not exists public.estimate_compositions (
+    id           uuid primary key,
+    tenant_id    text not null,
+    estimate_id  uuid not null references public.estimates (id) on delete cascade,
+    stage_id     uuid references public.estimate_stages (id) on delete cascade,
+    node_key     text not null,
+    fingerprint  text not null,
+    position     integer not null,
+    "index"      text,
+    code         text,
+    bank         text,
+    name         text,
+    type         text,
+    unit_symbol  text,
+    quantity     numeric,
+    price_unit   numeric,
+    price_total  numeric,
+    unique (estimate_id, node_key)
+);
+
+create table if not exists public.estimate_resources (
+    id              uuid primary key,
+    tenant_id       text not null,
+    estimate_id     uuid not null references public.estimates (id) on delete cascade,
+    stage_id        uuid references public.estimate_stages (id) on delete cascade,
+    composition_id  uuid references public.estimate_compositions (id) on delete cascade,
+    node_key        text not null,
+    fingerprint     text not null,
+    position        integer not null,
+    "index"         text,
+    code            text,
+    bank            text,
+    name            text,
+    type            text,
+    unit_symbol     text,
+    quantity        numeric,
+    price_unit      numeric,
+    price_total     numeric,
+    unique (estimate_id, node_key)
+);
+
+-- load_estimate_snapshot: select_all filtra por estimate_id e pagina por id;
+-- o unique (estimate_id, node_key) não serve para essa ordenação
+create index if not exists estimate_stages_estimate_idx on public.estimate_stages (estimate_id, id);
+create index if not exists estimate_compositions_estimate_idx on public.estimate_compositions (estimate_id, id);
+create index if not exists estimate_resources_estimate_idx on public.estimate_resources (estimate_id, id);
+
+-- FKs dos filhos (o cascade e os deletes do diff procuram por elas)
+create index if not exists estimate_stages_parent_idx on public.estimate_stages (parent_stage_id);
+create index if not exists estimate_compositions_stage_idx on public.estimate_compositions (stage_id);
+create index if not exists estimate_resources_stage_idx on public.estimate_resources (stage_id);
+create index if not exists estimate_resources_composition_idx on public.estimate_resources (composition_id);
+
+-- -------------------------------------------------------------------
+-- RLS: cada tenant só vê e grava as próprias linhas
+-- -------------------------------------------------------------------
+alter table public.estimates enable row level security;
+alter table public.estimate_stages enable row level security;
+alter table public.estimate_compositions enable row level security;
+alter table public.estimate_resources enable row level security;
+
+create policy estimates_tenant on public.estimates
+    for all to authenticated
+    using (tenant_id = (auth.jwt() ->> 'sub'))
+    with check (tenant_id = (auth.jwt() ->> 'sub'));
+
+create policy estimate_stages_tenant on public.estimate_stages
+    for all to authenticated
+    using (tenant_id = (auth.jwt() ->> 'sub'))
+    with check (tenant_id = (auth.jwt() ->> 'sub'));
+
+create policy estimate_compositions_tenant on public.estimate_compositions
+    for all to authenticated
+    using (tenant_id = (auth.jwt() ->> 'sub'))
+    with check (tenant_id = (auth.jwt() ->> 'sub'));
+
+create policy estimate_resources_tenant on public.estimate_resources
+    for all to authenticated
+    using (tenant_id = (auth.jwt() ->> 'sub'))
+    with check (tenant_id = (auth.jwt() ->> 'sub'));
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+
+# o módulo cria o S3FileManager no import (só lê as variáveis, não conecta)
+for var, value in (
+    ("AWS_S3_BUCKET_NAME", "bucket"),
+    ("AWS_ACCESS_KEY_ID", "x"),
+    ("AWS_SECRET_ACCESS_KEY", "y"),
+    ("AWS_DEFAULT_REGION", "us-east-1"),
+):
+    os.environ.setdefault(var, value)
+
+from app.api.v1.endpoints import documents  # noqa: E402
+from app.core.dependencies import get_tenant  # noqa: E402
+
+PAYLOAD = {"sheet_name": "Dados", "column_mapping": {"0": "code", "1": "name"}, "required_field": "code"}
+
+
+@pytest.fixture
+def workbook_path(tmp_path, monkeypatch):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Dados"
+    for n in range(1, 11):
+        # linhas 4 e 8 sem código: descartadas pelo required_field
+        ws.append([None if n in (4, 8) else f"C{n}", f" item {n} "])
+    path = tmp_path / "dados.xlsx"
+    wb.save(path)
+
+    monkeypatch.setattr(documents, "_find_document", lambda *a: {"object_key": "documents/t/doc.xlsx"})
+    monkeypatch.setattr(documents, "_fetch_document", lambda key: str(path))
+    return str(path)
+
+
+@pytest.fixture
+def client(workbook_path):
+    app = FastAPI()
+    app.include_router(documents.router)
+    app.dependency_overrides[get_tenant] = lambda: "tenant-1"
+    return TestClient(app)
+
+
+def _infer(client, **params):
+    return client.post("/documents/imports/doc-1/schema:infer", json=PAYLOAD, params=params)
+
+
+def _codes(rows):
+    return [row["code"] for row in rows]
+
+
+ALL_CODES = ["C1", "C2", "C3", "C5", "C6", "C7", "C9", "C10"]
+
+
+def test_without_limit_returns_every_mapped_row(client):
+    body = _infer(client).json()
+
+    assert _codes(body["rows"]) == ALL_CODES
+    assert body["rows"][0]["name"] == "item 1"
+    assert body["next_cursor"] is None
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 8])
+def test_cursor_round_trip_covers_all_rows_once(client, limit):
+    codes, params, pages = [], {"limit": limit}, 0
+    while True:
+        body = _infer(client, **params).json()
+        codes += _codes(body["rows"])
+        pages += 1
+        if body["next_cursor"] is None:
+            break
+        params = {"limit": limit, "cursor": body["next_cursor"]}
+
+    assert codes == ALL_CODES
+    # página final cheia (8 linhas / limit 4 ou 8) não gera cursor para uma página vazia
+    assert pages == -(-len(ALL_CODES) // limit)
+
+
+def test_offset_is_relative_to_cursor_and_past_the_end_is_empty(client):
+    first = _infer(client, limit=2).json()
+    assert _codes(first["rows"]) == ["C1", "C2"]
+
+    skipped = _infer(client, limit=2, offset=1, cursor=first["next_cursor"]).json()
+    assert _codes(skipped["rows"]) == ["C5", "C6"]
+
+    beyond = _infer(client, limit=2, offset=50).json()
+    assert beyond["rows"] == [] and beyond["next_cursor"] is None
+
+
+def test_invalid_paging_parameters(client):
+    assert _infer(client, limit=0).status_code == 400
+    assert _infer(client, offset=-1).status_code == 400
+    assert _infer(client, cursor="não-é-cursor").status_code == 400
+
+
+def test_stream_returns_ndjson_page(client):
+    response = _infer(client, stream="true", offset=1, limit=3)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.content.decode("utf-8").splitlines()
+    assert [json.loads(line)["code"] for line in lines] == ["C2", "C3", "C5"]
+
+    full = _infer(client, stream="true")
+    assert [json.loads(line) for line in full.content.decode("utf-8").splitlines()] == _infer(client).json()["rows"]
+
+
+def test_stream_closes_workbook_even_if_body_is_never_read(workbook_path, monkeypatch):
+    closed = []
+    real_load = documents.load_workbook
+
+    def tracking_load(*args, **kwargs):
+        wb = real_load(*args, **kwargs)
+        real_close = wb.close
+        wb.close = lambda: closed.append(1) or real_close()
+        return wb
+
+    monkeypatch.setattr(documents, "load_workbook", tracking_load)
+    payload = documents.SchemaInferRequest(**PAYLOAD)
+    response = documents.infer_schema("doc-1", payload, tenant_id="tenant-1", stream=True)
+
+    # cliente desconectou antes do corpo: o gerador nunca roda, o background sim
+    asyncio.run(response.background())
+    assert closed
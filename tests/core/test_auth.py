@@ -0,0 +1,187 @@
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+from jose import jwk, jwt
+from jose.utils import base64url_encode
+
+from app.core import auth
+from app.core.auth import JWKSCache, VerifiedTokenCache, decode_jwt
+
+ec = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.ec")
+from cryptography.hazmat.primitives import serialization
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    clock = Clock(time.time())
+    cache = VerifiedTokenCache(max_size=3, clock=clock)
+    monkeypatch.setattr(auth, "_token_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    calls = []
+    original = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    return calls
+
+
+def _hs_token(**claims):
+    return jwt.encode(claims, auth.JWT_SECRET, algorithm=auth.JWT_ALGORITHM)
+
+
+def test_verified_claims_are_cached_until_exp(cache, decode_calls):
+    token = _hs_token(sub="tenant-1", exp=int(cache.clock.now) + 60)
+
+    assert decode_jwt(f"Bearer {token}")["sub"] == "tenant-1"
+    assert decode_jwt(token)["sub"] == "tenant-1"
+    assert len(decode_calls) == 1
+    assert cache.stats()["hits"] == 1
+
+    cache.clock.now += 61  # passou do exp no relógio do cache: verifica de novo
+    decode_jwt(token)
+    assert len(decode_calls) == 2
+
+
+def test_invalid_tokens_are_negatively_cached(cache, decode_calls):
+    token = jwt.encode({"sub": "x"}, "outro-segredo", algorithm="HS256")
+
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            decode_jwt(token)
+        assert exc.value.status_code == 401
+    assert len(decode_calls) == 1
+    assert cache.stats()["negative_hits"] == 2
+
+    cache.clock.now += cache.negative_ttl + 1
+    with pytest.raises(HTTPException):
+        decode_jwt(token)
+    assert len(decode_calls) == 2
+
+
+def test_cache_is_bounded(cache):
+    tokens = [_hs_token(sub=str(i)) for i in range(5)]
+    for token in tokens:
+        decode_jwt(token)
+    stats = cache.stats()
+    assert stats["size"] == 3 and stats["misses"] == 5 and stats["hit_rate"] == 0.0
+
+
+def _write_jwks(path, *keys):
+    path.write_text(json.dumps({"keys": list(keys)}))
+
+
+def _ec_key(kid):
+    private = ec.generate_private_key(ec.SECP256R1())
+    pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public = jwk.construct(pem, "ES256").public_key().to_dict()
+    public.update({"kid": kid, "alg": "ES256", "use": "sig"})
+    return pem, public
+
+
+def test_asymmetric_tokens_use_local_jwks_with_rotation(cache, monkeypatch, tmp_path):
+    jwks_path = tmp_path / "jwks.json"
+    pem_1, public_1 = _ec_key("k1")
+    pem_2, public_2 = _ec_key("k2")
+    _write_jwks(jwks_path, public_1)
+    clock = Clock()
+    jwks = JWKSCache(str(jwks_path), refresh_seconds=600, min_refresh_seconds=30, clock=clock)
+    monkeypatch.setattr(auth, "_jwks", jwks)
+
+    token_1 = jwt.encode({"sub": "tenant-1"}, pem_1, algorithm="ES256", headers={"kid": "k1"})
+    assert decode_jwt(token_1)["sub"] == "tenant-1"
+
+    # chave nova publicada: kid desconhecido força recarga (respeitando o intervalo mínimo)
+    _write_jwks(jwks_path, public_1, public_2)
+    token_2 = jwt.encode({"sub": "tenant-2"}, pem_2, algorithm="ES256", headers={"kid": "k2"})
+    with pytest.raises(HTTPException):
+        decode_jwt(token_2)
+    cache.clear()
+    clock.now += 31
+    assert decode_jwt(token_2)["sub"] == "tenant-2"
+
+    # token assinado com a chave 1 mas dizendo ser da 2 não passa
+    forged = jwt.encode({"sub": "x"}, pem_1, algorithm="ES256", headers={"kid": "k2"})
+    with pytest.raises(HTTPException):
+        decode_jwt(forged)
+
+
+def test_jwks_keeps_previous_keys_when_refresh_fails(tmp_path):
+    jwks_path = tmp_path / "jwks.json"
+    _, public = _ec_key("k1")
+    _write_jwks(jwks_path, public)
+    clock = Clock()
+    jwks = JWKSCache(str(jwks_path), refresh_seconds=10, clock=clock)
+    assert jwks.get_key("k1") is not None
+
+    jwks_path.write_text("{quebrado")
+    clock.now += 11
+    assert jwks.get_key("k1") is not None
+
+
+def test_unreachable_jwks_is_503_not_500(cache, monkeypatch, tmp_path):
+    jwks_path = tmp_path / "jwks.json"  # ainda não existe: primeira carga falha (OSError)
+    pem, public = _ec_key("k1")
+    clock = Clock()
+    jwks = JWKSCache(str(jwks_path), min_refresh_seconds=30, clock=clock)
+    monkeypatch.setattr(auth, "_jwks", jwks)
+    token = jwt.encode({"sub": "tenant-1"}, pem, algorithm="ES256", headers={"kid": "k1"})
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            decode_jwt(token)
+        assert exc.value.status_code == 503
+    assert cache.stats()["negative_hits"] == 0  # não fica marcado como token inválido
+
+    # volta a buscar só depois do intervalo mínimo
+    _write_jwks(jwks_path, public)
+    with pytest.raises(HTTPException):
+        decode_jwt(token)
+    clock.now += 31
+    assert decode_jwt(token)["sub"] == "tenant-1"
+    assert auth.get_auth_cache_stats()["jwks_keys"] == 1
+
+
+def test_key_without_alg_only_accepts_algorithms_of_its_type(cache, monkeypatch, tmp_path):
+    jwks_path = tmp_path / "jwks.json"
+    pem, public = _ec_key("k1")
+    del public["alg"]  # JWK P-256 sem "alg": só ES256
+    _write_jwks(jwks_path, public)
+    monkeypatch.setattr(auth, "_jwks", JWKSCache(str(jwks_path)))
+
+    allowed = []
+    original = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: allowed.append(kw["algorithms"]) or original(*a, **kw))
+
+    token = jwt.encode({"sub": "tenant-1"}, pem, algorithm="ES256", headers={"kid": "k1"})
+    assert decode_jwt(token)["sub"] == "tenant-1"
+    # o header do token não entra na lista de algoritmos aceitos
+    _, payload, signature = token.split(".")
+    es384 = base64url_encode(json.dumps({"alg": "ES384", "kid": "k1", "typ": "JWT"}).encode()).decode()
+    with pytest.raises(HTTPException) as exc:
+        decode_jwt(".".join((es384, payload, signature)))
+    assert exc.value.status_code == 401
+    assert allowed == [["ES256"], ["ES256"]]
+
+    assert auth._key_algorithms({"kty": "RSA"}) == ["RS256", "RS384", "RS512", "PS256", "PS384", "PS512"]
+    for key in ({"kty": "oct"}, {"kty": "EC", "crv": "secp256k1"}, {"kty": "RSA", "alg": "HS256"}):
+        with pytest.raises(auth.JWTError):
+            auth._key_algorithms(key)
@@ -0,0 +1,31 @@
+from app.core.document_index import DocumentIndex
+
+
+def test_put_get_persists_across_instances(tmp_path):
+    path = str(tmp_path / "documents.db")
+    index = DocumentIndex(path)
+    sheets = [{"name": "Analítico", "max_row": 120, "max_column": 12}]
+    index.put("t1", "doc-1", "documents/t1/doc-1.xlsx", ".xlsx", size=10, sha256="abc", sheets=sheets)
+
+    assert index.get("t1", "doc-1")["object_key"] == "documents/t1/doc-1.xlsx"
+    assert index.get("t2", "doc-1") is None
+
+    # outro worker (cache vazio) lê do SQLite
+    other = DocumentIndex(path)
+    record = other.get("t1", "doc-1")
+    assert record["ext"] == ".xlsx"
+    assert record["sheets"] == sheets
+    assert record["size"] == 10
+
+
+def test_lru_is_bounded_and_delete_invalidates(tmp_path):
+    index = DocumentIndex(str(tmp_path / "documents.db"), cache_size=2)
+    for i in range(3):
+        index.put("t1", f"doc-{i}", f"documents/t1/doc-{i}.csv", ".csv")
+
+    assert list(index._cache) == [("t1", "doc-1"), ("t1", "doc-2")]
+    assert index.get("t1", "doc-0") is not None  # volta do SQLite para o LRU
+    assert ("t1", "doc-1") not in index._cache
+
+    index.delete("t1", "doc-0")
+    assert index.get("t1", "doc-0") is None
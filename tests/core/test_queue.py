@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from app.core.queue import LeaseLostError, SQLiteTaskQueue
+
+
+def test_lease_ack_and_retry(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "q.db"), visibility_timeout=0.2, max_attempts=2, backoff_seconds=0.1)
+    queue.enqueue_many([{"n": 1}, {"n": 2}, {"n": 3}])
+
+    batch = queue.dequeue(batch_size=2)
+    assert [t.payload["n"] for t in batch] == [1, 2]
+    # reservadas ficam invisíveis até o lease vencer
+    assert [t.payload["n"] for t in queue.dequeue(batch_size=5)] == [3]
+
+    queue.ack(batch[0].id, batch[0].lease_token)
+    assert queue.retry(batch[1].id, batch[1].lease_token, "boom") is True
+    assert queue.dequeue() == []          # ainda no backoff
+    time.sleep(0.25)
+
+    # a 2 volta após o backoff; a 3 volta porque o lease venceu sem ack
+    redelivered = queue.dequeue(batch_size=5)
+    assert sorted(t.payload["n"] for t in redelivered) == [2, 3]
+    assert all(t.attempts == 2 for t in redelivered)
+
+    second = next(t for t in redelivered if t.payload["n"] == 2)
+    assert queue.retry(second.id, second.lease_token, "boom") is False
+    assert queue.stats()["dead"] == 1
+
+
+def test_expired_lease_without_attempts_reports_dead_tasks(tmp_path):
+    dead = []
+    queue = SQLiteTaskQueue(
+        str(tmp_path / "q.db"), visibility_timeout=0.05, max_attempts=1,
+        on_dead=lambda tasks, error: dead.extend((t.payload["n"], error) for t in tasks),
+    )
+    queue.enqueue({"n": 1})
+    assert len(queue.dequeue()) == 1
+    time.sleep(0.1)
+
+    assert queue.dequeue() == []
+    assert dead == [(1, "visibility timeout")]
+    assert queue.stats() == {"dead": 1}
+    queue.dequeue()
+    assert len(dead) == 1  # cada tarefa é reportada uma vez só
+
+
+def test_stale_lease_cannot_touch_a_re_leased_task(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "q.db"), visibility_timeout=0.05, max_attempts=3)
+    queue.enqueue({"n": 1})
+    stale, = queue.dequeue()
+    time.sleep(0.1)
+    owner, = queue.dequeue()  # lease venceu: outro worker reservou
+
+    assert owner.id == stale.id and owner.lease_token != stale.lease_token
+    for call in (
+        lambda: queue.ack(stale.id, stale.lease_token),
+        lambda: queue.retry(stale.id, stale.lease_token, "boom"),
+        lambda: queue.dead_letter(stale.id, stale.lease_token, "boom"),
+    ):
+        with pytest.raises(LeaseLostError):
+            call()
+    assert queue.extend_lease([(stale.id, stale.lease_token), (owner.id, owner.lease_token)]) == [stale.id]
+
+    queue.ack(owner.id, owner.lease_token)
+    assert queue.stats() == {}
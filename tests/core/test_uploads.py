@@ -0,0 +1,44 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core.uploads import HashingReader, spool_upload
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="orcamento.xlsx")
+
+
+def test_spool_upload_hashes_and_copies_in_chunks(tmp_path):
+    data = b"0123456789" * 1000
+    dest = tmp_path / "sub" / "orcamento.xlsx"
+
+    result = spool_upload(_upload(data), str(dest), max_bytes=len(data), chunk_size=64)
+
+    assert dest.read_bytes() == data
+    assert result.size == len(data)
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_spool_upload_aborts_with_413_and_removes_partial_file(tmp_path):
+    dest = tmp_path / "grande.xlsx"
+
+    with pytest.raises(HTTPException) as exc:
+        spool_upload(_upload(b"x" * 1000), str(dest), max_bytes=100, chunk_size=64)
+
+    assert exc.value.status_code == 413
+    assert not dest.exists()
+
+
+def test_hashing_reader_stops_reading_past_limit():
+    source = io.BytesIO(b"x" * 1000)
+    reader = HashingReader(source, max_bytes=100)
+
+    with pytest.raises(HTTPException):
+        while reader.read(64):
+            pass
+
+    # nunca lê o corpo inteiro: para no primeiro bloco que cruza o limite
+    assert source.tell() == 128
@@ -0,0 +1,213 @@
+import time
+from uuid import uuid4
+
+import pytest
+from openpyxl import Workbook
+
+from app.core import jobs
+from app.core.jobs import JOB_DONE, JOB_FAILED, JobStore, create_job, get_job
+from app.core.queue import SQLiteTaskQueue
+from app.core import worker as worker_module
+from app.core.worker import ImportWorker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "imports.db")
+    monkeypatch.setattr(jobs, "_store", JobStore(db_path))
+    return SQLiteTaskQueue(db_path, max_attempts=1)
+
+
+def _slow_handler(task):
+    time.sleep(0.6)
+    return {"ok": True}
+
+
+def _wait_for(import_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = get_job(import_id)
+        if job["status"] in (JOB_DONE, JOB_FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job não terminou")
+
+
+def _enqueue(queue, file_path, filename):
+    import_id = str(uuid4())
+    create_job(import_id, "tenant-1", op="estimate_analytics", filename=filename)
+    queue.enqueue({
+        "import_id": import_id,
+        "tenant_id": "tenant-1",
+        "file_path": file_path,
+        "filename": filename,
+        "op": "estimate_analytics",
+    })
+    return import_id
+
+
+def test_worker_parses_estimate_in_process_pool(tmp_path, queue):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["1 FUNDAÇÃO", None, None, None, None, None, None, None, "100,00"])
+    ws.append(["Composição", "1", "SINAPI", "Reaterro", "SERV", "m3", "1,00", "100,00", "100,00"])
+    path = tmp_path / "orcamento.xlsx"
+    wb.save(path)
+    broken = tmp_path / "quebrado.xlsx"
+    broken.write_bytes(b"not a workbook")
+
+    worker = ImportWorker(max_workers=1, queue=queue, poll_seconds=0.05)
+    worker.start()
+    try:
+        ok_id = _enqueue(queue, str(path), "orcamento.xlsx")
+        bad_id = _enqueue(queue, str(broken), "quebrado.xlsx")
+        ok_job = _wait_for(ok_id)
+        bad_job = _wait_for(bad_id)
+    finally:
+        worker.stop()
+
+    assert ok_job["status"] == JOB_DONE
+    assert ok_job["filename"] == "orcamento.xlsx"
+    assert ok_job["result"]["estimate_items"][0]["index"] == "1"
+    assert bad_job["status"] == JOB_FAILED
+    assert bad_job["error"]
+    # sucesso sai da fila; a falha definitiva fica como 'dead'
+    assert queue.stats() == {"dead": 1}
+
+
+def test_reserve_job_accepts_each_id_once(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = JobStore(str(tmp_path / "jobs.db"))
+    import_id = str(uuid4())
+
+    # concorrentes com o mesmo id: só um reserva (sem checar-e-gravar)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        reserved = list(pool.map(lambda t: store.reserve(import_id, t, op="estimate_markdown:raw"), range(8)))
+    winners = [job for job in reserved if job is not None]
+
+    assert len(winners) == 1
+    assert store.get(import_id)["tenant_id"] == winners[0]["tenant_id"]
+    assert store.reserve(import_id, "tenant-x") is None
+
+
+def test_job_store_prunes_finished_jobs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), history_limit=2, retention_hours=1)
+    for n in range(4):
+        store.create(f"done-{n}", "tenant-1")
+        store.update(f"done-{n}", status=JOB_DONE, result={"n": n})
+    store.create("running", "tenant-1")
+    store._conn().execute("UPDATE jobs SET updated_at = '2000-01-01T00:00:00+00:00' WHERE import_id = 'running'")
+
+    store.create("new", "tenant-1")
+
+    # só os 2 concluídos mais recentes ficam; job ainda na fila nunca é podado
+    assert [n for n in range(4) if store.get(f"done-{n}")] == [2, 3]
+    assert store.get("running") is not None and store.get("new") is not None
+
+    store._conn().execute("UPDATE jobs SET updated_at = '2000-01-01T00:00:00+00:00' WHERE import_id = 'done-3'")
+    assert store.prune() == 1 and store.get("done-3") is None
+
+
+def test_dead_lettered_lease_marks_job_failed(tmp_path, monkeypatch):
+    from app.core.queue import _fail_dead_import_jobs
+
+    db_path = str(tmp_path / "imports.db")
+    monkeypatch.setattr(jobs, "_store", JobStore(db_path))
+    queue = SQLiteTaskQueue(db_path, visibility_timeout=0.05, max_attempts=1, on_dead=_fail_dead_import_jobs)
+    import_id = _enqueue(queue, "orcamento.xlsx", "orcamento.xlsx")
+    queue.dequeue()  # worker morreu sem ack
+    time.sleep(0.1)
+
+    queue.dequeue()
+
+    job = get_job(import_id)
+    assert job["status"] == JOB_FAILED and job["error"] == "visibility timeout"
+
+
+def test_worker_fails_fast_on_deterministic_errors(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "imports.db")
+    monkeypatch.setattr(jobs, "_store", JobStore(db_path))
+    queue = SQLiteTaskQueue(db_path, max_attempts=3)
+    broken = tmp_path / "quebrado.xlsx"
+    broken.write_bytes(b"not a workbook")
+
+    worker = ImportWorker(max_workers=1, queue=queue, poll_seconds=0.05)
+    worker.start()
+    try:
+        job = _wait_for(_enqueue(queue, str(broken), "quebrado.xlsx"), timeout=10)
+    finally:
+        worker.stop()
+
+    # sem backoff/novas tentativas: arquivo corrompido falha na primeira
+    assert job["status"] == JOB_FAILED and job["attempts"] == 1
+    assert queue.stats() == {"dead": 1}
+
+
+def test_worker_heartbeat_keeps_long_tasks_leased(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "imports.db")
+    monkeypatch.setattr(jobs, "_store", JobStore(db_path))
+    monkeypatch.setitem(worker_module.TASK_HANDLERS, "estimate_analytics", _slow_handler)
+    queue = SQLiteTaskQueue(db_path, visibility_timeout=0.2, max_attempts=3)
+
+    # 2 slots: sem heartbeat, o slot livre reservaria de novo a tarefa com lease vencido
+    worker = ImportWorker(max_workers=2, queue=queue, poll_seconds=0.02, heartbeat_seconds=0.05)
+    worker.start()
+    try:
+        job = _wait_for(_enqueue(queue, "orcamento.xlsx", "orcamento.xlsx"), timeout=10)
+    finally:
+        worker.stop()
+
+    assert job["status"] == JOB_DONE and job["result"] == {"ok": True}
+    assert job["attempts"] == 1
+    assert queue.stats() == {}
+
+
+def test_worker_survives_sqlite_errors_while_dispatching(tmp_path, monkeypatch):
+    import sqlite3
+
+    db_path = str(tmp_path / "imports.db")
+    monkeypatch.setattr(jobs, "_store", JobStore(db_path))
+    monkeypatch.setitem(worker_module.TASK_HANDLERS, "estimate_analytics", _slow_handler)
+    real_update = worker_module.update_job
+    failures = []
+
+    def flaky_update(import_id, **fields):
+        if fields.get("status") == jobs.JOB_PROCESSING and not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return real_update(import_id, **fields)
+
+    monkeypatch.setattr(worker_module, "update_job", flaky_update)
+    queue = SQLiteTaskQueue(db_path, max_attempts=3, backoff_seconds=0.05)
+
+    worker = ImportWorker(max_workers=1, queue=queue, poll_seconds=0.02)
+    worker.start()
+    try:
+        job = _wait_for(_enqueue(queue, "orcamento.xlsx", "orcamento.xlsx"), timeout=10)
+        alive = worker._thread.is_alive()
+    finally:
+        worker.stop()
+
+    # a thread não morreu, a vaga voltou e a tarefa foi reentregue
+    assert failures and alive
+    assert job["status"] == JOB_DONE and job["attempts"] == 2
+    assert queue.stats() == {}
+
+
+def test_task_without_handler_is_dead_lettered(queue):
+    import_id = str(uuid4())
+    create_job(import_id, "tenant-1", status=JOB_DONE, op="estimate_markdown:raw")
+    queue.enqueue({"import_id": import_id, "tenant_id": "tenant-1", "op": "estimate_markdown:raw"})
+
+    worker = ImportWorker(max_workers=1, queue=queue, poll_seconds=0.05)
+    worker.start()
+    try:
+        deadline = time.time() + 10
+        while queue.stats() != {"dead": 1} and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+
+    assert queue.stats() == {"dead": 1}
+    assert get_job(import_id)["status"] == JOB_DONE  # o job de outra rota não é mexido
@@ -0,0 +1,44 @@
+import io
+
+from app.services.csv_profile import _count_records_binary, count_records, profile_csv
+
+
+def test_profile_csv_semicolon_latin1_with_multiline_records(tmp_path):
+    text = 'código;descrição;preço\n1;"Concreto\nusinado";10,5\n2;"Aço ""CA-50""";7\n3;Forma;2\n'
+    path = tmp_path / "insumos.csv"
+    path.write_bytes(text.encode("latin-1"))
+
+    profile = profile_csv(str(path), sample_rows=2)
+
+    assert profile["delimiter"] == ";"
+    assert profile["encoding"].lower() in ("iso-8859-1", "windows-1252")
+    assert profile["sample_rows"] == [["código", "descrição", "preço"], ["1", "Concreto\nusinado", "10,5"]]
+    # 4 registros, mesmo com 5 quebras de linha
+    assert profile["total_rows"] == 4
+
+
+def test_profile_csv_empty_and_unsniffable(tmp_path):
+    empty = tmp_path / "vazio.csv"
+    empty.write_bytes(b"")
+    assert profile_csv(str(empty)) == {"encoding": "utf-8", "delimiter": ",", "sample_rows": [], "total_rows": 0}
+
+    single = tmp_path / "coluna.csv"
+    single.write_bytes(b"valor\n1\n2")
+    profile = profile_csv(str(single))
+    assert profile["total_rows"] == 3
+    assert profile["sample_rows"] == [["valor"], ["1"], ["2"]]
+
+
+def test_count_records_across_chunks_and_cr_only():
+    data = b'a,"b\nc"\n' * 50 + b"z"
+    assert _count_records_binary(data, b'"', b",", chunk_size=5) == 51
+    assert _count_records_binary(b"a\rb\rc", b'"', b",") == 3
+
+
+def test_count_records_treats_stray_quote_as_literal(tmp_path):
+    path = tmp_path / "tubos.csv"
+    path.write_bytes(b'a;b\n1;TUBO 1/2";x\n2;"y\n";z\n3;w;v\n')
+
+    assert _count_records_binary(path.read_bytes(), b'"', b";") is None
+    with open(path, "rb") as f:
+        assert count_records(f, "utf-8", ";") == 4
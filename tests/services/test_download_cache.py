@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.download_cache import S3DownloadCache
+
+
+class FakeStorage:
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+
+    def put(self, key, body, etag):
+        self.objects[key] = (body, etag)
+
+    def head_object(self, key):
+        if key not in self.objects:
+            return None
+        return {"ETag": f'"{self.objects[key][1]}"', "ContentLength": len(self.objects[key][0])}
+
+    def download_file(self, key, dest):
+        self.downloads += 1
+        time.sleep(0.05)
+        with open(dest, "wb") as f:
+            f.write(self.objects[key][0])
+
+
+def test_read_through_and_etag_invalidation(tmp_path):
+    storage = FakeStorage()
+    storage.put("documents/t1/doc.csv", b"a;b\n", "v1")
+    cache = S3DownloadCache(storage, str(tmp_path / "cache"), max_bytes=1024 * 1024)
+
+    first = cache.fetch("documents/t1/doc.csv")
+    second = cache.fetch("documents/t1/doc.csv")
+    assert first == second
+    assert open(first, "rb").read() == b"a;b\n"
+    assert storage.downloads == 1
+
+    storage.put("documents/t1/doc.csv", b"a;b\n1;2\n", "v2")
+    assert open(cache.fetch("documents/t1/doc.csv"), "rb").read() == b"a;b\n1;2\n"
+    assert storage.downloads == 2
+
+    with pytest.raises(FileNotFoundError):
+        cache.fetch("documents/t1/nao-existe.csv")
+
+
+def test_concurrent_fetch_downloads_once(tmp_path):
+    storage = FakeStorage()
+    storage.put("documents/t1/doc.xlsx", b"x" * 1000, "v1")
+    cache = S3DownloadCache(storage, str(tmp_path / "cache"), max_bytes=1024 * 1024)
+
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(cache.fetch("documents/t1/doc.xlsx"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(paths)) == 1
+    assert storage.downloads == 1
+
+
+def test_lru_eviction_respects_budget_and_seed(tmp_path):
+    storage = FakeStorage()
+    cache = S3DownloadCache(storage, str(tmp_path / "cache"), max_bytes=2500, min_age_seconds=0)
+    for name in ("a", "b"):
+        storage.put(f"documents/t1/{name}.csv", b"x" * 1000, "v1")
+        cache.fetch(f"documents/t1/{name}.csv")
+
+    # "a" usado por último => "b" é o menos recente
+    past = time.time() - 60
+    os.utime(cache._path("documents/t1/b.csv", "v1"), (past, past))
+    cache.fetch("documents/t1/a.csv")
+
+    src = tmp_path / "upload.csv"
+    src.write_bytes(b"y" * 1000)
+    storage.put("documents/t1/c.csv", b"y" * 1000, "v1")
+    seeded = cache.seed("documents/t1/c.csv", '"v1"', str(src))
+
+    assert not src.exists()
+    assert cache.fetch("documents/t1/c.csv") == seeded
+    assert os.path.exists(cache._path("documents/t1/a.csv", "v1"))
+    assert not os.path.exists(cache._path("documents/t1/b.csv", "v1"))
+    assert storage.downloads == 2
+
+
+def test_lock_removed_while_held_is_not_shared_by_waiters(tmp_path):
+    pytest.importorskip("fcntl")
+    from app.services.download_cache import _file_lock
+
+    lock_path = str(tmp_path / "entrada.xlsx.lock")
+    events = []
+
+    def worker(name):
+        with _file_lock(lock_path):
+            events.append(("in", name))
+            time.sleep(0.1)
+            events.append(("out", name))
+
+    waiting = threading.Thread(target=worker, args=("esperando",))
+    with _file_lock(lock_path):
+        waiting.start()
+        time.sleep(0.1)
+        # limpeza: apaga o .lock enquanto o segura; quem esperava acorda no inode velho
+        os.remove(lock_path)
+    time.sleep(0.02)
+    # quem chega depois cria um .lock novo: não pode entrar junto com quem esperava
+    late = threading.Thread(target=worker, args=("depois",))
+    late.start()
+    waiting.join()
+    late.join()
+
+    assert [kind for kind, _ in events] == ["in", "out", "in", "out"]
+
+
+def test_eviction_skips_entries_locked_by_a_download(tmp_path):
+    pytest.importorskip("fcntl")
+    from app.services.download_cache import _file_lock
+
+    storage = FakeStorage()
+    cache = S3DownloadCache(storage, root=str(tmp_path), max_bytes=10, min_age_seconds=0)
+    storage.put("a.xlsx", b"x" * 8, "e1")
+    storage.put("b.xlsx", b"y" * 8, "e2")
+    first = cache.fetch("a.xlsx")
+    os.utime(first, (time.time() - 100, time.time() - 100))
+
+    with _file_lock(f"{first}.lock"):
+        cache.fetch("b.xlsx")  # estoura o limite, mas a entrada 'a' está travada
+        assert os.path.exists(first) and os.path.exists(f"{first}.lock")
+
+    cache.seed("c.xlsx", "e3", str(_write(tmp_path / "c.src", b"z" * 8)))
+    assert not os.path.exists(first) and not os.path.exists(f"{first}.lock")
+
+
+def _write(path, body):
+    path.write_bytes(body)
+    return path
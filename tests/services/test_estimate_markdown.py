@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from app.services.estimate_markdown import (
+    TABLE_HEADER,
+    estimate_to_markdown,
+    iter_estimate_markdown,
+    tee_to_file,
+    write_and_join_chunks,
+    write_chunks,
+)
+
+ESTIMATE = {
+    "name": "Obra",
+    "bdi_global": 0.25,
+    "estimate_items": [
+        {
+            "estimate_item_type": "stage", "index": "1", "name": "Serviços", "price_total": 1234.5,
+            "estimate_items": [
+                {
+                    "estimate_item_type": "composition", "code": "C1", "bank": "SINAPI", "name": "Piso | cerâmico",
+                    "type": "x", "unit_symbol": "m2", "quantity": 2.0, "price_unit": 10.0, "price_total": 20.0,
+                    "composition_child": [
+                        {"estimate_item_type": "resource", "code": "R1", "bank": "SINAPI", "name": "Argamassa",
+                         "type": "y", "unit_symbol": "kg", "quantity": 1.5, "price_unit": None, "price_total": None},
+                    ],
+                },
+            ],
+        },
+    ],
+}
+
+
+def test_renders_hierarchical_markdown():
+    expected = "\n".join([
+        "# Obra\n\n**BDI global:** 25.00%",
+        "## 1 Serviços — R$ 1.234,50",
+        "",
+        TABLE_HEADER,
+        "| composition | C1 | SINAPI | Piso \\| cerâmico | x | m2 | 2.0 | R$ 10,00 | R$ 20,00 |",
+        "| resource | R1 | SINAPI | Argamassa | y | kg | 1.5 |  |  |",
+        "",
+    ])
+    assert estimate_to_markdown(ESTIMATE) == expected
+    assert "".join(iter_estimate_markdown(ESTIMATE, chunk_chars=5)) == expected
+
+
+def test_deep_trees_do_not_recurse():
+    node = {"name": "raiz", "estimate_items": []}
+    items = node["estimate_items"]
+    for depth in range(5000):
+        stage = {"estimate_item_type": "stage", "index": str(depth), "name": None, "estimate_items": []}
+        items.append(stage)
+        items = stage["estimate_items"]
+    assert estimate_to_markdown(node).count("\n") == 5000
+
+
+def test_write_chunks_replaces_file_atomically(tmp_path):
+    path = str(tmp_path / "a.md")
+    assert write_chunks(iter_estimate_markdown(ESTIMATE), path) == len(estimate_to_markdown(ESTIMATE).encode())
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == estimate_to_markdown(ESTIMATE)
+    assert not os.path.exists(f"{path}.part")
+
+
+def test_write_and_join_renders_once(tmp_path, monkeypatch):
+    import app.services.estimate_markdown as estimate_markdown
+
+    expected = estimate_to_markdown(ESTIMATE)
+    walks = []
+    real_lines = estimate_markdown.iter_estimate_lines
+    monkeypatch.setattr(estimate_markdown, "iter_estimate_lines", lambda data: walks.append(1) or real_lines(data))
+    path = str(tmp_path / "c.md")
+
+    text = write_and_join_chunks(estimate_markdown.iter_estimate_markdown(ESTIMATE, chunk_chars=5), path)
+
+    assert text == expected and len(walks) == 1
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == expected
+
+
+def test_interrupted_stream_leaves_no_file(tmp_path):
+    path = str(tmp_path / "b.md")
+
+    def chunks():
+        yield "# parcial\n"
+        raise RuntimeError("falhou no meio")
+
+    stream = tee_to_file(chunks(), path)
+    assert next(stream) == b"# parcial\n"
+    with pytest.raises(RuntimeError):
+        next(stream)
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.part")
+
+    stream = tee_to_file(iter(["a", "b"]), path)
+    next(stream)
+    stream.close()  # cliente desconectou
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.part")
@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app.services.estimate_parser import (
+    ROW_BLANK,
+    ROW_HEADER,
+    ROW_ITEM,
+    ROW_STAGE,
+    classify_rows,
+    parse_excel_to_json_freeform,
+    _strip_cells,
+)
+
+HEADER = ["Tipagem", "Código", "Banco", "Descrição", "Tipo", "Und", "Quant.", "Valor Unit", "Total"]
+
+
+@pytest.fixture
+def estimate_xlsx(tmp_path):
+    wb = Workbook()
+    wb.active.title = "Resumo"
+    ws = wb.create_sheet("Analítico")
+    ws.append(["Obra: Escola Centro"])
+    ws.append(["BDI: 25,00%"])
+    ws.append(HEADER)
+    ws.append(["1 FUNDAÇÃO", None, None, None, None, None, None, None, "1.500,00"])
+    ws.append(["1.1 ESTACAS", None, None, None, None, None, None, None, None])
+    ws.append(["Composição", "96995", "SINAPI", "Reaterro", "SERV", "m3", "10,00", "100,00", "1.000,00"])
+    ws.append(["Insumo", "88316", "SINAPI", "Servente", "MO", "h", "2,5", "20,00", "50,00"])
+    ws.append(["2 ALVENARIA", None, None, None, None, None, None, None, "500,00"])
+    ws.append(["Composição", "87503", "SINAPI", "Alvenaria", "SERV", "m2", "5,00", "100,00", "500,00"])
+    path = tmp_path / "orcamento.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_classify_rows_vectorized():
+    df = pd.DataFrame([
+        [None, None, None, None, None, None, None, None, None],
+        HEADER,
+        ["1.2 ETAPA", None, None, None, None, None, None, None, "10,00"],
+        ["Insumo", "1", "SINAPI", "Areia", "MAT", "m3", "1,00", "2,00", "2,00"],
+    ], dtype=str)
+    kinds = classify_rows(_strip_cells(df))
+    assert kinds.tolist() == [ROW_BLANK, ROW_HEADER, ROW_STAGE, ROW_ITEM]
+
+
+def test_parse_excel_to_json_freeform(estimate_xlsx):
+    data = parse_excel_to_json_freeform(estimate_xlsx)
+
+    assert data["name"] == "Escola Centro"
+    assert data["bdi_global"] == 0.25
+
+    stages = [i for i in data["estimate_items"] if i["estimate_item_type"] == "stage"]
+    assert [s["index"] for s in stages] == ["1", "2"]
+
+    # o estágio "1" usa a chave 'estimate_item' (schema exato)
+    stage_1 = stages[0]
+    assert stage_1["price_total"] == 1500.0
+    sub = stage_1["estimate_item"][0]
+    assert sub["index"] == "1.1"
+    comp = sub["estimate_items"][0]
+    assert comp["index"] == "1.1.1"
+    assert comp["unit_symbol"] == "m³"
+    assert comp["price_total"] == 1000.0
+    assert comp["composition_child"][0]["quantity"] == 2.5
+
+    assert stages[1]["estimate_items"][0]["index"] == "2.1"
+
+
+def test_streaming_mode_matches_pandas(estimate_xlsx):
+    assert parse_excel_to_json_freeform(estimate_xlsx, streaming=True) == parse_excel_to_json_freeform(estimate_xlsx)
+
+
+def test_streaming_reads_sheet_once_and_resolves_width_at_the_end(tmp_path, monkeypatch):
+    from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Analítico"
+    ws.append(["1 FUNDAÇÃO", None, None, None, None, None, None, None, "1.500,00"])
+    ws.append(["Composição", "96995", "SINAPI", "Reaterro", "SERV", "m3", "10,00", "100,00", "1.000,00"])
+    ws.append(["2 ALVENARIA", None, None, None, None, None, None, None, "500,00"])
+    # linha mais larga no fim: a última coluna da aba passa a ser a 10ª (totais acima ficam vazios)
+    ws.append(["obs", None, None, None, None, None, None, None, None, "x"])
+    path = tmp_path / "largo.xlsx"
+    wb.save(path)
+
+    passes = []
+    original = ReadOnlyWorksheet.iter_rows
+    monkeypatch.setattr(ReadOnlyWorksheet, "iter_rows", lambda self, *a, **k: passes.append(1) or original(self, *a, **k))
+
+    streamed = parse_excel_to_json_freeform(str(path), streaming=True)
+
+    assert len(passes) == 1
+    assert streamed == parse_excel_to_json_freeform(str(path))
+    stages = [i for i in streamed["estimate_items"] if i["estimate_item_type"] == "stage"]
+    assert [s["price_total"] for s in stages] == [None, None]
+
+
+def test_streaming_narrow_sheet_has_no_items(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["1 FUNDAÇÃO", None, "1.500,00"])
+    ws.append(["Composição", "96995", "SINAPI"])
+    path = tmp_path / "estreito.xlsx"
+    wb.save(path)
+
+    streamed = parse_excel_to_json_freeform(str(path), streaming=True)
+
+    assert streamed == parse_excel_to_json_freeform(str(path))
+    assert streamed["estimate_items"][0]["price_total"] == 1500.0
@@ -0,0 +1,280 @@
+import copy
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from app.services.estimate_persistence import (
+    COMPOSITIONS_TABLE,
+    ESTIMATES_TABLE,
+    NODE_TABLES,
+    RESOURCES_TABLE,
+    STAGES_TABLE,
+    diff_estimate,
+    flatten_estimate,
+    load_estimate_snapshot,
+    persist_estimate,
+    persist_estimate_diff,
+)
+from app.services.supabase_manager import BulkWriteResult
+
+
+def _resource(code):
+    return {"estimate_item_type": "resource", "code": code, "name": f"insumo {code}", "quantity": 1.0}
+
+
+ESTIMATE = {
+    "name": "Obra",
+    "bdi_global": 0.25,
+    "estimate_items": [
+        {
+            "estimate_item_type": "stage", "index": "1", "name": "Serviços", "price_total": 10.0,
+            "estimate_items": [
+                {
+                    "estimate_item_type": "stage", "index": "1.1", "name": "Preliminares", "price_total": None,
+                    "estimate_items": [
+                        {
+                            "estimate_item_type": "composition", "index": "1.1.1", "code": "C1", "name": "Comp",
+                            "composition_child": [_resource("R1"), _resource("R2")],
+                        },
+                        _resource("R3"),
+                    ],
+                },
+            ],
+        },
+        {"estimate_item_type": "stage", "index": "2", "name": "Outros", "price_total": None, "estimate_items": []},
+    ],
+}
+
+
+class FakeManager:
+    def __init__(self, fail_table=None, fail_delete=False):
+        self.fail_table = fail_table
+        self.fail_delete = fail_delete
+        self.calls = []
+        self.deletes = []
+
+    def bulk_write(self, table, rows, **kwargs):
+        self.calls.append((table, rows))
+        if table == self.fail_table:
+            return BulkWriteResult(failed=len(rows), errors=[{"offset": 0, "rows": len(rows), "error": "boom"}])
+        return BulkWriteResult(inserted=len(rows))
+
+    def bulk_delete(self, table, ids, **kwargs):
+        self.deletes.append((table, ids))
+        if self.fail_delete:
+            return BulkWriteResult(failed=len(ids), errors=[{"offset": 0, "rows": len(ids), "error": "down"}])
+        return BulkWriteResult(deleted=len(ids))
+
+
+def test_flatten_resolves_parent_references():
+    batches = flatten_estimate(ESTIMATE, "tenant-1", estimate_id="est-1", import_id="imp-1")
+
+    assert batches.counts() == {ESTIMATES_TABLE: 1, STAGES_TABLE: 3, COMPOSITIONS_TABLE: 1, RESOURCES_TABLE: 3}
+    assert batches.estimate["bdi_global"] == 0.25 and batches.estimate["import_id"] == "imp-1"
+
+    by_index = {s["index"]: s for level in batches.stages for s in level}
+    assert [[s["index"] for s in level] for level in batches.stages] == [["1", "2"], ["1.1"]]
+    assert by_index["1"]["parent_stage_id"] is None
+    assert by_index["1.1"]["parent_stage_id"] == by_index["1"]["id"]
+
+    (comp,) = batches.compositions
+    assert comp["stage_id"] == by_index["1.1"]["id"] and comp["position"] == 0
+    resources = {r["code"]: r for r in batches.resources}
+    assert resources["R1"]["composition_id"] == comp["id"] and resources["R1"]["stage_id"] is None
+    assert resources["R2"]["position"] == 1
+    assert resources["R3"]["stage_id"] == by_index["1.1"]["id"] and resources["R3"]["position"] == 1
+
+    for rows in (batches.compositions, batches.resources, *batches.stages):
+        assert len({tuple(sorted(r)) for r in rows}) == 1  # mesmas colunas em todo o lote
+    every = [batches.estimate, *batches.compositions, *batches.resources] + [s for level in batches.stages for s in level]
+    assert len({r["id"] for r in every}) == len(every)
+    assert all(r["tenant_id"] == "tenant-1" for r in every)
+
+
+def test_persist_writes_parents_first_in_batches():
+    batches = flatten_estimate(ESTIMATE, "tenant-1")
+    manager = FakeManager()
+
+    summary = persist_estimate(manager, batches)
+
+    assert summary["ok"] and summary["estimate_id"] == batches.estimate["id"]
+    assert [table for table, _ in manager.calls] == [
+        ESTIMATES_TABLE, STAGES_TABLE, STAGES_TABLE, COMPOSITIONS_TABLE, RESOURCES_TABLE,
+    ]
+    assert summary["tables"][RESOURCES_TABLE] == {"inserted": 3, "failed": 0}
+    assert manager.deletes == []
+
+
+def test_persist_stops_after_failed_table_and_rolls_back():
+    manager = FakeManager(fail_table=COMPOSITIONS_TABLE)
+    batches = flatten_estimate(ESTIMATE, "tenant-1")
+
+    summary = persist_estimate(manager, batches)
+
+    assert not summary["ok"]
+    assert summary["errors"] == [{"table": COMPOSITIONS_TABLE, "offset": 0, "rows": 1, "error": "boom"}]
+    assert RESOURCES_TABLE not in [table for table, _ in manager.calls]
+    assert summary["tables"][RESOURCES_TABLE] == {"inserted": 0, "failed": 0}
+    # estágios já gravados saem pelo cascade do orçamento
+    assert manager.deletes == [(ESTIMATES_TABLE, [batches.estimate["id"]])]
+    assert summary["rolled_back"]
+
+
+def test_persist_reports_failed_rollback():
+    manager = FakeManager(fail_table=STAGES_TABLE, fail_delete=True)
+
+    summary = persist_estimate(manager, flatten_estimate(ESTIMATE, "tenant-1"))
+
+    assert not summary["ok"] and not summary["rolled_back"]
+    assert summary["errors"][-1] == {"table": ESTIMATES_TABLE, "offset": 0, "rows": 1, "error": "down", "cleanup": True}
+
+
+class InMemoryManager:
+    """Tabelas em dicts (id -> linha), com a interface usada pela persistência."""
+
+    def get(self, table, filters=None):
+        return [r for r in self.tables.get(table, {}).values() if all(r.get(k) == v for k, v in (filters or {}).items())]
+
+    def select_all(self, table, columns="*", filters=None, **kwargs):
+        return [{c: r.get(c) for c in columns.split(",")} for r in self.get(table, filters)]
+
+    def __init__(self, fail_table=None):
+        self.tables = {}
+        self.calls = []
+        self.fail_table = fail_table
+
+    def bulk_write(self, table, rows, upsert=False, **kwargs):
+        self.calls.append((table, "upsert" if upsert else "insert", len(rows)))
+        if table == self.fail_table:
+            return BulkWriteResult(failed=len(rows), errors=[{"offset": 0, "rows": len(rows), "error": "boom"}])
+        stored = self.tables.setdefault(table, {})
+        assert upsert or not set(stored) & {r["id"] for r in rows}
+        stored.update((r["id"], dict(r)) for r in rows)
+        return BulkWriteResult(inserted=len(rows))
+
+    def bulk_delete(self, table, ids, **kwargs):
+        self.calls.append((table, "delete", len(ids)))
+        for row_id in ids:
+            self.tables[table].pop(row_id)
+        return BulkWriteResult(deleted=len(ids))
+
+
+def _revised():
+    estimate = copy.deepcopy(ESTIMATE)
+    preliminares = estimate["estimate_items"][0]["estimate_items"][0]
+    preliminares["estimate_items"][0]["composition_child"][1]["quantity"] = 2.0  # R2 alterado
+    preliminares["estimate_items"].append(_resource("R4"))                     # R4 novo
+    del estimate["estimate_items"][1]                                         # estágio 2 removido
+    return estimate
+
+
+def test_flatten_gives_stable_ids_and_content_fingerprints():
+    first = flatten_estimate(ESTIMATE, "tenant-1", estimate_id="est-1")
+    again = flatten_estimate(copy.deepcopy(ESTIMATE), "tenant-1", estimate_id="est-1")
+    revised = flatten_estimate(_revised(), "tenant-1", estimate_id="est-1")
+
+    rows = lambda b: {r["node_key"]: r for t in NODE_TABLES for r in b.node_rows()[t]}
+    assert rows(first) == rows(again)
+    assert "/s@1/s@1.1/c:C1|/r:R1|" in rows(first)
+    changed = {k for k, r in rows(revised).items() if k in rows(first) and r["fingerprint"] != rows(first)[k]["fingerprint"]}
+    assert changed == {"/s@1/s@1.1/c:C1|/r:R2|"}
+    assert rows(revised)["/s@1/s@1.1/c:C1|/r:R2|"]["id"] == rows(first)["/s@1/s@1.1/c:C1|/r:R2|"]["id"]
+
+
+def test_flatten_disambiguates_repeated_items():
+    estimate = {"estimate_items": [
+        _resource("R1"), _resource("R1"), {"estimate_item_type": "resource", "name": "x"}, _resource("SINAPI/88"),
+    ]}
+
+    keys = [r["node_key"] for r in flatten_estimate(estimate, "tenant-1").resources]
+
+    assert keys == ["/r:R1|", "/r:R1|~2", "/r#2", "/r:SINAPI%2F88|"]
+
+
+def test_incremental_reimport_writes_only_the_changes():
+    manager = InMemoryManager()
+    assert persist_estimate(manager, flatten_estimate(ESTIMATE, "tenant-1", estimate_id="est-1"))["ok"]
+    assert load_estimate_snapshot(manager, "outro") is None
+    manager.calls.clear()
+
+    batches = flatten_estimate(_revised(), "tenant-1", estimate_id="est-1", import_id="imp-2")
+    diff = diff_estimate(batches, load_estimate_snapshot(manager, "est-1"))
+    summary = persist_estimate_diff(manager, diff)
+
+    assert diff.counts()[RESOURCES_TABLE] == {"inserted": 1, "updated": 1, "deleted": 0, "unchanged": 2}
+    assert diff.counts()[STAGES_TABLE] == {"inserted": 0, "updated": 0, "deleted": 1, "unchanged": 2}
+    assert diff.counts()[COMPOSITIONS_TABLE]["unchanged"] == 1 and diff.changed == 3
+    assert summary["ok"] and summary["tables"][STAGES_TABLE]["deleted"] == 1
+    assert manager.calls == [
+        (ESTIMATES_TABLE, "upsert", 1),
+        (RESOURCES_TABLE, "upsert", 1),
+        (RESOURCES_TABLE, "upsert", 1),
+        (STAGES_TABLE, "delete", 1),
+    ]
+    # o resultado é o mesmo de gravar a nova versão do zero
+    expected = InMemoryManager()
+    persist_estimate(expected, batches)
+    assert manager.tables == expected.tables
+
+
+def test_incremental_reimport_deletes_children_before_parents():
+    manager = InMemoryManager()
+    persist_estimate(manager, flatten_estimate(ESTIMATE, "tenant-1", estimate_id="est-1"))
+    manager.calls.clear()
+    estimate = copy.deepcopy(ESTIMATE)
+    estimate["estimate_items"][0]["index"] = "9"  # estágio renumerado: a subárvore inteira muda de chave
+
+    batches = flatten_estimate(estimate, "tenant-1", estimate_id="est-1")
+    persist_estimate_diff(manager, diff_estimate(batches, load_estimate_snapshot(manager, "est-1")))
+
+    deletes = [(table, n) for table, action, n in manager.calls if action == "delete"]
+    assert deletes == [(RESOURCES_TABLE, 3), (COMPOSITIONS_TABLE, 1), (STAGES_TABLE, 1), (STAGES_TABLE, 1)]
+    upserts = [table for table, action, _ in manager.calls if action == "upsert"]
+    assert upserts == [ESTIMATES_TABLE, STAGES_TABLE, STAGES_TABLE, COMPOSITIONS_TABLE, RESOURCES_TABLE]
+
+
+def test_composition_inserted_mid_stage_only_shifts_siblings():
+    def composition(n):
+        return {
+            "estimate_item_type": "composition", "index": f"1.{n}", "code": f"C{n}", "name": "Comp",
+            "composition_child": [_resource(f"R{n}a"), _resource(f"R{n}b")],
+        }
+
+    stage = {"estimate_item_type": "stage", "index": "1", "name": "Serviços", "estimate_items": [composition(n) for n in range(1, 6)]}
+    manager = InMemoryManager()
+    persist_estimate(manager, flatten_estimate({"estimate_items": [stage]}, "tenant-1", estimate_id="est-1"))
+
+    # nova composição na 2ª posição: o parser renumera os índices dos irmãos seguintes
+    revised = copy.deepcopy(stage)
+    revised["estimate_items"].insert(1, composition(9))
+    for n, item in enumerate(revised["estimate_items"], start=1):
+        item["index"] = f"1.{n}"
+    batches = flatten_estimate({"estimate_items": [revised]}, "tenant-1", estimate_id="est-1")
+    diff = diff_estimate(batches, load_estimate_snapshot(manager, "est-1"))
+
+    assert diff.counts()[COMPOSITIONS_TABLE] == {"inserted": 1, "updated": 4, "deleted": 0, "unchanged": 1}
+    # os recursos das composições deslocadas não mudam
+    assert diff.counts()[RESOURCES_TABLE] == {"inserted": 2, "updated": 0, "deleted": 0, "unchanged": 10}
+    persist_estimate_diff(manager, diff)
+    expected = InMemoryManager()
+    persist_estimate(expected, batches)
+    assert manager.tables == expected.tables
+
+
+def test_failed_incremental_reimport_resumes_on_retry():
+    manager = InMemoryManager()
+    persist_estimate(manager, flatten_estimate(ESTIMATE, "tenant-1", estimate_id="est-1"))
+    batches = flatten_estimate(_revised(), "tenant-1", estimate_id="est-1")
+
+    manager.fail_table = RESOURCES_TABLE
+    failed = persist_estimate_diff(manager, diff_estimate(batches, load_estimate_snapshot(manager, "est-1")))
+    assert not failed["ok"] and failed["errors"][0]["table"] == RESOURCES_TABLE
+
+    manager.fail_table = None
+    retry_diff = diff_estimate(batches, load_estimate_snapshot(manager, "est-1"))
+    assert persist_estimate_diff(manager, retry_diff)["ok"]
+
+    expected = InMemoryManager()
+    persist_estimate(expected, batches)
+    assert manager.tables == expected.tables
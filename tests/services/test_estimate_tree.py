@@ -0,0 +1,17 @@
+from app.services.estimate_tree import EstimateTreeBuilder, add_child_to_index, ensure_stage_path
+
+
+def test_builder_matches_linear_helpers():
+    indexes = ["2.1", "1", "1.3.2", "2", "1.3", "3.1.1.1"]
+
+    legacy: list = []
+    tree = EstimateTreeBuilder()
+    for idx in indexes:
+        ensure_stage_path(legacy, idx.split("."))["name"] = idx
+        tree.ensure_stage(idx)["name"] = idx
+        add_child_to_index(legacy, f"{idx}.9", {"index": f"{idx}.9"})
+        tree.add_child(f"{idx}.9", {"index": f"{idx}.9"})
+
+    assert tree.root == legacy
+    assert tree.find_stage("3.1.1")["index"] == "3.1.1"
+    assert tree.find_stage("4") is None
@@ -0,0 +1,86 @@
+import pytest
+from openpyxl import Workbook
+
+from app.services.excel_markdown import (
+    EMPTY_MARKDOWN,
+    excel_to_markdown_tables,
+    pipe_table,
+    render_xlsx_sheet,
+    xlsx_sheet_names,
+)
+
+
+def test_pipe_table_escapes_and_pads():
+    assert pipe_table(["a", "b"], [("x|y", None), ("linha\nquebrada",), (1, 2.5, "extra")]) == "\n".join([
+        "| a | b |",
+        "|---|---|",
+        "| x\\|y |  |",
+        "| linha quebrada |  |",
+        "| 1 | 2.5 |",
+    ])
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Resumo"
+    ws.append(["Item", None, "Item"])
+    ws.append([1, "a"])
+    ws.append([])
+    ws.append([2, "b", "c"])
+    ws.append([])  # linhas vazias no fim não contam
+
+    for i in range(3):
+        sheet = wb.create_sheet(f"Analítico {i}")
+        sheet.append(["Código", "Total"])
+        for j in range(50):
+            sheet.append([f"C{i}.{j}", j * 1.5])
+
+    wb.create_sheet("Vazia")
+    only_header = wb.create_sheet("Só cabeçalho")
+    only_header.append(["a", "b"])
+
+    path = tmp_path / "planilha.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_sheet_follows_read_excel_rules(workbook):
+    assert render_xlsx_sheet(workbook, "Resumo") == "\n".join([
+        "# Resumo",
+        "| Item | Unnamed: 1 | Item.1 |",
+        "|---|---|---|",
+        "| 1 | a |  |",
+        "|  |  |  |",
+        "| 2 | b | c |",
+    ])
+    assert render_xlsx_sheet(workbook, "Vazia") is None
+    assert render_xlsx_sheet(workbook, "Só cabeçalho") is None
+
+
+def test_parallel_export_keeps_sheet_order(workbook):
+    assert xlsx_sheet_names(workbook)[:2] == ["Resumo", "Analítico 0"]
+
+    parallel = excel_to_markdown_tables(workbook)
+    assert parallel == excel_to_markdown_tables(workbook, parallel=False)
+    titles = [line for line in parallel.split("\n") if line.startswith("# ")]
+    assert titles == ["# Resumo", "# Analítico 0", "# Analítico 1", "# Analítico 2"]
+    assert "\n\n# Analítico 0\n" in parallel
+
+
+def test_sheet_filter_and_empty_result(workbook, tmp_path):
+    md = excel_to_markdown_tables(workbook, only_sheet_contains="analític")
+    assert md.startswith("# Analítico 0\n") and "# Resumo" not in md
+
+    wb = Workbook()
+    wb.save(tmp_path / "vazia.xlsx")
+    assert excel_to_markdown_tables(str(tmp_path / "vazia.xlsx")) == EMPTY_MARKDOWN
+
+
+def test_engine_reflects_the_reader_used():
+    from app.services.excel_markdown import excel_markdown_engine
+
+    assert excel_markdown_engine("orcamento.XLSX") == "openpyxl"
+    assert excel_markdown_engine("macro.xlsm") == "openpyxl"
+    assert excel_markdown_engine("antigo.xls") == "pandas"
@@ -0,0 +1,197 @@
+import io
+import re
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from app.services.excel_preview import preview_workbook
+
+
+def _workbook_bytes(rows: int = 50) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Analítico"
+    for r in range(1, rows + 1):
+        ws.append([f"1.{r}", "SINAPI", f"Serviço {r}", r * 1.5])
+    wb.create_sheet("Vazia")
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _strip_dimension(data: bytes) -> bytes:
+    src, out = zipfile.ZipFile(io.BytesIO(data)), io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            body = src.read(item.filename)
+            if item.filename.startswith("xl/worksheets/"):
+                body = re.sub(rb"<dimension[^>]*/>", b"", body)
+            dst.writestr(item, body)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("transform", [lambda b: b, _strip_dimension])
+def test_preview_reads_first_rows_and_total(transform):
+    previews = preview_workbook(io.BytesIO(transform(_workbook_bytes())), max_rows=3)
+
+    assert list(previews) == ["Analítico", "Vazia"]
+    assert previews["Analítico"]["total_rows"] == 50
+    assert previews["Analítico"]["rows"] == [
+        ("1.1", "SINAPI", "Serviço 1", 1.5),
+        ("1.2", "SINAPI", "Serviço 2", 3.0),
+        ("1.3", "SINAPI", "Serviço 3", 4.5),
+    ]
+    # igual ao openpyxl completo: aba vazia = nenhuma linha, max_row 1
+    assert previews["Vazia"] == {"rows": [], "total_rows": 1}
+
+
+def test_preview_over_s3_range_reader_fetches_part_of_the_file(monkeypatch):
+    moto = pytest.importorskip("moto")
+    from app.services.storage_manager import S3FileManager
+
+    monkeypatch.setenv("AWS_S3_BUCKET_NAME", "orceu-test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        manager = S3FileManager()
+        manager.client.create_bucket(Bucket="orceu-test")
+        data = _workbook_bytes(rows=40000)
+        manager.upload_fileobj(io.BytesIO(data), "documents/t1/grande.xlsx")
+
+        reader = manager.open_range_reader("documents/t1/grande.xlsx", block_size=64 * 1024)
+        previews = preview_workbook(reader, max_rows=2)
+
+    assert previews["Analítico"]["total_rows"] == 40000
+    assert previews["Analítico"]["rows"][1] == ("1.2", "SINAPI", "Serviço 2", 3.0)
+    assert reader.bytes_fetched < len(data) / 2
+
+
+def test_merged_range_index_bisect_lookup():
+    from app.services.excel_preview import MergedRangeIndex
+
+    index = MergedRangeIndex([(1, 1, 2, 3), (2, 5, 4, 6), (10, 1, 10, 2)])
+
+    assert index.range_at(1, 2) == (1, 1, 2, 3)
+    assert index.range_at(2, 4) is None
+    assert index.range_at(3, 6) == (2, 5, 4, 6)
+    assert index.range_at(5, 5) is None
+    # volta para uma linha anterior: refaz a varredura
+    assert index.range_at(2, 1) == (1, 1, 2, 3)
+
+
+def test_merged_ranges_scan_across_chunk_boundaries(monkeypatch):
+    import app.services.excel_preview as excel_preview
+
+    wb = Workbook()
+    ws = wb.active
+    for r in range(1, 200):
+        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=2 + r % 3)
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    monkeypatch.setattr(excel_preview, "_MERGE_SCAN_CHUNK", 700)
+    archive = zipfile.ZipFile(buf)
+    ranges = excel_preview.read_merged_ranges(archive, "xl/worksheets/sheet1.xml")
+
+    assert sorted(ranges) == [(r, 1, r, 2 + r % 3) for r in range(1, 200)]
+
+
+def _with_merge(data: bytes, ref: str) -> bytes:
+    """Injeta um <mergeCell> direto no XML (o writer do openpyxl expandiria célula a célula)."""
+    src, out = zipfile.ZipFile(io.BytesIO(data)), io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            body = src.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                body = body.replace(
+                    b"</sheetData>", f'</sheetData><mergeCells count="1"><mergeCell ref="{ref}"/></mergeCells>'.encode()
+                )
+            dst.writestr(item, body)
+    return out.getvalue()
+
+
+def test_wide_merged_band_resolves_without_expanding_cells():
+    from app.services.excel_preview import preview_workbook_with_merges
+
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "ORÇAMENTO ANALÍTICO"
+    ws["C1200"] = "1.1"
+    buf = io.BytesIO()
+    wb.save(buf)
+    # faixa de cabeçalho gigante: ~16 milhões de células cobertas
+    data = _with_merge(buf.getvalue(), "A1:XFD1000")
+
+    rows = preview_workbook_with_merges(io.BytesIO(data), max_rows=3)["Sheet"]
+
+    assert rows == [["ORÇAMENTO ANALÍTICO"] * 3] * 3
+
+
+def _rename_sheet_parts(data: bytes) -> bytes:
+    """Abas em caminhos fora do padrão xl/worksheets/sheetN.xml."""
+    renames = {"xl/worksheets/sheet1.xml": "xl/abas/dados.xml", "xl/worksheets/sheet2.xml": "xl/abas/vazia.xml"}
+    src, out = zipfile.ZipFile(io.BytesIO(data)), io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            body = src.read(item.filename)
+            if item.filename == "xl/_rels/workbook.xml.rels":
+                # um alvo relativo à pasta do workbook, outro absoluto
+                body = body.replace(b"/xl/worksheets/sheet1.xml", b"abas/dados.xml")
+                body = body.replace(b"/xl/worksheets/sheet2.xml", b"/xl/abas/vazia.xml")
+            elif item.filename == "[Content_Types].xml":
+                body = body.replace(b"/xl/worksheets/sheet1.xml", b"/xl/abas/dados.xml")
+                body = body.replace(b"/xl/worksheets/sheet2.xml", b"/xl/abas/vazia.xml")
+            dst.writestr(renames.get(item.filename, item.filename), body)
+    return out.getvalue()
+
+
+def test_preview_single_sheet_by_index_and_custom_part_paths():
+    from app.services.excel_preview import worksheet_paths
+
+    data = _rename_sheet_parts(_strip_dimension(_workbook_bytes(rows=5)))
+    assert worksheet_paths(zipfile.ZipFile(io.BytesIO(data))) == {
+        "Analítico": "xl/abas/dados.xml",
+        "Vazia": "xl/abas/vazia.xml",
+    }
+
+    previews = preview_workbook(io.BytesIO(data), max_rows=2, sheet_names=[0])
+    assert list(previews) == ["Analítico"]
+    # sem <dimension>: o total vem da varredura do XML no caminho certo
+    assert previews["Analítico"]["total_rows"] == 5
+    assert preview_workbook(io.BytesIO(data), sheet_names=["Vazia"]) == {"Vazia": {"rows": [], "total_rows": 1}}
+
+
+def test_merges_are_opt_in_for_previews(monkeypatch):
+    import app.services.excel_preview as excel_preview
+
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "TÍTULO"
+    ws["C30"] = "fim"
+    buf = io.BytesIO()
+    wb.save(buf)
+    data = _with_merge(buf.getvalue(), "A1:C2")
+    scans = []
+    real_scan = excel_preview.read_merged_ranges
+    monkeypatch.setattr(excel_preview, "read_merged_ranges", lambda *a, **kw: scans.append(kw) or real_scan(*a, **kw))
+
+    plain = preview_workbook(io.BytesIO(data), max_rows=2)["Sheet"]
+    assert scans == [] and plain["rows"][0][:3] == ("TÍTULO", None, None)
+
+    merged = preview_workbook(io.BytesIO(data), max_rows=2, merges=True)["Sheet"]
+    assert merged["rows"] == [("TÍTULO",) * 3] * 2 and merged["total_rows"] == 30
+    assert scans == [{"max_row": 2}]
+
+
+def test_merged_ranges_after_max_row_are_dropped():
+    import app.services.excel_preview as excel_preview
+
+    buf = io.BytesIO()
+    Workbook().save(buf)
+    data = _with_merge(buf.getvalue(), "B5:C9")
+    archive = zipfile.ZipFile(io.BytesIO(data))
+
+    assert excel_preview.read_merged_ranges(archive, "xl/worksheets/sheet1.xml") == [(5, 2, 9, 3)]
+    assert excel_preview.read_merged_ranges(archive, "xl/worksheets/sheet1.xml", max_row=4) == []
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from app.services.office_pool import OfficePool
+
+
+class FakeWorker:
+    """Stand-in do OfficeWorker: 'converte' copiando e pode travar."""
+
+    instances = []
+
+    def __init__(self, name):
+        self.name = name
+        self.jobs = 0
+        self.healthy = True
+        self.killed = threading.Event()
+        self.delay = 0.0
+        self.started = 0
+        FakeWorker.instances.append(self)
+
+    def start(self):
+        self.started += 1
+
+    def is_healthy(self):
+        return self.healthy and not self.killed.is_set()
+
+    def convert_to_pdf(self, src_path, pdf_path):
+        if self.killed.wait(self.delay):
+            raise RuntimeError("processo morto")
+        with open(src_path, "rb") as src, open(pdf_path, "wb") as dst:
+            dst.write(src.read())
+        self.jobs += 1
+
+    def kill(self):
+        self.killed.set()
+
+    def stop(self):
+        self.kill()
+
+
+@pytest.fixture(autouse=True)
+def reset_instances():
+    FakeWorker.instances = []
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "planilha.xlsx"
+    path.write_bytes(b"conteudo")
+    return str(path)
+
+
+def test_workers_are_reused_between_jobs(src, tmp_path):
+    pool = OfficePool(size=2, worker_factory=FakeWorker)
+    for i in range(5):
+        pool.convert_to_pdf(src, str(tmp_path / f"{i}.pdf"))
+
+    assert len(FakeWorker.instances) == 1
+    assert FakeWorker.instances[0].jobs == 5
+    assert (tmp_path / "4.pdf").read_bytes() == b"conteudo"
+    pool.close()
+    assert FakeWorker.instances[0].killed.is_set()
+
+
+def test_concurrency_is_bounded_by_pool_size(src, tmp_path):
+    pool = OfficePool(size=2, worker_factory=FakeWorker)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    original = FakeWorker.convert_to_pdf
+
+    def tracked(self, s, d):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        original(self, s, d)
+        with lock:
+            active.pop()
+
+    FakeWorker.convert_to_pdf = tracked
+    try:
+        threads = [
+            threading.Thread(target=pool.convert_to_pdf, args=(src, str(tmp_path / f"{i}.pdf")))
+            for i in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        FakeWorker.convert_to_pdf = original
+
+    assert max(peak) == 2
+    assert len(FakeWorker.instances) == 2
+
+
+def test_unhealthy_or_worn_out_workers_are_replaced(src, tmp_path):
+    pool = OfficePool(size=1, max_jobs=2, worker_factory=FakeWorker)
+    pool.convert_to_pdf(src, str(tmp_path / "a.pdf"))
+    FakeWorker.instances[0].healthy = False
+    pool.convert_to_pdf(src, str(tmp_path / "b.pdf"))
+    assert len(FakeWorker.instances) == 2
+
+    pool.convert_to_pdf(src, str(tmp_path / "c.pdf"))
+    pool.convert_to_pdf(src, str(tmp_path / "d.pdf"))  # 2 jobs no segundo: recicla
+    assert len(FakeWorker.instances) == 3
+
+
+def test_job_timeout_kills_and_replaces_worker(src, tmp_path):
+    pool = OfficePool(size=1, worker_factory=FakeWorker)
+    pool.convert_to_pdf(src, str(tmp_path / "a.pdf"))
+    FakeWorker.instances[0].delay = 5
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.convert_to_pdf(src, str(tmp_path / "b.pdf"), timeout=0.1)
+    assert time.monotonic() - start < 2
+    assert FakeWorker.instances[0].killed.is_set()
+
+    pool.convert_to_pdf(src, str(tmp_path / "c.pdf"))  # a vaga volta com processo novo
+    assert len(FakeWorker.instances) == 2
+
+
+def test_acquire_times_out_when_all_workers_are_busy(src, tmp_path):
+    pool = OfficePool(size=1, acquire_timeout=0.05, worker_factory=FakeWorker)
+    pool.convert_to_pdf(src, str(tmp_path / "a.pdf"))
+    FakeWorker.instances[0].delay = 0.5
+
+    busy = threading.Thread(target=pool.convert_to_pdf, args=(src, str(tmp_path / "b.pdf")))
+    busy.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        pool.convert_to_pdf(src, str(tmp_path / "c.pdf"))
+    busy.join()
+
+
+def test_worker_profiles_are_unique_per_process_and_removed(tmp_path):
+    import os
+
+    from app.services.office_pool import OfficeWorker
+
+    # mesmo nome (w1) em dois pools/processos: perfis distintos, com o pid
+    first, second = OfficeWorker("w1", profile_root=str(tmp_path)), OfficeWorker("w1", profile_root=str(tmp_path))
+
+    assert first.profile_dir != second.profile_dir
+    assert os.path.basename(first.profile_dir).startswith(f"w1_{os.getpid()}_")
+    first.kill()
+    second.stop()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,55 @@
+import os
+import time
+
+from app.services.parse_cache import ParseCache, file_sha256
+
+
+def test_hit_miss_and_key_parts(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    src = tmp_path / "orcamento.xlsx"
+    src.write_bytes(b"conteudo")
+    digest = file_sha256(str(src))
+
+    semantic = cache.make_key("tenant-1", digest, "estimate_markdown", "semantic", "1")
+    raw = cache.make_key("tenant-1", digest, "estimate_markdown", "raw", "1")
+    assert semantic != raw
+    # mesmo arquivo, outro tenant: outra entrada
+    assert cache.make_key("tenant-2", digest, "estimate_markdown", "semantic", "1") != semantic
+
+    assert cache.get(semantic) is None
+    cache.set(semantic, {"markdown": "# Obra"})
+    assert cache.get(semantic) == {"markdown": "# Obra"}
+    assert cache.get(raw) is None
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=2500)
+    payload = "x" * 1000
+
+    cache.set("aa1", payload)
+    cache.set("bb2", payload)
+    # "aa1" usado por último => "bb2" é o menos recente
+    past = time.time() - 60
+    os.utime(cache._path("bb2"), (past, past))
+    assert cache.get("aa1") == payload
+
+    cache.set("cc3", payload)
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") == payload
+    assert cache.get("cc3") == payload
+
+
+def test_eviction_scans_only_when_over_budget(tmp_path, monkeypatch):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=10_000, rescan_seconds=3600)
+    scans = []
+    original = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: scans.append(1) or original())
+
+    for n in range(8):
+        cache.set(f"k{n:02d}", "x" * 1000)
+    assert len(scans) == 1  # só a primeira gravação varre (total ainda desconhecido)
+
+    cache.set("k00", "x" * 1000)  # sobrescrever não soma de novo
+    cache.set("k08", "x" * 1000)
+    cache.set("k09", "x" * 1000)
+    assert len(scans) == 2 and cache._total <= 10_000
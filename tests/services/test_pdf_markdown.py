@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pytest
+
+pymupdf4llm = pytest.importorskip("pymupdf4llm")
+import pymupdf
+
+from app.services import pdf_markdown
+from app.services.parse_cache import ParseCache
+from app.services.pdf_markdown import close_pdf_markdown_pool, extract_pdf_markdown, extract_pdf_markdown_async
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pdf") / "edital.pdf"
+    doc = pymupdf.open()
+    for i in range(5):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Capítulo {i + 1}", fontsize=18)
+        page.insert_text((72, 90), f"Item {i} do edital.", fontsize=10)
+        for r in range(3):
+            for c in range(3):
+                rect = pymupdf.Rect(72 + c * 100, 120 + r * 20, 172 + c * 100, 140 + r * 20)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                page.insert_text((rect.x0 + 3, rect.y1 - 6), f"L{r}C{c}", fontsize=9)
+    doc.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(root=str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def rag_engine():
+    # motor clássico (IdentifyHeaders): títulos do documento inteiro em toda faixa
+    layout_was_on = not hasattr(pymupdf4llm, "IdentifyHeaders")
+    pymupdf4llm.use_layout(False)
+    yield
+    if layout_was_on:
+        pymupdf4llm.use_layout(True)
+
+
+@pytest.fixture
+def extracted_pages(monkeypatch):
+    calls = []
+    original = pdf_markdown.extract_pages
+
+    def spy(path, pages, strategy, headers=None):
+        calls.append((list(pages), strategy))
+        return original(path, pages, strategy, headers)
+
+    monkeypatch.setattr(pdf_markdown, "extract_pages", spy)
+    return calls
+
+
+def test_assembles_same_markdown_as_whole_document(pdf_path, cache, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 2)
+    progress = []
+
+    result = extract_pdf_markdown(pdf_path, "tenant-1", "hash-1", "lines_strict", progress=lambda d, t: progress.append((d, t)), cache=cache)
+
+    assert result.markdown == pymupdf4llm.to_markdown(pdf_path, table_strategy="lines_strict")
+    assert [p["metadata"]["page_number"] for p in result.pages] == [1, 2, 3, 4, 5]
+    assert (result.pages_cached, result.pages_extracted) == (0, 5)
+    assert progress == [(0, 5), (2, 5), (4, 5), (5, 5)]
+
+
+def test_only_missing_pages_are_extracted(pdf_path, cache, extracted_pages, rag_engine, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 10)
+    first = extract_pdf_markdown(pdf_path, "tenant-1", "hash-2", "text", cache=cache)
+    assert extracted_pages == [([0, 1, 2, 3, 4], "text")]
+
+    # mesma estratégia: tudo do cache (page_chunks é só a forma de montar)
+    again = extract_pdf_markdown(pdf_path, "tenant-1", "hash-2", "text", cache=cache)
+    assert again.pages_extracted == 0 and again.markdown == first.markdown
+    assert again.pages == first.pages
+
+    # página perdida do cache: só ela é refeita
+    import os
+    os.remove(cache._path(pdf_markdown.page_cache_key("tenant-1", "hash-2", 3, "text")))
+    resumed = extract_pdf_markdown(pdf_path, "tenant-1", "hash-2", "text", cache=cache)
+    assert extracted_pages[-1] == ([3], "text") and resumed.markdown == first.markdown
+
+    # outra estratégia: páginas próprias no cache
+    extract_pdf_markdown(pdf_path, "tenant-1", "hash-2", "lines", cache=cache)
+    assert extracted_pages[-1] == ([0, 1, 2, 3, 4], "lines")
+
+
+def test_parallel_extraction_keeps_page_order(pdf_path, cache, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, "PDF_MARKDOWN_WORKERS", 2)
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 2)
+    try:
+        result = extract_pdf_markdown(pdf_path, "tenant-1", "hash-3", "lines_strict", cache=cache)
+    finally:
+        close_pdf_markdown_pool()
+    serial = extract_pdf_markdown(pdf_path, "tenant-1", "hash-3b", "lines_strict", parallel=False, cache=cache)
+    assert result.markdown == serial.markdown
+    assert [p["metadata"]["page_number"] for p in result.pages] == [1, 2, 3, 4, 5]
+
+
+@pytest.fixture(scope="module")
+def mixed_headers_pdf(tmp_path_factory):
+    # títulos de 24pt só na primeira página: numa faixa sem ela, o de 16pt viraria "#"
+    path = tmp_path_factory.mktemp("pdf") / "headers.pdf"
+    doc = pymupdf.open()
+    for i in range(4):
+        page = doc.new_page()
+        if i == 0:
+            page.insert_text((72, 50), "Edital", fontsize=24)
+        page.insert_text((72, 90), f"Seção {i + 1}", fontsize=16)
+        for line in range(6):
+            page.insert_text((72, 120 + line * 14), f"Texto corrido {i}.{line} do documento.", fontsize=10)
+    doc.save(path)
+    return str(path)
+
+
+def test_header_levels_come_from_the_whole_document(mixed_headers_pdf, cache, rag_engine, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 1)
+    scans = []
+    original = pdf_markdown.identify_headers
+    monkeypatch.setattr(pdf_markdown, "identify_headers", lambda path: scans.append(path) or original(path))
+
+    result = extract_pdf_markdown(mixed_headers_pdf, "tenant-1", "hash-h", "lines_strict", parallel=False, cache=cache)
+
+    assert result.markdown == pymupdf4llm.to_markdown(mixed_headers_pdf, table_strategy="lines_strict")
+    assert "## Seção 3" in result.pages[2]["text"]
+    assert len(scans) == 1  # uma varredura para todas as faixas
+
+
+def test_layout_engine_extracts_fixed_page_blocks(mixed_headers_pdf, cache, extracted_pages, monkeypatch):
+    if hasattr(pymupdf4llm, "IdentifyHeaders"):
+        pytest.skip("motor de layout (pymupdf.layout) indisponível")
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 2)
+
+    first = extract_pdf_markdown(mixed_headers_pdf, "tenant-1", "hash-l", "text", parallel=False, cache=cache)
+    assert extracted_pages == [([0, 1], "text"), ([2, 3], "text")]
+
+    # página perdida: o bloco dela volta inteiro, com a mesma saída de antes
+    import os
+    os.remove(cache._path(pdf_markdown.page_cache_key("tenant-1", "hash-l", 3, "text", batch=2)))
+    resumed = extract_pdf_markdown(mixed_headers_pdf, "tenant-1", "hash-l", "text", parallel=False, cache=cache)
+    assert extracted_pages[-1] == ([2, 3], "text")
+    assert (resumed.pages_cached, resumed.pages_extracted) == (2, 2)
+    assert resumed.markdown == first.markdown
+
+    # outro tamanho de bloco muda os títulos: não reaproveita o cache
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 4)
+    extract_pdf_markdown(mixed_headers_pdf, "tenant-1", "hash-l", "text", parallel=False, cache=cache)
+    assert extracted_pages[-1] == ([0, 1, 2, 3], "text")
+
+
+def test_async_extraction_matches_sync(pdf_path, cache, monkeypatch):
+    monkeypatch.setattr(pdf_markdown, "PDF_PAGES_PER_TASK", 2)
+    progress = []
+    try:
+        result = asyncio.run(extract_pdf_markdown_async(
+            pdf_path, "tenant-1", "hash-a", "lines_strict", progress=lambda d, t: progress.append((d, t)), cache=cache,
+        ))
+    finally:
+        close_pdf_markdown_pool()
+
+    assert result.markdown == pymupdf4llm.to_markdown(pdf_path, table_strategy="lines_strict")
+    assert [p["metadata"]["page_number"] for p in result.pages] == [1, 2, 3, 4, 5]
+    assert progress[0] == (0, 5) and progress[-1] == (5, 5) and len(progress) == 4
+    again = asyncio.run(extract_pdf_markdown_async(pdf_path, "tenant-1", "hash-a", "lines_strict", cache=cache))
+    assert again.pages_extracted == 0 and again.pages == result.pages
+
+
+def test_cache_write_failures_are_logged_not_swallowed(pdf_path, cache, monkeypatch, caplog):
+    def disk_full(key, value):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cache, "set", disk_full)
+    with caplog.at_level("ERROR", logger=pdf_markdown.__name__):
+        result = extract_pdf_markdown(pdf_path, "tenant-1", "hash-full", "lines_strict", parallel=False, cache=cache)
+
+    assert result.pages_extracted == 5
+    assert any("cache" in r.getMessage() and r.exc_info for r in caplog.records)
+
+    monkeypatch.setattr(cache, "set", lambda key, value: json.dumps(object()))
+    with pytest.raises(TypeError):  # payload inválido é bug: não some
+        extract_pdf_markdown(pdf_path, "tenant-1", "hash-bug", "lines_strict", parallel=False, cache=cache)
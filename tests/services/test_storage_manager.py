@@ -0,0 +1,97 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from boto3.s3.transfer import TransferConfig
+
+from app.services.storage_manager import AsyncS3FileManager, S3FileManager
+
+BUCKET = "orceu-test"
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("AWS_S3_BUCKET_NAME", BUCKET)
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        # limiar baixo para forçar multipart (parte mínima do S3 = 5MB)
+        mgr = S3FileManager(
+            max_pool_connections=4,
+            transfer_config=TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=4),
+        )
+        mgr.client.create_bucket(Bucket=BUCKET)
+        yield mgr
+
+
+def test_pool_size_is_configured(manager):
+    assert manager.client.meta.config.max_pool_connections == 4
+
+
+def test_multipart_upload_and_streaming_download(manager, tmp_path):
+    data = os.urandom(11 * MB)
+    manager.upload_fileobj(io.BytesIO(data), "documents/t1/grande.bin")
+
+    head = manager.client.head_object(Bucket=BUCKET, Key="documents/t1/grande.bin")
+    assert head["ContentLength"] == len(data)
+    assert "-" in head["ETag"]  # ETag de multipart: "<md5>-<partes>"
+
+    assert b"".join(manager.iter_object("documents/t1/grande.bin", chunk_size=MB)) == data
+
+    dest = tmp_path / "grande.bin"
+    manager.download_file("documents/t1/grande.bin", str(dest))
+    assert dest.read_bytes() == data
+
+
+def test_async_manager_concurrent_uploads(manager, tmp_path):
+    async_manager = AsyncS3FileManager(manager)
+
+    async def run():
+        payloads = {f"documents/t1/{i}.txt": f"arquivo {i}".encode() for i in range(10)}
+        await asyncio.gather(*(
+            async_manager.upload_fileobj(io.BytesIO(body), key) for key, body in payloads.items()
+        ))
+        listed = await async_manager.list_folder("documents/t1/")
+        chunks = [chunk async for chunk in async_manager.iter_object("documents/t1/3.txt")]
+        await async_manager.delete_folder("documents/t1/")
+        return payloads, listed, chunks, await async_manager.folder_exists("documents/t1/")
+
+    try:
+        payloads, listed, chunks, exists_after = asyncio.run(run())
+    finally:
+        async_manager.close()
+
+    assert sorted(listed) == sorted(payloads)
+    assert b"".join(chunks) == b"arquivo 3"
+    assert exists_after is False
+
+
+def test_folder_marker_written_once_per_prefix(manager):
+    calls = []
+    manager.client.meta.events.register("before-call.s3", lambda model, **kw: calls.append(model.name))
+
+    assert manager.ensure_folder_marker("documents/t1/") is True
+    assert manager.ensure_folder_marker("documents/t1/") is False
+    assert calls == ["HeadObject", "PutObject"]
+
+    head = manager.client.head_object(Bucket=BUCKET, Key="documents/t1/.keep")
+    assert head["ContentLength"] == 0
+
+    # outro processo (cache vazio) só confirma com HEAD, sem regravar
+    other = S3FileManager()
+    assert other.ensure_folder_marker("documents/t1/") is False
+
+    manager.delete_folder("documents/t1/")
+    assert manager.ensure_folder_marker("documents/t1/") is True
+
+
+def test_head_object_returns_none_when_missing(manager):
+    assert manager.head_object("documents/t1/nao-existe.xlsx") is None
+    manager.upload_fileobj(io.BytesIO(b"abc"), "documents/t1/doc.csv")
+    assert manager.head_object("documents/t1/doc.csv")["ContentLength"] == 3
@@ -0,0 +1,271 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from app.services import supabase_manager as sm
+from app.services.supabase_manager import SupabaseManager, get_postgrest_client, is_transient_error
+
+
+class FakePostgrest:
+    """
+    PostgREST mínimo: POST /rest/v1/<tabela> grava e devolve as linhas; GET
+    (filtros eq, order, offset/limit) e DELETE (filtro in) sobre o que foi gravado.
+    """
+
+    def __init__(self, transient_failures: int = 0, delay: float = 0.0):
+        self.transient_failures = transient_failures
+        self.delay = delay
+        self.requests = []
+        self.rows = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if isinstance(body, dict):
+                    body = [body]
+                url = urlparse(self.path)
+                table = url.path.rsplit("/", 1)[-1]
+                with fake.lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    fake.requests.append({
+                        "table": table,
+                        "rows": len(body),
+                        "prefer": self.headers.get("Prefer", ""),
+                        "authorization": self.headers.get("Authorization", ""),
+                        "query": parse_qs(url.query),
+                    })
+                    fail = fake.transient_failures > 0
+                    if fail:
+                        fake.transient_failures -= 1
+                try:
+                    time.sleep(fake.delay)
+                    if fail:
+                        return self._reply(503, b"upstream unavailable", "text/plain")
+                    if any(row.get("name") is None for row in body):
+                        error = {"code": "23502", "message": "null value in column \"name\"", "details": None, "hint": None}
+                        return self._reply(400, json.dumps(error).encode(), "application/json")
+                    with fake.lock:
+                        stored = fake.rows.setdefault(table, {})
+                        for row in body:
+                            stored[row["id"]] = row
+                    self._reply(201, json.dumps(body).encode(), "application/json")
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+            def do_GET(self):
+                table, params = self._parse()
+                with fake.lock:
+                    fake.requests.append({"method": "GET", "table": table, "query": params})
+                    rows = [
+                        row for row in fake.rows.get(table, {}).values()
+                        if all(str(row.get(col)) == val[3:] for col, val in params.items() if val.startswith("eq."))
+                    ]
+                column = params.get("order", "id.asc").split(".")[0]
+                rows.sort(key=lambda row: row[column])
+                offset = int(params.get("offset", 0))
+                rows = rows[offset:offset + int(params.get("limit", len(rows)))]
+                columns = params.get("select", "*")
+                if columns != "*":
+                    rows = [{col: row.get(col) for col in columns.split(",")} for row in rows]
+                self._reply(200, json.dumps(rows).encode(), "application/json")
+
+            def do_DELETE(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                table, params = self._parse()
+                (column, value), = params.items()
+                ids = value[len("in.("):-1].split(",")
+                with fake.lock:
+                    fake.requests.append({"method": "DELETE", "table": table, "rows": len(ids), "query": params})
+                    stored = fake.rows.get(table, {})
+                    for key in [key for key, row in stored.items() if str(row.get(column)) in ids]:
+                        del stored[key]
+                self._reply(204, b"", "application/json")
+
+            def _parse(self):
+                url = urlparse(self.path)
+                return url.path.rsplit("/", 1)[-1], {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            def _reply(self, status, payload, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _manager(monkeypatch, fake, jwt_token=None):
+    monkeypatch.setenv("SUPABASE_URL", fake.url)
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "anon-key")
+    return SupabaseManager(jwt_token)
+
+
+def _rows(n):
+    return [{"id": i, "name": f"item {i}"} for i in range(n)]
+
+
+def test_bulk_write_splits_into_chunks_with_bounded_concurrency(monkeypatch):
+    with FakePostgrest(delay=0.05) as fake:
+        result = _manager(monkeypatch, fake).bulk_write("items", _rows(1050), chunk_size=100, max_workers=3)
+
+    assert result.ok and result.inserted == 1050 and result.failed == 0
+    assert [row["id"] for row in result.data] == list(range(1050))  # ordem preservada
+    assert sorted(r["rows"] for r in fake.requests) == [50] + [100] * 10
+    assert 1 < fake.max_in_flight <= 3
+
+
+def test_bulk_write_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(sm.time, "sleep", lambda s: None)
+    with FakePostgrest(transient_failures=2) as fake:
+        result = _manager(monkeypatch, fake).bulk_write("items", _rows(10), chunk_size=10, max_retries=3)
+
+    assert result.ok and result.inserted == 10
+    assert len(fake.requests) == 3
+
+
+def test_bulk_write_reports_failed_chunks_without_retry(monkeypatch):
+    rows = _rows(30)
+    rows[15]["name"] = None
+    with FakePostgrest() as fake:
+        result = _manager(monkeypatch, fake).bulk_write("items", rows, chunk_size=10, max_workers=2)
+
+    assert result.inserted == 20 and result.failed == 10
+    assert [(e["offset"], e["rows"]) for e in result.errors] == [(10, 10)]
+    assert not is_transient_error(result.errors[0]["exception"])
+    assert len(fake.requests) == 3  # erro de dado: sem retentativa
+    assert sorted(fake.rows["items"]) == list(range(10)) + list(range(20, 30))
+
+
+def test_bulk_write_upsert_sends_on_conflict(monkeypatch):
+    with FakePostgrest() as fake:
+        result = _manager(monkeypatch, fake).bulk_write(
+            "items", _rows(5), upsert=True, on_conflict="id", returning=False
+        )
+
+    assert result.inserted == 5 and result.data == []
+    request = fake.requests[0]
+    assert request["query"]["on_conflict"] == ["id"]
+    assert "resolution=merge-duplicates" in request["prefer"]
+    assert "return=minimal" in request["prefer"]
+
+
+def test_bulk_insert_raises_first_error(monkeypatch):
+    from postgrest.exceptions import APIError
+
+    rows = _rows(3)
+    rows[0]["name"] = None
+    with FakePostgrest() as fake:
+        with pytest.raises(APIError):
+            _manager(monkeypatch, fake).bulk_insert("items", rows)
+
+
+def test_managers_share_the_pool_and_overlay_only_the_jwt(monkeypatch):
+    with FakePostgrest() as fake:
+        user_a = _manager(monkeypatch, fake, "token-a")
+        user_b = _manager(monkeypatch, fake, "token-b")
+        anonymous = _manager(monkeypatch, fake)
+
+        user_a.insert("items", {"id": 1, "name": "a"})
+        user_b.insert("items", {"id": 2, "name": "b"})
+        anonymous.insert("items", {"id": 3, "name": "c"})
+
+    assert anonymous.postgrest is get_postgrest_client()
+    assert user_a.postgrest.session is user_b.postgrest.session is anonymous.postgrest.session
+    assert [r["authorization"] for r in fake.requests] == ["Bearer token-a", "Bearer token-b", "Bearer anon-key"]
+    assert get_postgrest_client().headers["Authorization"] == "Bearer anon-key"
+
+
+def test_select_all_pages_with_filters(monkeypatch):
+    with FakePostgrest() as fake:
+        manager = _manager(monkeypatch, fake)
+        manager.bulk_write("items", [{"id": i, "name": f"item {i}", "group": i % 2} for i in range(25)])
+        rows = manager.select_all("items", "id,group", {"group": 1}, page_size=5)
+
+    assert [row["id"] for row in rows] == list(range(1, 25, 2))
+    assert rows[0] == {"id": 1, "group": 1}
+    gets = [r for r in fake.requests if r.get("method") == "GET"]
+    assert [r["query"]["offset"] for r in gets] == ["0", "5", "10"]  # 12 linhas: a 3ª página vem incompleta
+
+
+def test_bulk_delete_sends_ids_in_chunks(monkeypatch):
+    with FakePostgrest() as fake:
+        manager = _manager(monkeypatch, fake)
+        manager.bulk_write("items", _rows(10))
+        result = manager.bulk_delete("items", [1, 2, 3, 5, 8], chunk_size=2, max_workers=2)
+
+    assert result.ok and result.deleted == 5 and result.inserted == 0
+    assert sorted(fake.rows["items"]) == [0, 4, 6, 7, 9]
+    deletes = [r for r in fake.requests if r.get("method") == "DELETE"]
+    assert sorted(r["rows"] for r in deletes) == [1, 2, 2]
+
+
+def test_plain_inserts_only_retry_errors_that_were_not_applied():
+    import httpx
+    from postgrest.exceptions import APIError
+
+    def api_error(code):
+        return APIError({"code": code, "message": "x", "details": None, "hint": None})
+
+    # pode ter sido gravado: só upsert (idempotente) reenvia
+    for exc in (httpx.ReadTimeout("lento"), httpx.RemoteProtocolError("caiu"), api_error("504"), api_error("08006")):
+        assert is_transient_error(exc) and not is_transient_error(exc, idempotent=False)
+    # com certeza não foi gravado: reenvia mesmo insert puro
+    for exc in (httpx.ConnectError("recusada"), httpx.PoolTimeout("pool"), api_error("503"), api_error("40P01")):
+        assert is_transient_error(exc, idempotent=False)
+    assert not is_transient_error(api_error("23505"))
+
+
+def test_bulk_write_plain_insert_does_not_retry_read_timeouts(monkeypatch):
+    import httpx
+
+    monkeypatch.setattr(sm.time, "sleep", lambda s: None)
+    with FakePostgrest() as fake:
+        manager = _manager(monkeypatch, fake)
+        calls = []
+
+        def timeout(*args, **kwargs):
+            calls.append(1)
+            raise httpx.ReadTimeout("lento")
+
+        monkeypatch.setattr(manager.postgrest, "from_", lambda table: _Raising(timeout))
+        insert = manager.bulk_write("items", _rows(3), max_retries=3)
+        upsert = manager.bulk_write("items", _rows(3), upsert=True, max_retries=3)
+
+    assert insert.failed == 3 and upsert.failed == 3
+    assert len(calls) == 1 + 4  # insert: 1 tentativa; upsert: 1 + 3 retentativas
+
+
+class _Raising:
+    def __init__(self, execute):
+        self._execute = execute
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return self._execute()
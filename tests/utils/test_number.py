@@ -0,0 +1,23 @@
+import math
+
+from app.utils.number import br_to_float, br_to_float_array
+
+
+def test_br_to_float():
+    assert br_to_float("1.234,56") == 1234.56
+    assert br_to_float(" 2,5 ") == 2.5
+    assert br_to_float("R$ 12,50") == 12.5
+    assert br_to_float("SINAPI") is None
+    assert br_to_float("") is None
+    assert br_to_float(None) is None
+    assert br_to_float(3) == 3.0
+    assert math.isinf(br_to_float("inf"))
+
+
+def test_br_to_float_array():
+    arr = br_to_float_array(["1,00", None, "SINAPI", "1,00", 2.5, "1.000,5"])
+    assert arr.dtype.kind == "f"
+    assert arr[0] == arr[3] == 1.0
+    assert math.isnan(arr[1]) and math.isnan(arr[2])
+    assert arr[4] == 2.5
+    assert arr[5] == 1000.5